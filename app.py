@@ -1,16 +1,20 @@
 # app.py — UI CustomTkinter pour générer des lettres de motivation
 # Idée : interface simple, look dark “anthracite + néon”, UX fluide (raccourcis, feedback, etc.)
 
+import datetime
 import os
 import platform
+import queue
 import threading
+from collections import deque
 import customtkinter as ctk
 from tkinter import messagebox  # fallback si besoin (non critique, utile pour futurs prompts)
 
 import config
-import llm_body
-import writer
-import export_pdf as pdfmod
+import dedup
+import letter_index
+import pipeline
+import usage_ledger
 
 # ===================== Palette / Thème =====================
 # Centraliser les couleurs ici simplifie la maintenance du thème (dark + accents néon).
@@ -54,6 +58,17 @@ def open_in_file_manager(path: str):
         # Pas bloquant pour l’app — on évite d’exploser l’UI si l’OS refuse.
         pass
 
+def open_file(path: str):
+    """Ouvre un fichier avec l’application par défaut (Word pour un DOCX…)."""
+    try:
+        if platform.system() == "Windows":
+            os.startfile(path)  # type: ignore
+        else:
+            import subprocess
+            subprocess.Popen(["open" if platform.system() == "Darwin" else "xdg-open", path])
+    except Exception:
+        pass
+
 def _ring(widget, on=True):
     """Anneau de focus (couleur d’accent sur le border quand le widget a le focus)."""
     try:
@@ -63,28 +78,15 @@ def _ring(widget, on=True):
 
 # ===================== Dialog (compact, scrollable, redimensionnable) =====================
 class Dialog(ctk.CTkToplevel):
-    """Fenêtre modale minimaliste pour afficher infos/erreurs (texte long supporté)."""
+    """Fenêtre modale minimaliste pour afficher infos/erreurs (texte long supporté).
+    Construite une seule fois puis réutilisée via show() : OK / fermer la masque sans la détruire,
+    pour ne pas empiler une toplevel (et sa zone de texte) par génération."""
     def __init__(self, master, title, message, kind="info"):
         super().__init__(master)
-        self.title(title)
         self.configure(fg_color=C["card"])
         self.attributes("-topmost", True)
         self.resizable(True, True)
-
-        # Taille cible : ~72% de la fenêtre parente (bornée), avec minsize.
-        master.update_idletasks()
-        mw = max(1, master.winfo_width())
-        mh = max(1, master.winfo_height())
-        sw, sh = master.winfo_screenwidth(), master.winfo_screenheight()
-
-        target_w = max(720, min(int((mw or sw) * 0.72), 1280))
-        target_h = max(480, min(int((mh or sh) * 0.75), 900))
-
-        # Couleur d’accent selon le type de message.
-        color = {
-            "info": C["primary"], "success": C["success"],
-            "error": C["danger"],  "warn": C["pink"]
-        }.get(kind, C["primary"])
+        self.message = ""
 
         # Conteneur
         wrap = ctk.CTkFrame(self, corner_radius=12, fg_color=C["card"],
@@ -94,27 +96,22 @@ class Dialog(ctk.CTkToplevel):
         wrap.grid_rowconfigure(1, weight=1)
 
         # Barre d’accent verticale
-        bar = ctk.CTkFrame(wrap, width=10, fg_color=color, corner_radius=8)
-        bar.grid(row=0, column=0, rowspan=3, sticky="ns", padx=(8, 12), pady=12)
+        self.bar = ctk.CTkFrame(wrap, width=10, corner_radius=8)
+        self.bar.grid(row=0, column=0, rowspan=3, sticky="ns", padx=(8, 12), pady=12)
 
-        DLabel(wrap, title, size=16, weight="bold").grid(row=0, column=1, sticky="w", pady=(12, 6))
+        self.heading = DLabel(wrap, "", size=16, weight="bold")
+        self.heading.grid(row=0, column=1, sticky="w", pady=(12, 6))
 
         # Zone de message large et scrollable (grand confort pour copier/coller)
-        msg = ctk.CTkTextbox(
-            wrap, fg_color=C["card"], text_color=C["text"],
-            border_width=0, wrap="word",
-            width=target_w - 220, height=target_h - 200
-        )
-        msg.grid(row=1, column=1, sticky="nsew", pady=(0, 10))
-        msg.insert("1.0", message)
-        msg.configure(state="disabled")
+        self.msg = ctk.CTkTextbox(wrap, fg_color=C["card"], text_color=C["text"], border_width=0, wrap="word")
+        self.msg.grid(row=1, column=1, sticky="nsew", pady=(0, 10))
 
         # Boutons
         def _copy():
             """Copie le message dans le presse-papiers (pratique pour les logs/erreurs)."""
             try:
                 self.clipboard_clear()
-                self.clipboard_append(message)
+                self.clipboard_append(self.message)
             except Exception:
                 pass
 
@@ -122,18 +119,52 @@ class Dialog(ctk.CTkToplevel):
         btns.grid(row=2, column=1, sticky="e", pady=(0, 12))
         ctk.CTkButton(btns, text="Copier", fg_color=C["surface"], hover_color="#1a222c",
                       text_color=C["text"], corner_radius=8, command=_copy).pack(side="left", padx=(0, 6))
-        ctk.CTkButton(btns, text="OK", fg_color=color, hover_color=color,
-                      text_color=C["bg"], corner_radius=8, command=self.destroy).pack(side="left")
+        self.ok = ctk.CTkButton(btns, text="OK", text_color=C["bg"], corner_radius=8, command=self.hide)
+        self.ok.pack(side="left")
 
-        # Taille mini + centrage par rapport à la fenêtre parente
         self.minsize(680, 420)
-        self.update_idletasks()
-        w, h = target_w, target_h
+        self.protocol("WM_DELETE_WINDOW", self.hide)
+        self.show(title, message, kind)
+
+    def show(self, title, message, kind="info"):
+        """(Ré)affiche la fenêtre avec un nouveau message ; l’ancien texte est remplacé, pas accumulé."""
+        master = self.master
+        self.title(title)
+        self.heading.configure(text=title)
+        self.message = message
+
+        # Couleur d’accent selon le type de message.
+        color = {
+            "info": C["primary"], "success": C["success"],
+            "error": C["danger"],  "warn": C["pink"]
+        }.get(kind, C["primary"])
+        self.bar.configure(fg_color=color)
+        self.ok.configure(fg_color=color, hover_color=color)
+
+        self.msg.configure(state="normal")
+        self.msg.delete("1.0", "end")
+        self.msg.insert("1.0", message)
+        self.msg.configure(state="disabled")
+
+        # Taille cible : ~72% de la fenêtre parente (bornée), centrée sur elle.
+        master.update_idletasks()
+        mw = max(1, master.winfo_width())
+        mh = max(1, master.winfo_height())
+        sw, sh = master.winfo_screenwidth(), master.winfo_screenheight()
+        w = max(720, min(int((mw or sw) * 0.72), 1280))
+        h = max(480, min(int((mh or sh) * 0.75), 900))
         x = master.winfo_rootx() + max(0, (mw - w) // 2)
         y = master.winfo_rooty() + max(0, (mh - h) // 2)
         self.geometry(f"{w}x{h}+{x}+{y}")
+        self.deiconify()
+        self.lift()
         self.grab_set()  # modal
 
+    def hide(self):
+        """Masque la fenêtre (gardée pour le prochain message)."""
+        self.grab_release()
+        self.withdraw()
+
 # ===================== Widgets de base (styled) =====================
 class DButton(ctk.CTkButton):
     """Bouton stylé : filled / outline / ghost, avec accents cohérents."""
@@ -193,9 +224,82 @@ class DLabel(ctk.CTkLabel):
         kw.setdefault("font", ctk.CTkFont(size=size, weight=weight))
         super().__init__(master, text=text, **kw)
 
+# ===================== Recherche dans les lettres =====================
+class SearchDialog(ctk.CTkToplevel):
+    """Recherche plein texte dans les lettres déjà générées (mots-clés, banque, poste, période)."""
+    LIMIT = 50
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Rechercher dans mes lettres")
+        self.configure(fg_color=C["card"])
+        self.geometry("880x620")
+        self.minsize(680, 420)
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+
+        form = ctk.CTkFrame(self, fg_color="transparent")
+        form.grid(row=0, column=0, sticky="ew", padx=12, pady=(12, 6))
+        form.grid_columnconfigure(0, weight=3)
+        form.grid_columnconfigure((1, 2), weight=2)
+        self.q = DEntry(form, placeholder_text='Mots-clés (ex: market making, "pricing tools")')
+        self.q.grid(row=0, column=0, sticky="ew", padx=(0, 6))
+        self.bank = DEntry(form, placeholder_text="Banque (optionnel)")
+        self.bank.grid(row=0, column=1, sticky="ew", padx=(0, 6))
+        self.position = DEntry(form, placeholder_text="Poste (optionnel)")
+        self.position.grid(row=0, column=2, sticky="ew", padx=(0, 6))
+        self.days = ctk.CTkSegmentedButton(form, values=["Tout", "30 j", "7 j"], corner_radius=8,
+                                           selected_color="#134e58", unselected_color=C["stroke2"],
+                                           text_color=C["text"], command=lambda _v: self._search())
+        self.days.set("Tout")
+        self.days.grid(row=0, column=3, padx=(0, 6))
+        DButton(form, "🔎  Rechercher", command=self._search, width=130).grid(row=0, column=4)
+
+        self.info = ctk.CTkLabel(self, text="", text_color=C["muted"], font=ctk.CTkFont(size=12))
+        self.info.grid(row=1, column=0, sticky="w", padx=14)
+        self.results = ctk.CTkScrollableFrame(self, fg_color=C["surface"], corner_radius=12)
+        self.results.grid(row=2, column=0, sticky="nsew", padx=12, pady=(4, 12))
+        self.results.grid_columnconfigure(0, weight=1)
+
+        for w in (self.q, self.bank, self.position):
+            w.bind("<Return>", lambda _e: self._search())
+        self.q.focus_set()
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)   # masquée, réutilisée à la prochaine ouverture
+        self._search()
+
+    def _search(self):
+        since = {"30 j": 30, "7 j": 7}.get(self.days.get())
+        t0 = datetime.datetime.now()
+        hits = letter_index.default_index().search(
+            self.q.get().strip(), self.bank.get().strip() or None, self.position.get().strip() or None,
+            since=(t0 - datetime.timedelta(days=since)).timestamp() if since else None, limit=self.LIMIT)
+        ms = (datetime.datetime.now() - t0).total_seconds() * 1000
+
+        for child in self.results.winfo_children():
+            child.destroy()
+        for i, h in enumerate(hits):
+            row = ctk.CTkFrame(self.results, fg_color=C["card"], corner_radius=10)
+            row.grid(row=i, column=0, sticky="ew", padx=4, pady=4)
+            row.grid_columnconfigure(0, weight=1)
+            day = datetime.datetime.fromtimestamp(h.created).strftime("%d/%m/%Y")
+            DLabel(row, f"{h.bank} – {h.position}   ·   {day}", size=13, weight="bold").grid(
+                row=0, column=0, sticky="w", padx=10, pady=(8, 2))
+            DLabel(row, h.snippet, size=12, color="muted", wraplength=640, justify="left").grid(
+                row=1, column=0, sticky="w", padx=10, pady=(0, 8))
+            btns = ctk.CTkFrame(row, fg_color="transparent")
+            btns.grid(row=0, column=1, rowspan=2, padx=8)
+            DButton(btns, "Ouvrir", variant="outline", width=90, height=30,
+                    command=lambda p=h.path: open_file(p)).pack(pady=(0, 4))
+            DButton(btns, "Dossier", variant="ghost", width=90, height=30,
+                    command=lambda p=h.path: open_in_file_manager(p)).pack()
+        more = " (premiers résultats)" if len(hits) == self.LIMIT else ""
+        self.info.configure(text=f"{len(hits)} lettre(s){more} • {ms:.0f} ms")
+
 # ===================== Application =====================
 class App(ctk.CTk):
     """Fenêtre principale : layout header / accent / main / footer + logique de génération."""
+    RECENT_MAX = 5   # lettres précédentes rappelées dans la fenêtre de résultat
+
     def __init__(self):
         super().__init__()
         self.title("Cover Letter Generator — Dark Anthracite Neon")
@@ -217,7 +321,12 @@ class App(ctk.CTk):
         ctk.CTkLabel(badges, text=f"🧠  {getattr(config, 'MODEL','N/A')}", fg_color="#18323a",
                      text_color=C["primary"], corner_radius=8, padx=10, pady=4).pack(side="left", padx=(0,8))
         ctk.CTkLabel(badges, text=f"📁  {getattr(config,'OUT_DIR','generated_letters')}", fg_color="#361b2b",
-                     text_color=C["pink"], corner_radius=8, padx=10, pady=4).pack(side="left")
+                     text_color=C["pink"], corner_radius=8, padx=10, pady=4).pack(side="left", padx=(0,8))
+        # Totaux de la session (appels / tokens / coût estimé), rafraîchis après chaque génération
+        self.usage_badge = ctk.CTkLabel(badges, text="", fg_color="#1d2a1f",
+                                        text_color=C["success"], corner_radius=8, padx=10, pady=4)
+        self.usage_badge.pack(side="left")
+        self._refresh_usage_badge()
 
         # Trait d’accent
         ctk.CTkFrame(self, height=2, fg_color=C["primary"]).grid(row=1, column=0, sticky="ew", padx=16, pady=(0, 0))
@@ -286,6 +395,9 @@ class App(ctk.CTk):
         self.btn_clear.grid(row=0, column=0, sticky="ew", padx=(0, 6))
         self.btn_open = DButton(util, "📂  Ouvrir dossier de sortie", variant="outline", accent="pink", command=self._open_output_dir)
         self.btn_open.grid(row=0, column=1, sticky="ew", padx=(6, 0))
+        self.btn_search = DButton(util, "🔎  Rechercher dans mes lettres", variant="outline", accent="primary",
+                                  command=self._open_search)
+        self.btn_search.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(8, 0))
 
         # RIGHT (texte d’annonce)
         right = ctk.CTkFrame(main, corner_radius=12, fg_color=C["surface"])
@@ -337,6 +449,22 @@ class App(ctk.CTk):
         # Première validation
         self._validate_form()
 
+        # Un seul thread de génération, réutilisé d’un run à l’autre (daemon : fermer la fenêtre en
+        # pleine génération quitte tout de suite) ; une seule fenêtre de résultat et une seule fenêtre
+        # de recherche, recyclées ; historique des lettres borné (RECENT_MAX)
+        self._jobs = queue.Queue()
+        self._closed = False
+        threading.Thread(target=self._job_loop, name="generate", daemon=True).start()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self._dialog = None
+        self._search_win = None
+        self.recent = deque(maxlen=self.RECENT_MAX)
+
+        # Rattrapage de l’index des lettres (une seule lecture des anciens DOCX, ensuite quasi gratuit)
+        threading.Thread(target=self._backfill_index, daemon=True).start()
+        # Index des offres déjà traitées chargé dès l’ouverture (quelques secondes à 100k offres)
+        threading.Thread(target=self._preload_dedup, daemon=True).start()
+
     # ===================== Events =====================
     def _on_quick_filter(self, _e=None):
         """Filtre la liste des banques au fil de la saisie (case-insensitive)."""
@@ -404,7 +532,7 @@ class App(ctk.CTk):
     def _on_generate(self):
         """Pipeline asynchrone : LLM → DOCX → (optionnel) PDF. UI non bloquée."""
         if not self._validate_form():
-            Dialog(self, "Champs manquants", "Merci de remplir banque, poste et annonce.", "warn")
+            self._show_dialog("Champs manquants", "Merci de remplir banque, poste et annonce.", "warn")
             return
         bank = self.bank_combo.get().strip()
         position = self.position_entry.get().strip()
@@ -412,53 +540,129 @@ class App(ctk.CTk):
         lang = self.lang.get()
 
         # Feedback immédiat côté UI
-        self._set_status("Envoi à GPT…")
+        self._set_status("Recherche d’offres déjà traitées…")
         self._progress_start()
         self._toggle_controls(False)
 
-        # Thread travailleur pour ne pas geler l’UI
-        threading.Thread(
-            target=self._worker,
-            args=(bank, position, offer, lang, self.export_pdf.get()),
-            daemon=True
-        ).start()
+        # Thread travailleur (réutilisé) pour ne pas geler l’UI : recherche de doublon puis génération
+        self._jobs.put((self._check_duplicate, (bank, position, offer, lang, self.export_pdf.get())))
 
-    def _worker(self, bank, position, offer, lang, do_pdf):
+    def _job_loop(self):
+        """Thread de génération : exécute les tâches dans l’ordre, jusqu’à la fermeture de la fenêtre."""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            fn, args = job
+            try:
+                fn(*args)
+            except Exception:
+                # _worker remonte lui-même ses erreurs ; reste le rebond vers une fenêtre déjà fermée
+                if self._closed:
+                    return
+
+    def _on_close(self):
+        """Fermeture immédiate, même en pleine génération : la tâche en cours est abandonnée."""
+        self._closed = True
+        self._jobs.put(None)
+        self.destroy()
+
+    def _check_duplicate(self, bank, position, offer, lang, do_pdf):
+        """Thread worker : republication quasi identique d’une offre déjà traitée ? (index hors thread UI)"""
+        try:
+            match = dedup.find_reusable(bank, position, offer)
+        except Exception:
+            match = None   # l’index ne doit pas empêcher une génération
+        if match:
+            self.after(0, self._ask_reuse, match, bank, position, offer, lang, do_pdf)
+        else:
+            self._worker(bank, position, offer, lang, do_pdf)
+
+    def _ask_reuse(self, match, bank, position, offer, lang, do_pdf):
+        """Thread UI : on propose de reprendre le corps de la lettre existante, rendu pour ce poste."""
+        reuse = messagebox.askyesno(
+            "Offre déjà traitée",
+            f"Cette annonce ressemble à {match.similarity:.0%} à une offre déjà traitée "
+            f"({match.bank} – {match.position}).\n\nRéutiliser le texte de cette lettre (sans appel GPT) "
+            f"au lieu d’en générer une nouvelle ?",
+            parent=self,
+        )
+        self._jobs.put((self._worker, (bank, position, offer, lang, do_pdf, match if reuse else None)))
+
+    def _worker(self, bank, position, offer, lang, do_pdf, match=None):
         """Thread worker : gère la génération et remonte le résultat via self.after()."""
         docx_path = pdf_path = None
         err = None
+        progress = lambda _stage, msg: self.after(0, self._set_status, msg)
         try:
-            # 1) Génération du corps via LLM
-            body = llm_body.generate_body_paragraphs(bank, position, offer, lang)
-            self._set_status("Création du DOCX…")
-
-            # 2) Ecriture du DOCX
-            docx_path = writer.save_letter(bank, position, body)
-
-            # 3) Export PDF (optionnel)
-            if do_pdf:
-                self._set_status("Export PDF…")
-                try:
-                    pdf_path = pdfmod.docx_to_pdf(docx_path)
-                except Exception as e:
-                    # On n’échoue pas tout : DOCX OK, PDF KO → on remonte une alerte.
-                    err = f"DOCX OK. Export PDF a échoué : {e}"
+            if match:
+                # Corps de l’offre quasi identique, rendu pour la banque et le poste saisis
+                paths = pipeline.reused_result(match, bank, position, do_pdf, progress=progress)
+            else:
+                # LLM → DOCX (+ formats annexes) → PDF optionnel ; le statut suit chaque étape
+                # (le doublon éventuel a déjà été proposé à l’utilisateur → on génère)
+                paths = pipeline.run_letter(bank, position, offer, lang, do_pdf, progress=progress,
+                                            on_duplicate="generate")
+            docx_path, pdf_path = paths["docx"], paths.get("pdf")
+            err = paths.get("pdf_error")
         except Exception as e:
             # Cas d’erreur (réseau, modèle, I/O…) → on remonte proprement
             err = str(e)
 
         # Rebond dans le thread UI pour mettre à jour les widgets
-        def done():
-            self._progress_stop()
-            self._toggle_controls(True)
-            if err:
-                self._set_status("Erreur.")
-                Dialog(self, "Erreur", err, "error")
-            else:
-                self._set_status("Terminé.")
-                msg = f"DOCX :\n{docx_path}" + (f"\n\nPDF :\n{pdf_path}" if pdf_path else "")
-                Dialog(self, "Succès", msg, "success")
-        self.after(0, done)
+        self.after(0, self._on_done, docx_path, pdf_path, err)
+
+    def _on_done(self, docx_path, pdf_path, err):
+        """Fin d’une génération (thread UI) : statut, badge, fenêtre de résultat."""
+        self._progress_stop()
+        self._toggle_controls(True)
+        self._refresh_usage_badge()
+        if err and not docx_path:
+            self._set_status("Erreur.")
+            self._show_dialog("Erreur", err, "error")
+            return
+        msg = f"DOCX :\n{docx_path}" + (f"\n\nPDF :\n{pdf_path}" if pdf_path else "")
+        if err:
+            # DOCX écrit mais PDF en échec : on garde le chemin du DOCX dans le message
+            msg += f"\n\n{err}"
+        if self.recent:
+            msg += "\n\nPrécédentes :\n" + "\n".join(reversed(self.recent))
+        self.recent.append(docx_path)
+        self._set_status("Erreur PDF." if err else "Terminé.")
+        self._show_dialog("Erreur" if err else "Succès", msg, "error" if err else "success")
+
+    def _show_dialog(self, title, message, kind="info"):
+        """Affiche un message dans l’unique fenêtre de résultat (créée au premier usage)."""
+        if self._dialog is not None and self._dialog.winfo_exists():
+            self._dialog.show(title, message, kind)
+        else:
+            self._dialog = Dialog(self, title, message, kind)
+
+    def _open_search(self):
+        """Ouvre (ou ramène au premier plan) l’unique fenêtre de recherche."""
+        if self._search_win is not None and self._search_win.winfo_exists():
+            self._search_win.deiconify()
+            self._search_win.lift()
+            self._search_win.q.focus_set()
+        else:
+            self._search_win = SearchDialog(self)
+
+    def _preload_dedup(self):
+        """Charge en arrière-plan l’index dedup : la première recherche n’attend plus sa lecture."""
+        if getattr(config, "DEDUP_ENABLED", True):
+            try:
+                dedup.default_index()
+            except Exception:
+                pass
+
+    def _backfill_index(self):
+        """Indexe en arrière-plan les lettres présentes sur disque mais pas encore dans l’index."""
+        try:
+            n = letter_index.default_index().backfill()
+        except Exception:
+            return
+        if n:
+            self.after(0, lambda: self._set_status(f"{n} lettre(s) existante(s) indexée(s) pour la recherche."))
 
     # ===================== UI helpers =====================
     def _set_status(self, t):
@@ -468,6 +672,12 @@ class App(ctk.CTk):
         except Exception:
             pass
 
+    def _refresh_usage_badge(self):
+        """Affiche les totaux de consommation LLM de la session dans le header."""
+        t = usage_ledger.session_totals()
+        tokens = t["prompt_tokens"] + t["completion_tokens"]
+        self.usage_badge.configure(text=f"Σ  {t['calls']} appels • {tokens:,} tokens • ${t['cost_usd']:.4f}".replace(",", " "))
+
     def _progress_start(self):
         """Barre de progression en mode indéterminé (activation)."""
         self.progress.configure(mode="indeterminate")
@@ -485,7 +695,7 @@ class App(ctk.CTk):
         for w in [
             self.quick, self.bank_combo, self.position_entry, self.lang_seg,
             self.pdf_switch, self.offer_text, self.btn_clear, self.btn_open,
-            self.btn_paste, self.btn_generate,
+            self.btn_search, self.btn_paste, self.btn_generate,
         ]:
             try:
                 w.configure(state=state)
@@ -0,0 +1,281 @@
+# batch_api.py — Mode “lot” : génération différée de nombreuses lettres via la Batch API d’OpenAI
+# Pour les gros volumes non urgents (une nuit de candidatures), on évite les appels interactifs
+# un par un : mêmes prompts que llm_body.generate_body_paragraphs, rassemblés dans un JSONL,
+# envoyés en un lot (moitié prix, quotas séparés), puis on sonde jusqu’à la fin et chaque réponse
+# repasse par llm_body.parse_paragraphs (JSON, sinon heuristiques) → writer.save_letter.
+# L’état (fichier d’entrée, lot, statut de chaque lettre) est sauvegardé dans un JSON : après un
+# redémarrage, `python batch_api.py poll` reprend le sondage sans renvoyer le lot.
+#
+# Usage :
+#   python batch_api.py submit offres/ autres.jsonl   # dossiers (.txt/.json) ou JSONL {bank, position, offer, lang}
+#   python batch_api.py poll                          # attend la fin puis écrit les lettres (reprise possible)
+#   python batch_api.py run offres/                   # submit + poll
+#   python batch_api.py status
+#   python batch_api.py retry                         # renvoie les lettres en échec / non traitées
+import argparse, hashlib, json, os, sys, time
+import config
+import dedup
+import letter_validator
+import llm_body
+import usage_ledger
+import watcher
+import writer
+
+TERMINAL = ("completed", "failed", "expired", "cancelled")
+ENDPOINT = "/v1/chat/completions"
+CHECKPOINT_EVERY = 20   # lettres écrites entre deux sauvegardes (réécrire l’état n’est pas gratuit)
+
+def _app_dir() -> str:
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+def state_path(path: str = None) -> str:
+    p = path or getattr(config, "BATCH_STATE", "batch_state.json")
+    return p if os.path.isabs(p) else os.path.join(_app_dir(), p)
+
+def load_state(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state: dict, path: str):
+    # Écriture atomique : un arrêt brutal laisse l’ancien état intact, jamais un JSON tronqué
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _client():
+    # Client de la route principale (les replis du routeur ne servent qu’aux appels interactifs) ;
+    # délai plus large : téléverser un JSONL de plusieurs Mo n’est pas un appel de 20 s.
+    return llm_body._client.with_options(timeout=300, max_retries=3)
+
+# ————— Entrées —————
+def load_offers(paths) -> list:
+    """Offres {bank, position, lang, offer, source} depuis des dossiers/fichiers .txt/.json ou des .jsonl."""
+    offers = []
+    for p in paths:
+        if os.path.isdir(p):
+            files = sorted(os.path.join(p, n) for n in os.listdir(p)
+                           if n.lower().endswith(watcher.OFFER_EXT) and not watcher.IGNORE_RX.search(n))
+        else:
+            files = [p]
+        for f in files:
+            try:
+                if f.lower().endswith(".jsonl"):
+                    with open(f, "r", encoding="utf-8-sig") as fh:
+                        for n, line in enumerate(fh, 1):
+                            if line.strip():
+                                offers.append({**watcher.offer_from_dict(json.loads(line)), "source": f"{f}:{n}"})
+                else:
+                    offers.append({**watcher.parse_offer(f), "source": f})
+            except (OSError, ValueError) as e:
+                print(f"ignoré : {f} ({e})", file=sys.stderr)
+    return offers
+
+def request_line(custom_id: str, job: dict, model: str) -> dict:
+    """Une ligne du JSONL d’entrée : même prompt et même température que l’appel interactif."""
+    body = {"model": model, "temperature": 0.6,
+            "messages": llm_body.build_messages(job["bank"], job["position"], job["offer"], job["lang"])}
+    # Le lot part sur la route principale : même format que ses appels interactifs (refus compris)
+    fmt = llm_body._router.routes[0].response_format(llm_body.response_format)
+    if fmt:
+        body["response_format"] = fmt
+    return {"custom_id": custom_id, "method": "POST", "url": ENDPOINT, "body": body}
+
+# ————— Cycle de vie du lot —————
+def new_state(offers: list) -> dict:
+    """État initial : une entrée par lettre ; les offres déjà traitées (dedup) ne partent pas dans le lot."""
+    jobs = {}
+    for o in offers:
+        job = {"bank": o["bank"], "position": o["position"], "lang": o["lang"], "offer": o["offer"],
+               "source": o.get("source"), "status": "pending"}
+        match = dedup.find_reusable(o["bank"], o["position"], o["offer"])
+        if match:
+            # Corps repris, lettre rendue pour ce poste (pas l’ancien fichier, qui nomme l’ancien poste)
+            job.update(status="reused", docx=writer.save_letter(o["bank"], o["position"], match.body),
+                       duplicate_of=round(match.similarity, 3))
+        # Identifiant tiré du contenu : mêmes offres → même JSONL (rejouable à l’identique par cassette.py)
+        base = "letter-" + hashlib.sha1("\x1f".join((o["bank"], o["position"], o["lang"], o["offer"]))
+                                        .encode("utf-8")).hexdigest()[:12]
+        cid, n = base, 2
+        while cid in jobs:
+            cid, n = f"{base}-{n}", n + 1
+        jobs[cid] = job
+    return {"model": config.MODEL, "created": time.time(), "jobs": jobs, "history": []}
+
+def submit(state: dict, path: str, client=None) -> dict:
+    """Téléverse le JSONL des lettres en attente puis crée le lot. Chaque étape est sauvegardée :
+    une reprise après coupure ne renvoie ni le fichier, ni le lot déjà créés."""
+    client = client or _client()
+    pending = {cid: j for cid, j in state["jobs"].items() if j["status"] == "pending"}
+    if not pending:
+        return state
+    if not state.get("input_file_id"):
+        data = "".join(json.dumps(request_line(cid, j, state["model"]), ensure_ascii=False) + "\n"
+                       for cid, j in pending.items()).encode("utf-8")
+        f = client.files.create(file=("cover_letters.jsonl", data), purpose="batch")
+        state["input_file_id"] = f.id
+        save_state(state, path)
+    if not state.get("batch_id"):
+        b = client.batches.create(input_file_id=state["input_file_id"], endpoint=ENDPOINT,
+                                  completion_window="24h", metadata={"app": "bank_cover_letter_generator"})
+        state.update(batch_id=b.id, status=b.status, submitted=time.time())
+        for j in pending.values():
+            j["status"] = "submitted"
+        save_state(state, path)
+    return state
+
+def poll(state: dict, path: str, client=None, interval: float = None, progress=print) -> dict:
+    """Sonde le lot jusqu’à un état terminal (statut sauvegardé à chaque changement), puis collecte."""
+    client = client or _client()
+    interval = float(interval if interval is not None else getattr(config, "BATCH_POLL_S", 60))
+    while state.get("batch_id") and state.get("status") not in TERMINAL:
+        b = client.batches.retrieve(state["batch_id"])
+        if b.status != state.get("status"):
+            rc = b.request_counts
+            state.update(status=b.status, output_file_id=b.output_file_id, error_file_id=b.error_file_id)
+            save_state(state, path)
+            progress(f"lot {b.id} : {b.status}" + (f" ({rc.completed}/{rc.total} ok, {rc.failed} en échec)" if rc else ""))
+        if b.status not in TERMINAL:
+            time.sleep(interval)
+    return collect(state, path, client, progress)
+
+def _read_jsonl(client, file_id: str):
+    if not file_id:
+        return
+    for line in client.files.content(file_id).text.splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+def collect(state: dict, path: str, client=None, progress=print) -> dict:
+    """Écrit les lettres des réponses réussies, marque les échecs. Idempotent : une lettre déjà écrite
+    (status "done") est sautée, on peut donc relancer après une coupure en cours de collecte."""
+    if state.get("status") not in TERMINAL or state.get("collected"):
+        return state
+    client = client or _client()
+    jobs = state["jobs"]
+    # Journal d’usage et index dedup ne sont alimentés qu’après la sauvegarde de l’état :
+    # une lettre réécrite après une coupure n’est ainsi jamais comptée deux fois.
+    ledger, seen = [], []
+
+    def checkpoint():
+        save_state(state, path)
+        for row in ledger:
+            usage_ledger.record(**row)
+        if getattr(config, "DEDUP_ENABLED", True):
+            for job, paragraphs in seen:
+                dedup.default_index().add(job["bank"], job["position"], job["offer"], letter_path=job["docx"],
+                                          body=paragraphs)
+        ledger.clear(); seen.clear()
+
+    turnaround = time.time() - state.get("submitted", state["created"])
+    validate = getattr(config, "LETTER_VALIDATE", True)
+    ngram = int(getattr(config, "LETTER_COPY_NGRAM", 8))
+
+    for row in _read_jsonl(client, state.get("output_file_id")):
+        job = jobs.get(row.get("custom_id"))
+        if not job or job["status"] != "submitted":
+            continue
+        resp = row.get("response") or {}
+        if resp.get("status_code") != 200:
+            job.update(status="failed", error=json.dumps(resp.get("body") or row.get("error"))[:500])
+            continue
+        body = resp["body"]
+        usage = body.get("usage") or {}
+        ledger.append(dict(
+            model=body.get("model") or state["model"], latency_s=turnaround,
+            prompt_tokens=usage.get("prompt_tokens", 0), completion_tokens=usage.get("completion_tokens", 0),
+            cached_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+            bank=job["bank"], position=job["position"], letter_id=row["custom_id"], purpose="batch",
+            cost_factor=float(getattr(config, "BATCH_COST_FACTOR", 0.5)),
+        ))
+        raw = (body["choices"][0]["message"]["content"] or "").strip()
+        paragraphs = llm_body.parse_paragraphs(raw)[:4]
+        if not paragraphs:
+            # JSON tronqué (max_tokens…) sans paragraphe complet : à régénérer (cf. retry)
+            job.update(status="failed", error="réponse inexploitable (aucun paragraphe)")
+            continue
+        job["docx"] = writer.save_letter(job["bank"], job["position"], paragraphs)
+        job["status"] = "done"
+        if validate:
+            # Pas de réécriture en mode lot (ce serait un appel interactif) : on signale seulement
+            report = letter_validator.validate(paragraphs, job["offer"],
+                                               offer_shingles=letter_validator.shingles(job["offer"], ngram))
+            if not report.ok:
+                job["issues"] = {"count": report.count_issue,
+                                 "paragraphs": {str(i): why for i, why in report.paragraph_issues.items()}}
+        seen.append((job, paragraphs))
+        if len(seen) >= CHECKPOINT_EVERY:
+            checkpoint()
+
+    for row in _read_jsonl(client, state.get("error_file_id")):
+        job = jobs.get(row.get("custom_id"))
+        if job and job["status"] == "submitted":
+            resp = row.get("response") or {}
+            job.update(status="failed", error=json.dumps(resp.get("body") or row.get("error"))[:500])
+
+    # Lot expiré / annulé : ce qui n’a pas de réponse reste à refaire (cf. retry)
+    for job in jobs.values():
+        if job["status"] == "submitted":
+            job.update(status="failed", error=f"sans réponse (lot {state['status']})")
+    state["collected"] = time.time()
+    checkpoint()
+    progress(summary(state))
+    return state
+
+def retry(state: dict, path: str) -> dict:
+    """Remet les lettres en échec dans un nouveau lot (l’ancien reste dans l’historique)."""
+    failed = [j for j in state["jobs"].values() if j["status"] == "failed"]
+    if not failed:
+        return state
+    keys = ("input_file_id", "batch_id", "status", "output_file_id", "error_file_id", "submitted", "collected")
+    state["history"].append({k: state.get(k) for k in keys})
+    for k in keys:
+        state.pop(k, None)
+    for j in failed:
+        j["status"] = "pending"
+        j.pop("error", None)
+    save_state(state, path)
+    return state
+
+def summary(state: dict) -> str:
+    counts = {}
+    for j in state["jobs"].values():
+        counts[j["status"]] = counts.get(j["status"], 0) + 1
+    flagged = sum(1 for j in state["jobs"].values() if j.get("issues"))
+    detail = ", ".join(f"{n} {s}" for s, n in sorted(counts.items()))
+    return (f"lot {state.get('batch_id') or '—'} [{state.get('status') or 'non soumis'}] : {detail}"
+            + (f" — {flagged} lettre(s) à relire (validation)" if flagged else ""))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Génération de lettres en lot via la Batch API (reprise possible).")
+    ap.add_argument("command", choices=("submit", "poll", "run", "status", "retry"))
+    ap.add_argument("inputs", nargs="*", help="dossiers d’offres (.txt/.json) ou fichiers .jsonl")
+    ap.add_argument("--state", default=None, help="fichier d’état (défaut : config.BATCH_STATE)")
+    ap.add_argument("--interval", type=float, default=None, help="période de sondage en secondes")
+    a = ap.parse_args()
+    path = state_path(a.state)
+
+    if a.command in ("submit", "run") and a.inputs:
+        if os.path.exists(path) and load_state(path).get("status") not in (None,) + TERMINAL:
+            sys.exit(f"Un lot est déjà en cours ({path}) : `poll` pour le reprendre, ou --state autre.json")
+        offers = load_offers(a.inputs)
+        if not offers:
+            sys.exit("Aucune offre lisible.")
+        st = new_state(offers)
+        save_state(st, path)
+    elif not os.path.exists(path):
+        sys.exit(f"Aucun état de lot : {path}")
+    else:
+        st = load_state(path)
+
+    if a.command == "retry":
+        st = retry(st, path)
+    if a.command in ("submit", "run", "retry"):
+        st = submit(st, path)
+        print(summary(st))
+    if a.command in ("poll", "run", "retry"):
+        st = poll(st, path, interval=a.interval)
+    if a.command == "status":
+        print(summary(st))
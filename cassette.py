@@ -0,0 +1,401 @@
+# cassette.py — Enregistrement / rejeu du trafic LLM avec ses temps d’origine
+# Enregistrement : un petit proxy local relaie chaque requête vers l’API réelle et consigne la
+# réponse telle qu’elle arrive (morceaux horodatés), avec en-têtes, 1er octet (TTFT), durée
+# totale et usage. Avec LLM_RECORD=fichier, les clients de llm_router passent automatiquement
+# par ce proxy : app, serveur, dossier surveillé et Batch API (files/batches) sont capturés.
+# Rejeu : un faux serveur compatible OpenAI (même base que stub_openai.py) ressert ces réponses,
+# à la vitesse d’origine ou accélérée — benchs de lot, cache et concurrence sans réseau.
+# Format : JSON lines gzip, un membre gzip par entrée (fichier lisible même après un arrêt brutal).
+# Le contenu des requêtes n’est pas stocké (seulement son empreinte) : pas de copie du CV.
+#
+# Usage :
+#   LLM_RECORD=trafic.cassette.gz python app.py                 # enregistrer en utilisation normale
+#   python cassette.py record trafic.cassette.gz --port 8010     # ou proxy autonome (OPENAI_API_BASE=…:8010/v1)
+#   python cassette.py replay trafic.cassette.gz --speed 10 --port 8001
+#   python cassette.py info trafic.cassette.gz
+#   python cassette.py bench                                    # auto-vérification contre le stub
+import argparse, codecs, gzip, hashlib, http.client, json, os, re, sys, threading, time, zlib
+from collections import deque
+from urllib.parse import urlsplit
+import config
+import stub_openai
+from usage_ledger import _percentile
+
+DEFAULT_UPSTREAM = "https://api.openai.com/v1"
+# En-têtes propres à une connexion : jamais relayés tels quels
+_HOP = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "te", "trailer", "upgrade",
+        "host", "content-length", "accept-encoding", "content-encoding"}
+
+def endpoint(path: str) -> str:
+    """Chemin relatif à la racine de l’API : /v1/chat/completions → /chat/completions."""
+    i = path.find("/v1/")
+    return path[i + 3:] if i >= 0 else path
+
+def request_key(method: str, ep: str, content_type: str, body: bytes) -> str:
+    """Empreinte d’une requête : JSON canonique (ordre des clés indifférent), frontière multipart neutralisée."""
+    if body and "json" in content_type:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        except ValueError:
+            pass
+    m = re.search(r'boundary="?([^";]+)', content_type)
+    if m:
+        body = body.replace(m.group(1).encode(), b"BOUNDARY")
+    return hashlib.sha1(f"{method} {ep}\n".encode() + (body or b"")).hexdigest()[:20]
+
+def _request_meta(content_type: str, body: bytes) -> dict:
+    if body and "json" in content_type:
+        try:
+            req = json.loads(body)
+            return {"model": req.get("model"), "stream": bool(req.get("stream"))}
+        except ValueError:
+            pass
+    return {"model": None, "stream": False}
+
+def _usage(content_type: str, text: str):
+    """Usage de la réponse : champ `usage` du JSON, ou du dernier chunk SSE qui en porte un."""
+    if "event-stream" in content_type:
+        for line in reversed(text.splitlines()):
+            if line.startswith("data: {") and '"usage"' in line:
+                usage = json.loads(line[6:]).get("usage")
+                if usage:
+                    return usage
+        return None
+    if "json" in content_type:
+        try:
+            return json.loads(text).get("usage")
+        except (ValueError, AttributeError):
+            return None
+    return None
+
+# ————— Fichier cassette —————
+class CassetteWriter:
+    """Ajout thread-safe d’entrées (un membre gzip chacune)."""
+    def __init__(self, path: str):
+        self.path, self.lock, self.count = path, threading.Lock(), 0
+
+    def write(self, entry: dict):
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        data = gzip.compress(line)
+        with self.lock:
+            with open(self.path, "ab") as f:
+                f.write(data)
+            self.count += 1
+
+def load(path: str) -> list:
+    """Entrées d’une cassette, dans l’ordre d’enregistrement (une fin tronquée est ignorée)."""
+    out = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                out.append(json.loads(line))
+    except (EOFError, gzip.BadGzipFile, zlib.error, json.JSONDecodeError):
+        pass  # dernier membre incomplet (processus tué pendant l’écriture)
+    return out
+
+# ————— Enregistrement —————
+class RecordHandler(stub_openai.StubHandler):
+    """Relaie vers l’amont en flux (rien n’est mis en tampon) et consigne la réponse horodatée."""
+    _conn = None   # connexion amont, réutilisée tant que le client garde la sienne (keep-alive)
+
+    def _upstream(self, fresh: bool = False) -> http.client.HTTPConnection:
+        up = self.server.upstream
+        if fresh or self._conn is None:
+            if self._conn is not None:
+                self._conn.close()
+            cls = http.client.HTTPSConnection if up.scheme == "https" else http.client.HTTPConnection
+            self._conn = cls(up.netloc, timeout=self.server.upstream_timeout)
+        return self._conn
+
+    def _relay(self):
+        srv = self.server
+        body = self._read_body()
+        ep = endpoint(self.path)
+        ctype = self.headers.get("Content-Type", "")
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in _HOP}
+        headers["Accept-Encoding"] = "identity"   # morceaux enregistrés lisibles, pas de gzip à défaire
+        target = srv.upstream.path.rstrip("/") + ep
+
+        for attempt in (0, 1):
+            t0 = time.perf_counter()
+            reused = attempt == 0 and self._conn is not None
+            try:
+                conn = self._upstream(fresh=attempt > 0)
+                conn.request(self.command, target, body=body or None, headers=headers)
+                resp = conn.getresponse()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                # Seul cas rejoué : connexion keep-alive fermée par l’amont entre deux requêtes
+                # (un délai dépassé n’est pas renvoyé : la requête a pu être traitée et facturée)
+                stale = isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError))
+                if not (reused and stale):
+                    self._conn = None
+                    return self._json(502, {"error": {"message": f"cassette: amont injoignable ({e})"}})
+        ms = lambda: round((time.perf_counter() - t0) * 1000, 1)
+        headers_ms = ms()
+        rtype = resp.getheader("Content-Type", "")
+
+        self.send_response(resp.status)
+        for k, v in resp.getheaders():
+            if k.lower() not in _HOP:
+                self.send_header(k, v)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        dec = codecs.getincrementaldecoder("utf-8")("replace")
+        chunks, ttft, client_ok = [], None, True
+        while True:
+            data = resp.read1(65536)
+            if not data:
+                break
+            t = ms()
+            ttft = t if ttft is None else ttft
+            if client_ok:
+                try:
+                    self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                except OSError:
+                    client_ok = False   # client parti (hedge perdant…) : on lit quand même jusqu’au bout
+            text = dec.decode(data)
+            # Morceaux arrivés dans la même milliseconde fusionnés : cassette plus compacte, timing intact
+            if chunks and t - chunks[-1][0] < 1:
+                chunks[-1][1] += text
+            else:
+                chunks.append([t, text])
+        if client_ok:
+            try:
+                self.wfile.write(b"0\r\n\r\n")
+            except OSError:
+                pass
+        # read1 ne libère pas une réponse à Content-Length lue jusqu’au bout : sans close(),
+        # la connexion amont ne pourrait pas resservir (nouvelle connexion TCP/TLS à chaque appel)
+        resp.close()
+        if resp.will_close:
+            self._conn.close()
+            self._conn = None
+
+        text = "".join(c for _, c in chunks)
+        srv.writer.write({
+            "at": round(time.time(), 3), "method": self.command, "path": ep,
+            "key": request_key(self.command, ep, ctype, body), **_request_meta(ctype, body),
+            "status": resp.status, "ctype": rtype, "headers_ms": headers_ms,
+            "ttft_ms": ttft if ttft is not None else headers_ms, "total_ms": ms(),
+            "usage": _usage(rtype, text), "chunks": chunks,
+        })
+
+    do_GET = do_POST = do_DELETE = _relay
+
+def make_recorder(path: str, upstream: str = None, port: int = 0, host: str = "127.0.0.1",
+                  writer: CassetteWriter = None, timeout: float = 600.0) -> stub_openai.StubServer:
+    """Proxy d’enregistrement vers `upstream` ; les clients utilisent srv.base_url."""
+    srv = stub_openai.StubServer((host, port), RecordHandler)
+    srv.upstream = urlsplit(upstream or DEFAULT_UPSTREAM)
+    srv.writer = writer or CassetteWriter(path)
+    srv.upstream_timeout = timeout
+    srv.base_url = f"http://{host}:{srv.server_address[1]}/v1"
+    return srv
+
+_recorders = {}
+_writer = None
+_rec_lock = threading.Lock()
+
+def recording_base_url(upstream: str = None) -> str:
+    """base_url à donner au client OpenAI pour que son trafic soit enregistré dans LLM_RECORD
+    (un proxy par endpoint amont, lancé au premier appel, tous écrivent dans la même cassette)."""
+    global _writer
+    upstream = upstream or os.getenv("OPENAI_BASE_URL") or DEFAULT_UPSTREAM
+    with _rec_lock:
+        srv = _recorders.get(upstream)
+        if srv is None:
+            _writer = _writer or CassetteWriter(config.LLM_RECORD)
+            srv = _recorders[upstream] = make_recorder(config.LLM_RECORD, upstream, writer=_writer)
+            threading.Thread(target=srv.serve_forever, daemon=True).start()
+        return srv.base_url
+
+# ————— Rejeu —————
+class Cassette:
+    """Entrées indexées pour le rejeu : par empreinte exacte, sinon (hors mode strict) la suivante
+    enregistrée sur le même endpoint — utile quand les offres rejouées diffèrent des originales."""
+    def __init__(self, entries: list, strict: bool = False):
+        self.strict = strict
+        self.by_key, self.by_path, self.cursor = {}, {}, {}
+        self.stats = {"exact": 0, "loose": 0, "missing": 0}
+        self.lock = threading.Lock()
+        for e in entries:
+            self.by_key.setdefault(e["key"], deque()).append(e)
+            self.by_path.setdefault((e["method"], e["path"], e.get("stream", False)), []).append(e)
+        self.size = len(entries)
+
+    @classmethod
+    def load(cls, path: str, strict: bool = False) -> "Cassette":
+        return cls(load(path), strict)
+
+    def match(self, method: str, ep: str, key: str, stream: bool = False):
+        with self.lock:
+            q = self.by_key.get(key)
+            if q:
+                self.stats["exact"] += 1
+                # Même requête plusieurs fois (sondage d’un lot) : réponses dans l’ordre, la dernière se répète
+                return q.popleft() if len(q) > 1 else q[0]
+            same = None if self.strict else self.by_path.get((method, ep, stream))
+            if same:
+                i = self.cursor.get((method, ep, stream), 0)
+                self.cursor[(method, ep, stream)] = i + 1
+                self.stats["loose"] += 1
+                return same[i % len(same)]
+            self.stats["missing"] += 1
+            return None
+
+class ReplayHandler(stub_openai.StubHandler):
+    """Ressert la réponse enregistrée en respectant ses temps (divisés par srv.speed ; 0 = sans attente)."""
+    def _replay(self):
+        srv = self.server
+        t0 = time.perf_counter()
+        body = self._read_body()
+        ep = endpoint(self.path)
+        ctype = self.headers.get("Content-Type", "")
+        e = srv.cassette.match(self.command, ep, request_key(self.command, ep, ctype, body),
+                               _request_meta(ctype, body)["stream"])
+        if e is None:
+            return self._json(404, {"error": {"message": f"cassette: rien d’enregistré pour {self.command} {ep}"}})
+
+        def wait_until(ms):
+            if srv.speed > 0:
+                d = ms / 1000.0 / srv.speed - (time.perf_counter() - t0)
+                if d > 0:
+                    time.sleep(d)
+
+        wait_until(e["headers_ms"])
+        self.send_response(e["status"])
+        self.send_header("Content-Type", e.get("ctype") or "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for ms, text in e["chunks"]:
+            wait_until(ms)
+            data = text.encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    do_GET = do_POST = do_DELETE = _replay
+
+def make_replayer(path: str, speed: float = 1.0, strict: bool = False, port: int = 0,
+                  host: str = "127.0.0.1") -> stub_openai.StubServer:
+    """Faux serveur OpenAI qui rejoue une cassette ; base_url = srv.base_url."""
+    srv = stub_openai.StubServer((host, port), ReplayHandler)
+    srv.cassette, srv.speed = Cassette.load(path, strict), speed
+    srv.base_url = f"http://{host}:{srv.server_address[1]}/v1"
+    return srv
+
+def start_replay(path: str, **kw) -> stub_openai.StubServer:
+    """Rejeu en tâche de fond (benchs). Arrêt : srv.shutdown()."""
+    srv = make_replayer(path, **kw)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+# ————— Résumé —————
+def summary(entries: list) -> dict:
+    """Par endpoint : nombre d’appels, TTFT et durée p50/p95 (ms), tokens."""
+    groups = {}
+    for e in entries:
+        groups.setdefault(f"{e['method']} {e['path']}" + (" (stream)" if e.get("stream") else ""), []).append(e)
+    out = {}
+    for name, es in sorted(groups.items()):
+        ttft, total = [e["ttft_ms"] for e in es], [e["total_ms"] for e in es]
+        out[name] = {"n": len(es), "errors": sum(1 for e in es if e["status"] >= 400),
+                     "ttft_p50": _percentile(ttft, 50), "ttft_p95": _percentile(ttft, 95),
+                     "total_p50": _percentile(total, 50), "total_p95": _percentile(total, 95),
+                     "tokens": sum((e.get("usage") or {}).get("total_tokens", 0) for e in es)}
+    return out
+
+def _print_summary(entries: list):
+    print(f"{len(entries)} échanges")
+    stats = summary(entries)
+    w = max((len(name) for name in stats), default=0)
+    for name, s in stats.items():
+        print(f"  {name:<{w}} {s['n']:5d}  erreurs {s['errors']:3d}  TTFT p50/p95 {s['ttft_p50']:6.0f}/{s['ttft_p95']:<6.0f}"
+              f" total p50/p95 {s['total_p50']:6.0f}/{s['total_p95']:<6.0f} ms  {s['tokens']} tokens")
+
+def _bench(n: int, latency: float):
+    """Enregistre n appels (flux et non-flux) vers le stub, puis les rejoue à ×1 et ×10."""
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from openai import OpenAI
+
+    stub = stub_openai.start_in_thread(latency=latency, jitter=latency / 3)
+    with tempfile.TemporaryDirectory(prefix="cassette-") as tmp:
+        path = os.path.join(tmp, "bench.cassette.gz")
+        rec = make_recorder(path, stub.base_url)
+        threading.Thread(target=rec.serve_forever, daemon=True).start()
+
+        def run(base_url):
+            client = OpenAI(api_key="sk-bench", base_url=base_url, max_retries=0)
+
+            def one(i):
+                t0 = time.perf_counter()
+                msgs = [{"role": "user", "content": f"offre {i}"}]
+                if i % 2:
+                    client.chat.completions.create(model="stub", messages=msgs)
+                    return (time.perf_counter() - t0) * 1000
+                for _ in client.chat.completions.create(model="stub", messages=msgs, stream=True,
+                                                        stream_options={"include_usage": True}):
+                    pass
+                return (time.perf_counter() - t0) * 1000
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(8) as pool:
+                lat = list(pool.map(one, range(n)))
+            return time.perf_counter() - t0, _percentile(lat, 50), _percentile(lat, 95)
+
+        wall, p50, p95 = run(rec.base_url)
+        rec.shutdown()
+        print(f"enregistrement : {n} appels en {wall:.2f}s  p50 {p50:.0f} ms  p95 {p95:.0f} ms  "
+              f"({os.path.getsize(path) / 1024:.1f} Ko)")
+        for speed in (1.0, 10.0):
+            srv = start_replay(path, speed=speed)
+            wall, p50, p95 = run(srv.base_url)
+            srv.shutdown()
+            print(f"rejeu ×{speed:<5g}    : {n} appels en {wall:.2f}s  p50 {p50:.0f} ms  p95 {p95:.0f} ms  "
+                  f"{srv.cassette.stats}")
+    stub.shutdown()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Enregistrement / rejeu du trafic LLM.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("record", help="proxy d’enregistrement (pointer OPENAI_API_BASE sur lui)")
+    r.add_argument("cassette")
+    r.add_argument("--upstream", default=None, help=f"API réelle (défaut : OPENAI_API_BASE ou {DEFAULT_UPSTREAM})")
+    r.add_argument("--port", type=int, default=8010)
+    p = sub.add_parser("replay", help="faux serveur OpenAI qui rejoue une cassette")
+    p.add_argument("cassette")
+    p.add_argument("--speed", type=float, default=1.0, help="1 = temps d’origine, 10 = dix fois plus vite, 0 = sans attente")
+    p.add_argument("--strict", action="store_true", help="uniquement les requêtes identiques à l’enregistrement")
+    p.add_argument("--port", type=int, default=8001)
+    i = sub.add_parser("info", help="résumé d’une cassette (TTFT, durées, tokens)")
+    i.add_argument("cassette")
+    b = sub.add_parser("bench", help="enregistre puis rejoue du trafic contre le stub local")
+    b.add_argument("-n", type=int, default=40)
+    b.add_argument("--latency", type=float, default=0.3)
+    a = ap.parse_args()
+
+    if a.cmd == "info":
+        _print_summary(load(a.cassette))
+        sys.exit(0)
+    if a.cmd == "bench":
+        _bench(a.n, a.latency)
+        sys.exit(0)
+    if a.cmd == "record":
+        srv = make_recorder(a.cassette, a.upstream or config.OPENAI_API_BASE, a.port)
+        print(f"Enregistrement {srv.upstream.geturl()} → {a.cassette} ; OPENAI_API_BASE={srv.base_url}")
+    else:
+        srv = make_replayer(a.cassette, a.speed, a.strict, a.port)
+        print(f"Rejeu de {srv.cassette.size} échanges (×{a.speed:g}) sur {srv.base_url}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+        if a.cmd == "record":
+            print(f"{srv.writer.count} échanges enregistrés")
+        else:
+            print(f"Correspondances : {srv.cassette.stats}")
@@ -19,6 +19,19 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "") or None
 MODEL = os.getenv("MODEL", "gpt-4o-mini")  # modèle par défaut si rien n’est défini
 
+# --- Routage LLM (voir llm_router.py) ---
+# Modèles de repli, dans l’ordre : "gpt-4.1-mini,gpt-3.5-turbo" ou "modele@http://hote:port/v1"
+MODEL_FALLBACKS = [m.strip() for m in os.getenv("MODEL_FALLBACKS", "").split(",") if m.strip()]
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+ROUTER_P95_MAX_S = float(os.getenv("ROUTER_P95_MAX_S", "20"))         # au-delà → route jugée lente
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+ROUTER_COOLDOWN_S = float(os.getenv("ROUTER_COOLDOWN_S", "60"))       # mise à l’écart d’une route en erreur
+ROUTER_HEDGE_AFTER_S = float(os.getenv("ROUTER_HEDGE_AFTER_S", "0"))  # 0 = pas de requête dupliquée
+ROUTER_MAX_WORKERS = int(os.getenv("ROUTER_MAX_WORKERS", "32"))  # les doublons perdants occupent un thread jusqu’au bout
+# Enregistre tout le trafic LLM (requêtes, réponses horodatées, usage) dans cette cassette, rejouable
+# hors ligne avec `python cassette.py replay` ; vide = désactivé
+LLM_RECORD = os.getenv("LLM_RECORD", "")
+
 # On ne peut pas travailler sans clé → on plante directement.
 if not OPENAI_API_KEY:
     raise RuntimeError(
@@ -37,6 +50,19 @@ POLICE = os.getenv("DOC_FONT", "Aptos (Body)")
 TAILLE_PT = int(os.getenv("DOC_FONT_SIZE_PT", "12"))
 LINE_SPACING = float(os.getenv("DOC_LINE_SPACING", "1.22"))
 
+# Export PDF : "auto" (Word/LibreOffice puis rendu natif), "office" ou "native" (pur Python, instantané)
+PDF_BACKEND = os.getenv("PDF_BACKEND", "auto").lower()
+# Police TrueType à embarquer par le rendu natif (sinon recherche selon DOC_FONT, puis Calibri/Arial/DejaVu)
+PDF_FONT_FILE = os.getenv("PDF_FONT_FILE") or None
+PDF_FONT_BOLD_FILE = os.getenv("PDF_FONT_BOLD_FILE") or None
+# Cache des conversions Word/LibreOffice, adressé par le contenu du DOCX (LRU borné en taille)
+PDF_CACHE = os.getenv("PDF_CACHE", "1") not in ("0", "false", "False", "")
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "pdf_cache")
+PDF_CACHE_MAX_MB = float(os.getenv("PDF_CACHE_MAX_MB", "200"))
+
+# Formats annexes écrits à côté du DOCX, rendus depuis le même modèle de lettre : "txt,html"
+EXTRA_FORMATS = [f.strip().lower() for f in os.getenv("EXTRA_FORMATS", "").split(",") if f.strip()]
+
 # Marges du document (top, bottom, left, right) en pouces
 MARGES_INCH = tuple(map(float, os.getenv("DOC_MARGINS_INCH", "1.00,0.60,1.10,1.10").split(",")))
 
@@ -47,9 +73,61 @@ ESP_APRES_SALUT_PT = int(os.getenv("DOC_SPACE_AFTER_SALUT_PT", "12"))
 ESP_APRES_PAR_PT = int(os.getenv("DOC_SPACE_AFTER_PAR_PT", "6"))
 ESP_APRES_SIGNATURE_PT = int(os.getenv("DOC_SPACE_AFTER_SIGNATURE_PT", "12"))
 
+# --- Format de réponse du modèle (llm_body.py) ---
+# auto (défaut) : json_schema pour les modèles qui l’acceptent (gpt-4o, gpt-4.1, o-series…), sinon
+# json_object (ex. gpt-3.5-turbo) ; json_schema / json_object / text pour forcer un mode.
+# Un HTTP 400 sur response_format fait rétrograder d’un cran la route concernée (modèle principal
+# ou repli), jusqu’à text (texte libre découpé) ; les autres routes gardent leur mode.
+LETTER_OUTPUT = os.getenv("LETTER_OUTPUT", "auto")
+
+# --- Post-validation du corps de lettre (voir letter_validator.py) ---
+LETTER_VALIDATE = os.getenv("LETTER_VALIDATE", "1") not in ("0", "false", "False", "")
+LETTER_MIN_PARAS = int(os.getenv("LETTER_MIN_PARAS", "3"))
+LETTER_MAX_PARAS = int(os.getenv("LETTER_MAX_PARAS", "4"))
+LETTER_MIN_WORDS = int(os.getenv("LETTER_MIN_WORDS", "35"))    # par paragraphe
+LETTER_MAX_WORDS = int(os.getenv("LETTER_MAX_WORDS", "170"))   # par paragraphe
+LETTER_COPY_NGRAM = int(os.getenv("LETTER_COPY_NGRAM", "8"))   # n-gramme commun avec l’annonce = recopie
+LETTER_MAX_REPAIRS = int(os.getenv("LETTER_MAX_REPAIRS", "1")) # réécritures partielles max par lettre
+# Expressions interdites supplémentaires, séparées par "|"
+LETTER_FORBIDDEN = [p.strip() for p in os.getenv("LETTER_FORBIDDEN", "").split("|") if p.strip()]
+
 # Dossier de sortie par défaut
 OUT_DIR = os.getenv("OUTPUT_DIR", "generated_letters")
 
+# Journal de consommation LLM (SQLite) : tokens, latence, coût par appel
+USAGE_DB = os.getenv("USAGE_DB", "usage_ledger.sqlite3")
+
+# Index plein texte des lettres générées (letter_index.py)
+LETTER_INDEX_DB = os.getenv("LETTER_INDEX_DB", "letters_index.sqlite3")
+
+# --- Offres quasi identiques (dedup.py) ---
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") not in ("0", "false", "False", "")
+DEDUP_DB = os.getenv("DEDUP_DB", "offers_dedup.sqlite3")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))      # similarité de Jaccard estimée
+# Modes automatiques (serveur, dossier surveillé) : "reuse" = lettre existante, "generate" = on régénère
+DEDUP_ON_DUPLICATE = os.getenv("DEDUP_ON_DUPLICATE", "reuse")
+
+# --- Mode serveur HTTP local (server.py) ---
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8765"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "4"))        # générations simultanées
+SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "64"))  # au-delà → 503 + Retry-After
+
+# --- Mode dossier surveillé (watcher.py) ---
+WATCH_DIR = os.getenv("WATCH_DIR") or None
+WATCH_DEBOUNCE_S = float(os.getenv("WATCH_DEBOUNCE_S", "2"))  # fichier stable depuis N s avant lecture
+WATCH_POLL_S = float(os.getenv("WATCH_POLL_S", "1"))          # période du sondage (hors inotify)
+WATCH_WORKERS = int(os.getenv("WATCH_WORKERS", "2"))
+WATCH_PDF = os.getenv("WATCH_PDF", "1") not in ("0", "false", "False", "")
+# Index des fichiers déjà traités : hors du dossier surveillé (ses écritures y réveilleraient le sondage)
+WATCH_INDEX_DB = os.getenv("WATCH_INDEX_DB", "watch_index.sqlite3")
+WATCH_RETRY_S = float(os.getenv("WATCH_RETRY_S", "30"))           # 1re relance après une erreur, puis ×2
+WATCH_RETRY_MAX_S = float(os.getenv("WATCH_RETRY_MAX_S", "3600"))  # plafond de l’attente entre relances
+
+# --- Mode lot (batch_api.py) : génération différée via la Batch API, moitié prix ---
+BATCH_STATE = os.getenv("BATCH_STATE", "batch_state.json")   # point de reprise du lot en cours
+BATCH_POLL_S = float(os.getenv("BATCH_POLL_S", "60"))         # période de sondage du statut
+BATCH_COST_FACTOR = float(os.getenv("BATCH_COST_FACTOR", "0.5"))
+
 # --- Liste publique des banques/entreprises cibles ---
 # Sert pour proposer un choix, pas de données sensibles ici.
 BANQUES = sorted([
@@ -0,0 +1,201 @@
+# dedup.py — Détection des offres quasi identiques (MinHash + LSH), avant tout appel LLM
+# Les banques republient le même poste (autre ville, autre job board, deux mots changés) :
+# inutile de payer une nouvelle génération. On garde une signature MinHash de chaque offre
+# traitée et ses clés de bande LSH (par banque), le tout en SQLite avec ajout incrémental :
+# rien à charger au démarrage, une recherche ne lit qu’une poignée de candidats, quel que soit
+# le nombre d’offres stockées.
+import array, hashlib, json, os, random, re, sqlite3, sys, threading, time, zlib
+import config
+import letter_index
+
+NUM_PERM = 64          # longueur de signature
+BANDS = 16             # 16 bandes × 4 lignes → seuil LSH ≈ (1/16)^(1/4) ≈ 0.5
+ROWS = NUM_PERM // BANDS
+_P = (1 << 61) - 1     # premier de Mersenne pour le hachage universel
+_rng = random.Random(20240611)   # graines figées : signatures comparables d’un lancement à l’autre
+_A = [_rng.randrange(1, _P) for _ in range(NUM_PERM)]
+_B = [_rng.randrange(0, _P) for _ in range(NUM_PERM)]
+WORD_RX = re.compile(r"\w+", re.UNICODE)
+# Seuls mots retirés d’un intitulé avant comparaison : lieu et mentions de genre. Tout le reste
+# (niveau, numéro, spécialité : Junior/Senior, Trader 1/2, Quant/Credit) doit être identique.
+_LOCATION_RX = re.compile(
+    r"\b(paris|london|londres|new york|nyc|frankfurt|francfort|amsterdam|zurich|zürich|geneva|genève|geneve"
+    r"|luxembourg|brussels|bruxelles|dublin|milan|milano|madrid|monaco|hong kong|singapore|singapour|tokyo"
+    r"|sydney|dubai|chicago|toronto|remote|hybrid|hybride|based)\b")
+_GENDER_RX = re.compile(r"\b(h f|f h|m f|f m|m w d|m f d|w m d|all genders)\b")
+
+def _norm(s: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", (s or "").lower())).strip()
+
+def _shingles(text: str, k: int = 3) -> set:
+    # 3-grammes de mots, hachés de façon stable (crc32 : `hash()` change à chaque processus)
+    w = WORD_RX.findall((text or "").lower())
+    if len(w) < k:
+        return {zlib.crc32(" ".join(w).encode())} if w else set()
+    return {zlib.crc32(" ".join(w[i:i + k]).encode()) for i in range(len(w) - k + 1)}
+
+def signature(text: str) -> tuple:
+    """Signature MinHash (NUM_PERM entiers) d’un texte d’offre."""
+    hs = _shingles(text)
+    if not hs:
+        return tuple([_P] * NUM_PERM)
+    return tuple(min([(a * x + b) % _P for x in hs]) for a, b in zip(_A, _B))
+
+def similarity(sig1: tuple, sig2: tuple) -> float:
+    """Estimation de la similarité de Jaccard entre deux offres."""
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / NUM_PERM
+
+def _role_key(position: str) -> str:
+    # “Analyst – Paris” ≡ “Analyst London (H/F)” → "analyst" ; “Junior Trader” ≠ “Senior Trader”
+    key = _GENDER_RX.sub(" ", _LOCATION_RX.sub(" ", _norm(position)))
+    return " ".join(key.split())
+
+class Match:
+    """Offre déjà traitée jugée quasi identique."""
+    __slots__ = ("similarity", "bank", "position", "letter_path", "created", "oid", "body")
+
+    def __init__(self, similarity, bank, position, letter_path, created, oid=None, body=None):
+        self.similarity, self.bank, self.position = similarity, bank, position
+        self.letter_path, self.created = letter_path, created
+        self.oid, self.body = oid, body   # corps de la lettre (paragraphes), chargé par find_reusable
+
+    def __repr__(self):
+        return f"Match({self.similarity:.2f}, {self.bank!r}, {self.position!r}, {self.letter_path!r})"
+
+def _band_keys(bank_norm: str, sig_bytes: bytes) -> list:
+    # Une clé entière stable (64 bits signés, type INTEGER SQLite) par bande : banque + n° + valeurs
+    step, prefix = ROWS * 8, bank_norm.encode("utf-8") + b"\0"
+    return [int.from_bytes(hashlib.blake2b(prefix + bytes((i,)) + sig_bytes[i * step:(i + 1) * step],
+                                           digest_size=8).digest(), "big", signed=True)
+            for i in range(BANDS)]
+
+class NearDupIndex:
+    """Index persistant des offres traitées ; recherche LSH restreinte à la même banque.
+    Les seaux LSH vivent dans SQLite (table `bands`, une clé entière par bande) : rien n’est chargé
+    au démarrage, une recherche lit la poignée de candidats et leurs signatures (octets bruts)."""
+    def __init__(self, db_path: str, threshold: float = None):
+        self.threshold = threshold if threshold is not None else float(getattr(config, "DEDUP_THRESHOLD", 0.8))
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS offers (id INTEGER PRIMARY KEY, bank TEXT, position TEXT,"
+            " letter_path TEXT, created REAL, sig BLOB, body TEXT);"
+            "CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, offer_id INTEGER NOT NULL,"
+            " PRIMARY KEY (key, offer_id)) WITHOUT ROWID;")
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM offers").fetchone()[0]
+
+    def find(self, bank: str, position: str, offer: str = None, sig: tuple = None) -> list:
+        """Offres déjà traitées (même banque, même intitulé au lieu près) au-dessus du seuil, plus similaires d’abord."""
+        sig = sig or signature(offer)
+        b, role = _norm(bank), _role_key(position)
+        keys = _band_keys(b, array.array("Q", sig).tobytes())
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, bank, position, letter_path, created, sig FROM offers WHERE id IN"
+                f" (SELECT offer_id FROM bands WHERE key IN ({','.join('?' * len(keys))}))", keys).fetchall()
+        out = []
+        for oid, m_bank, m_pos, path, created, blob in rows:
+            if _norm(m_bank) != b or _role_key(m_pos) != role:
+                continue
+            s = similarity(sig, array.array("Q", blob))
+            if s >= self.threshold:
+                out.append(Match(s, m_bank, m_pos, path, created, oid))
+        return sorted(out, key=lambda m: (-m.similarity, -m.created))
+
+    def body(self, oid: int):
+        """Paragraphes du corps de la lettre enregistrés avec l’offre (None pour un index antérieur)."""
+        with self.lock:
+            row = self.db.execute("SELECT body FROM offers WHERE id = ?", (oid,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def add(self, bank: str, position: str, offer: str = None, letter_path: str = None, sig: tuple = None,
+            body=None):
+        """Enregistre une offre traitée (ajout incrémental, persistant) et le corps de sa lettre."""
+        sig = sig or signature(offer)
+        created = time.time()
+        with self.lock:
+            raw = array.array("Q", sig).tobytes()
+            cur = self.db.execute("INSERT INTO offers (bank, position, letter_path, created, sig, body)"
+                                  " VALUES (?,?,?,?,?,?)",
+                                  (bank, position, letter_path, created, raw,
+                                   json.dumps(list(body), ensure_ascii=False) if body else None))
+            self.db.executemany("INSERT OR IGNORE INTO bands VALUES (?, ?)",
+                                ((k, cur.lastrowid) for k in _band_keys(_norm(bank), raw)))
+            self.db.commit()
+
+def _app_dir() -> str:
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+_default = None
+_default_lock = threading.Lock()
+
+def default_index() -> NearDupIndex:
+    """Index partagé du processus (chargé à la première utilisation)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            p = getattr(config, "DEDUP_DB", "offers_dedup.sqlite3")
+            _default = NearDupIndex(p if os.path.isabs(p) else os.path.join(_app_dir(), p))
+        return _default
+
+def find_reusable(bank: str, position: str, offer: str = None, sig: tuple = None):
+    """Meilleure offre quasi identique dont le corps de lettre est disponible (`match.body`), sinon None.
+    Le corps est ensuite re-rendu pour le poste demandé (pipeline.reused_result)."""
+    if not getattr(config, "DEDUP_ENABLED", True):
+        return None
+    idx = default_index()
+    for m in idx.find(bank, position, offer, sig=sig):
+        m.body = idx.body(m.oid)
+        if not m.body and m.letter_path and os.path.isfile(m.letter_path):
+            try:
+                m.body = letter_index.docx_body(m.letter_path)
+            except Exception:
+                continue   # DOCX illisible : offre non réutilisable
+        if m.body:
+            return m
+    return None
+
+# Mesure rapide : python dedup.py 100000
+if __name__ == "__main__":
+    import tempfile, tracemalloc
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rnd = random.Random(1)
+    vocab = [f"w{i}" for i in range(5000)]
+    base = " ".join(rnd.choice(vocab) for _ in range(300))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        setup = NearDupIndex(path)
+        t = time.perf_counter()
+        with setup.db:
+            for i in range(n):
+                # Signatures aléatoires : on mesure l’index, pas le calcul MinHash
+                raw = array.array("Q", (rnd.getrandbits(61) for _ in range(NUM_PERM))).tobytes()
+                cur = setup.db.execute("INSERT INTO offers (bank, position, created, sig) VALUES (?,?,?,?)",
+                                       (f"Bank {i % 100}", "Analyst", 0.0, raw))
+                setup.db.executemany("INSERT OR IGNORE INTO bands VALUES (?, ?)",
+                                     ((k, cur.lastrowid) for k in _band_keys(_norm(f"Bank {i % 100}"), raw)))
+        setup.db.close()
+        print(f"{n} offres insérées en {time.perf_counter() - t:.1f}s")
+        tracemalloc.start()
+        t = time.perf_counter()
+        idx = NearDupIndex(path)
+        elapsed = time.perf_counter() - t
+        mem = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{len(idx)} offres, ouverture en {elapsed * 1e3:.1f} ms, {mem / 1e3:.0f} Ko en mémoire")
+        idx.add("Bank 7", "Analyst Paris", base, "x.docx")
+        near = base.replace(base.split()[10], "changed", 1) + " London"
+        sig = signature(near)
+        t = time.perf_counter()
+        for _ in range(1000):
+            res = idx.find("Bank 7", "Analyst London", sig=sig)
+        print(f"recherche : {(time.perf_counter() - t) / 1000 * 1e6:.0f} µs — {res}")
+        t = time.perf_counter()
+        signature(near)
+        print(f"signature MinHash d’une offre de 300 mots : {(time.perf_counter() - t) * 1e3:.1f} ms")
+        idx.db.close()
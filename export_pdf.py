@@ -1,7 +1,11 @@
 # export_pdf.py — Conversion DOCX -> PDF
 # Tente d’abord avec Microsoft Word (via COM sur Windows).
 # Si échec, bascule sur LibreOffice (mode headless).
-import os, time, subprocess
+# letter_to_pdf() ajoute le rendu natif pur Python (pdf_native.py), en principal ou en secours.
+# Cache des conversions : un DOCX au contenu identique (même texte, mêmes styles) à un DOCX déjà
+# converti récupère le PDF stocké — une empreinte + une copie au lieu de secondes de Word/LibreOffice.
+import hashlib, os, re, shutil, sys, threading, time, subprocess, zipfile
+import config
 
 def _ensure_dir(path):
     """Crée le dossier cible si nécessaire (par ex. pour accueillir le PDF)."""
@@ -9,42 +13,184 @@ def _ensure_dir(path):
     if d and not os.path.isdir(d):
         os.makedirs(d, exist_ok=True)
 
+# ————— Cache des conversions (adressé par le contenu du DOCX) —————
+# Parties du DOCX qui déterminent le rendu ; docProps (dates de création/modif) est volontairement ignoré.
+_CACHE_PARTS_RX = re.compile(r"^word/(document\.xml|styles\.xml|numbering\.xml|settings\.xml|fontTable\.xml"
+                             r"|theme/.*\.xml|(header|footer)\d*\.xml|_rels/document\.xml\.rels)$")
+# Identifiants de révision que Word réécrit à chaque enregistrement sans changer le rendu
+_RSID_RX = re.compile(rb'\s+w:rsid\w*="[^"]*"')
+_CACHE_VERSION = b"2"   # 2 : blancs entre balises conservés dans l’empreinte
+
+def _cache_dir() -> str:
+    d = getattr(config, "PDF_CACHE_DIR", "pdf_cache")
+    if not os.path.isabs(d):
+        base = os.path.dirname(sys.executable) if getattr(sys, "frozen", False) else os.path.dirname(os.path.abspath(__file__))
+        d = os.path.join(base, d)
+    return d
+
+def docx_fingerprint(docx_path: str) -> str:
+    """Empreinte SHA-256 du contenu normalisé (document.xml, styles, relations…) d’un DOCX."""
+    h = hashlib.sha256(_CACHE_VERSION)
+    with zipfile.ZipFile(docx_path) as z:
+        for name in sorted(n for n in z.namelist() if _CACHE_PARTS_RX.match(n)):
+            # Blancs laissés tels quels : un <w:t xml:space="preserve"> </w:t> est du texte rendu
+            xml = _RSID_RX.sub(b"", z.read(name))
+            h.update(name.encode() + b"\0" + hashlib.sha256(xml).digest())
+    return h.hexdigest()
+
+def _cache_fetch(key: str, pdf_path: str) -> bool:
+    """Copie le PDF en cache vers `pdf_path` si présent (et le marque récemment utilisé)."""
+    entry = os.path.join(_cache_dir(), key + ".pdf")
+    try:
+        os.utime(entry)   # date de modif = dernier usage → ordre LRU
+    except OSError:
+        return False
+    # Copie plutôt que lien physique : les renderers réécrivent les fichiers sur place,
+    # un lien partagé corromprait l’entrée du cache.
+    tmp = f"{pdf_path}.{os.getpid()}.tmp"
+    try:
+        shutil.copyfile(entry, tmp)
+        os.replace(tmp, pdf_path)
+    except OSError:
+        # Entrée évincée entre-temps, ou PDF cible ouvert dans un lecteur : on reconvertit
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+    return True
+
+def _cache_store(key: str, pdf_path: str):
+    """Range une copie du PDF converti puis ramène le cache sous PDF_CACHE_MAX_MB (moins récents d’abord)."""
+    d = _cache_dir()
+    os.makedirs(d, exist_ok=True)
+    tmp = os.path.join(d, f"{key}.{os.getpid()}.tmp")
+    shutil.copyfile(pdf_path, tmp)
+    os.replace(tmp, os.path.join(d, key + ".pdf"))
+
+    budget = float(getattr(config, "PDF_CACHE_MAX_MB", 200)) * 1024 * 1024
+    entries, total = [], 0
+    with os.scandir(d) as it:
+        for e in it:
+            if e.name.endswith(".pdf"):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+    for _mtime, size, path in sorted(entries):
+        if total <= budget:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
 def docx_to_pdf(docx_path: str) -> str:
-    """Convertit un fichier DOCX en PDF.
-    - Si Word est dispo (Windows), on l’utilise via COM.
-    - Sinon, fallback LibreOffice en mode ligne de commande.
-    """
+    """Convertit un fichier DOCX en PDF (Word, sinon LibreOffice), via le cache des conversions :
+    un DOCX au contenu déjà converti n’est pas reconverti, le PDF stocké est copié en place."""
     if not os.path.isfile(docx_path):
         raise FileNotFoundError(docx_path)
+    if not getattr(config, "PDF_CACHE", True):
+        return _office_to_pdf(docx_path)
 
-    abs_docx = os.path.abspath(docx_path)
-    base, _ = os.path.splitext(abs_docx)
-    pdf_path = base + ".pdf"
-    _ensure_dir(pdf_path)
+    pdf_path = os.path.splitext(os.path.abspath(docx_path))[0] + ".pdf"
+    try:
+        key = docx_fingerprint(docx_path)
+    except (OSError, zipfile.BadZipFile):
+        key = None   # DOCX illisible comme archive : on laisse Word/LibreOffice trancher
+    if key and _cache_fetch(key, pdf_path):
+        return pdf_path
+    pdf_path = _office_to_pdf(docx_path)
+    if key:
+        try:
+            _cache_store(key, pdf_path)
+        except OSError:
+            pass  # cache plein / en lecture seule : la conversion, elle, a réussi
+    return pdf_path
+
+# ————— Instance Word réutilisée (mode serveur) —————
+# Démarrer puis quitter Word coûte plusieurs secondes par lettre. Un worker du serveur appelle
+# keep_word_open() une fois : ses conversions réutilisent ensuite la même instance (COM est lié
+# au thread, d’où une instance par thread), fermée par release_word() à l’arrêt du worker.
+_word_local = threading.local()
 
-    # Tentative 1 : Microsoft Word (COM Windows)
+def _start_word():
+    import pythoncom
+    import win32com.client
+    from win32com.client import gencache
+
+    pythoncom.CoInitialize()   # indispensable hors du thread principal
     try:
-        import win32com.client
-        from win32com.client import gencache, constants
+        # Initialise le cache COM proprement (utile si première utilisation)
+        gencache.EnsureDispatch("Word.Application")
+        word = win32com.client.Dispatch("Word.Application")
+    except Exception:
+        # Si EnsureDispatch échoue, on tente un Dispatch direct
+        word = win32com.client.Dispatch("Word.Application")
+    # On garde Word invisible et silencieux
+    word.Visible = False
+    word.DisplayAlerts = 0
+    return word
 
+def keep_word_open() -> bool:
+    """Démarre une instance Word gardée ouverte pour le thread courant. False si Word est
+    indisponible (pas Windows, pas pywin32…) : les conversions passent alors par LibreOffice."""
+    try:
+        _word_local.word = _start_word()
+    except Exception:
+        _word_local.word = None
+        return False
+    _word_local.keep = True
+    return True
+
+def release_word():
+    """Ferme l’instance Word du thread courant (fin d’un worker)."""
+    word, _word_local.word, _word_local.keep = getattr(_word_local, "word", None), None, False
+    if word is not None:
         try:
-            # Initialise le cache COM proprement (utile si première utilisation)
-            gencache.EnsureDispatch("Word.Application")
-            word = win32com.client.Dispatch("Word.Application")
+            word.Quit()
         except Exception:
-            # Si EnsureDispatch échoue, on tente un Dispatch direct
-            word = win32com.client.Dispatch("Word.Application")
+            pass
 
-        # On garde Word invisible et silencieux
-        word.Visible = False
-        word.DisplayAlerts = 0
+def _word_to_pdf(abs_docx: str, pdf_path: str):
+    from win32com.client import constants
 
+    keep = getattr(_word_local, "keep", False)
+    word = getattr(_word_local, "word", None) if keep else None
+    if word is None:
+        word = _start_word()
+        if keep:
+            _word_local.word = word
+    try:
         # Ouverture du DOCX et export direct en PDF
         doc = word.Documents.Open(abs_docx)
         doc.SaveAs(pdf_path, FileFormat=constants.wdFormatPDF)
         doc.Close(False)
-        word.Quit()
-        time.sleep(0.2)  # petit délai pour laisser Word finir son boulot
+    except Exception:
+        if keep:
+            # Instance peut-être morte (Word fermé à la main, plantage) : recréée à la prochaine lettre
+            release_word()
+            _word_local.keep = True
+        raise
+    finally:
+        if not keep:
+            word.Quit()
+            time.sleep(0.2)  # petit délai pour laisser Word finir son boulot
+
+def _office_to_pdf(docx_path: str) -> str:
+    """Convertit un fichier DOCX en PDF.
+    - Si Word est dispo (Windows), on l’utilise via COM.
+    - Sinon, fallback LibreOffice en mode ligne de commande.
+    """
+    if not os.path.isfile(docx_path):
+        raise FileNotFoundError(docx_path)
+
+    abs_docx = os.path.abspath(docx_path)
+    base, _ = os.path.splitext(abs_docx)
+    pdf_path = base + ".pdf"
+    _ensure_dir(pdf_path)
+
+    # Tentative 1 : Microsoft Word (COM Windows), instance du thread si keep_word_open()
+    try:
+        _word_to_pdf(abs_docx, pdf_path)
 
         if not os.path.isfile(pdf_path):
             raise RuntimeError("Word a terminé sans produire de PDF.")
@@ -83,3 +229,28 @@ def _find_soffice():
         if os.path.isfile(exe):
             return exe
     return None
+
+def letter_to_pdf(docx_path: str, letter) -> str:
+    """PDF d’une lettre (letter_model.Letter), à côté du DOCX, selon config.PDF_BACKEND :
+    - "native" : rendu direct pur Python (quelques ms, aucune dépendance externe)
+    - "office" : Word / LibreOffice uniquement (conversion fidèle du DOCX)
+    - "auto"   : Word / LibreOffice, puis rendu natif si aucun des deux n’aboutit
+    """
+    backend = (getattr(config, "PDF_BACKEND", "auto") or "auto").lower()
+    pdf_path = os.path.splitext(os.path.abspath(docx_path))[0] + ".pdf"
+
+    def native():
+        import pdf_native  # import local : inutile de charger les polices si Word/LibreOffice suffit
+        _ensure_dir(pdf_path)
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_native.render_pdf(letter))
+        return pdf_path
+
+    if backend == "native":
+        return native()
+    try:
+        return docx_to_pdf(docx_path)
+    except Exception:
+        if backend == "office":
+            raise
+        return native()
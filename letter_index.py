@@ -0,0 +1,255 @@
+# letter_index.py — Index plein texte des lettres générées (recherche et réutilisation instantanées)
+# “Qu’ai-je écrit à Optiver sur le market making ?” sans ouvrir les DOCX un par un.
+# L’index est alimenté au moment de l’écriture (writer.save_letter_files), à partir des paragraphes
+# déjà nettoyés du modèle de lettre : aucun DOCX n’est relu. Stockage : SQLite FTS5 (index inversé
+# compact, classement BM25), une ligne par fichier, mise à jour incrémentale.
+# Les dossiers existants sont rattrapés une fois par `backfill` (lecture en flux de word/document.xml ;
+# les fichiers déjà indexés et inchangés ne sont plus relus, ceux effacés du disque sont retirés).
+#
+# Usage :
+#   python letter_index.py search "market making" --bank Optiver --since 2025-01-01
+#   python letter_index.py backfill [dossier]
+import argparse, datetime, os, re, sqlite3, sys, threading, time, zipfile
+from xml.etree.ElementTree import iterparse
+import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS letters (
+    id       INTEGER PRIMARY KEY,
+    path     TEXT    NOT NULL UNIQUE,
+    bank     TEXT    NOT NULL,
+    position TEXT    NOT NULL,
+    created  REAL    NOT NULL,
+    size     INTEGER,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS letters_bank    ON letters(bank COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS letters_created ON letters(created);
+CREATE VIRTUAL TABLE IF NOT EXISTS letters_fts USING fts5(
+    bank, position, body, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+# Poids BM25 par colonne (banque, poste, corps) : un mot du titre du poste compte double
+_WEIGHTS = (0.5, 2.0, 1.0)
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_TERM_RX = re.compile(r'"([^"]+)"|(\S+)')
+_WORD_RX = re.compile(r"\w+", re.UNICODE)
+_SALUT_RX = re.compile(r"^(dear|bonjour|madame|monsieur)\b", re.IGNORECASE)
+_CLOSE_RX = re.compile(r"^(yours\s+sincerely|kind\s+regards|best\s+regards|cordialement)\b", re.IGNORECASE)
+_COPY_RX = re.compile(r"\s\(\d+\)$")   # suffixe “ (1)” d’un fichier verrouillé lors de l’écriture
+
+class Hit:
+    """Résultat de recherche (du plus pertinent au moins pertinent)."""
+    __slots__ = ("path", "bank", "position", "created", "snippet", "score")
+
+    def __init__(self, path, bank, position, created, snippet, score):
+        self.path, self.bank, self.position = path, bank, position
+        self.created, self.snippet, self.score = created, snippet, score
+
+    def __repr__(self):
+        return f"Hit({self.bank!r}, {self.position!r}, {self.path!r})"
+
+def _app_dir() -> str:
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+def _match_query(text: str = None, position: str = None) -> str:
+    """Requête FTS5 sûre depuis une saisie libre : "expression exacte", sinon mots en préfixe (ET)."""
+    parts = []
+    for phrase, word in _TERM_RX.findall(text or ""):
+        words = _WORD_RX.findall(phrase or word)
+        if phrase and words:
+            parts.append('"' + " ".join(words) + '"')
+        else:
+            parts += [f'"{w}"*' for w in words]
+    parts += [f'position : "{w}"*' for w in _WORD_RX.findall(position or "")]
+    return " AND ".join(parts)
+
+class LetterIndex:
+    """Index des lettres (SQLite FTS5). Partageable entre threads."""
+    def __init__(self, db_path: str):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript(_SCHEMA)
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM letters").fetchone()[0]
+
+    def add(self, path: str, bank: str, position: str, paragraphs, created: float = None, commit: bool = True):
+        """Indexe (ou réindexe) la lettre écrite sous `path`."""
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        except OSError:
+            size = mtime_ns = None
+        body = "\n\n".join(paragraphs)
+        with self.lock:
+            row = self.db.execute("SELECT id FROM letters WHERE path = ?", (path,)).fetchone()
+            if row:
+                self.db.execute("DELETE FROM letters_fts WHERE rowid = ?", (row[0],))
+                self.db.execute("UPDATE letters SET bank = ?, position = ?, created = ?, size = ?, mtime_ns = ?"
+                                " WHERE id = ?", (bank, position, created or time.time(), size, mtime_ns, row[0]))
+                lid = row[0]
+            else:
+                lid = self.db.execute(
+                    "INSERT INTO letters (path, bank, position, created, size, mtime_ns) VALUES (?,?,?,?,?,?)",
+                    (path, bank, position, created or time.time(), size, mtime_ns)).lastrowid
+            self.db.execute("INSERT INTO letters_fts (rowid, bank, position, body) VALUES (?,?,?,?)",
+                            (lid, bank, position, body))
+            if commit:
+                self.db.commit()
+
+    def search(self, text: str = None, bank: str = None, position: str = None,
+               since: float = None, until: float = None, limit: int = 20) -> list:
+        """Lettres classées par pertinence (BM25) ; sans mots-clés, les plus récentes d’abord.
+        `text` : mots (préfixes acceptés) et "expressions exactes" ; `bank` : nom exact (casse libre) ;
+        `position` : mots du poste ; `since` / `until` : timestamps."""
+        match = _match_query(text, position)
+        where, args = ["l.created >= ?", "l.created < ?"], [since or 0, until or float("inf")]
+        if bank:
+            where.append("l.bank = ? COLLATE NOCASE")
+            args.append(bank)
+        if match:
+            sql = ("SELECT l.path, l.bank, l.position, l.created,"
+                   " snippet(letters_fts, 2, '[', ']', ' … ', 18), bm25(letters_fts, ?, ?, ?) AS score"
+                   " FROM letters_fts JOIN letters l ON l.id = letters_fts.rowid"
+                   " WHERE letters_fts MATCH ? AND " + " AND ".join(where) +
+                   " ORDER BY score, l.created DESC LIMIT ?")
+            args = [*_WEIGHTS, match, *args, limit]
+        else:
+            sql = ("SELECT l.path, l.bank, l.position, l.created, substr(f.body, 1, 160), 0"
+                   " FROM letters l JOIN letters_fts f ON f.rowid = l.id"
+                   " WHERE " + " AND ".join(where) + " ORDER BY l.created DESC LIMIT ?")
+            args = [*args, limit]
+        with self.lock:
+            rows = self.db.execute(sql, args).fetchall()
+        return [Hit(p, b, pos, created, " ".join((snip or "").split()), score)
+                for p, b, pos, created, snip, score in rows]
+
+    def backfill(self, root: str = None, progress=None) -> int:
+        """Indexe les DOCX de `root` (défaut : dossier de sortie) absents de l’index ou modifiés depuis,
+        et retire de l’index les lettres de `root` supprimées du disque.
+        Retourne le nombre de lettres (ré)indexées."""
+        root = os.path.abspath(root or os.path.join(_app_dir(), getattr(config, "OUT_DIR", "generated_letters")))
+        with self.lock:
+            known = {p: (s, m) for p, s, m in self.db.execute("SELECT path, size, mtime_ns FROM letters")}
+        n, seen = 0, set()
+        for dirpath, _dirs, files in os.walk(root):
+            for name in files:
+                if not name.lower().endswith(".docx") or name.startswith("~$"):
+                    continue
+                path = os.path.abspath(os.path.join(dirpath, name))
+                seen.add(path)
+                try:
+                    st = os.stat(path)
+                    if known.get(path) == (st.st_size, st.st_mtime_ns):
+                        continue
+                    bank, position = _names_from_path(path)
+                    self.add(path, bank, position, docx_body(path), created=st.st_mtime, commit=False)
+                except (OSError, zipfile.BadZipFile, SyntaxError):
+                    continue  # DOCX corrompu ou en cours d’écriture : on le reprendra au prochain passage
+                n += 1
+                if n % 200 == 0:
+                    with self.lock:
+                        self.db.commit()
+                    if progress:
+                        progress(n)
+        # Lettres de ce dossier effacées (ou renommées) depuis : plus de résultat vers un fichier absent
+        gone = [p for p in known if p.startswith(os.path.join(root, "")) and p not in seen]
+        with self.lock:
+            for path in gone:
+                self.db.execute("DELETE FROM letters_fts WHERE rowid = (SELECT id FROM letters WHERE path = ?)",
+                                (path,))
+                self.db.execute("DELETE FROM letters WHERE path = ?", (path,))
+            self.db.commit()
+            if n or gone:
+                self.db.execute("INSERT INTO letters_fts (letters_fts) VALUES ('optimize')")
+                self.db.commit()
+        return n
+
+# ————— Lecture des DOCX existants (rattrapage, et corps des anciennes offres pour dedup) —————
+def _docx_paragraphs(path: str):
+    """Paragraphes d’un DOCX, lus en flux depuis word/document.xml (sans python-docx)."""
+    with zipfile.ZipFile(path) as z, z.open("word/document.xml") as f:
+        parts = []
+        for _event, el in iterparse(f):
+            if el.tag == _W + "t":
+                parts.append(el.text or "")
+            elif el.tag == _W + "br":
+                parts.append("\n")
+            elif el.tag == _W + "p":
+                yield "".join(parts).strip()
+                parts = []
+                el.clear()
+
+def docx_body(path: str) -> list:
+    """Corps de la lettre : entre la salutation et la formule finale (tout le texte à défaut)."""
+    paras = [p for p in _docx_paragraphs(path) if p]
+    start = next((i + 1 for i, p in enumerate(paras) if _SALUT_RX.match(p)), 0)
+    end = next((i for i in range(len(paras) - 1, start - 1, -1) if _CLOSE_RX.match(paras[i])), len(paras))
+    return paras[start:end] or paras
+
+def _names_from_path(path: str) -> tuple:
+    """(banque, poste) depuis <OUT_DIR>/<banque>/Cover Letter <nom> - <banque> - <poste>.docx"""
+    bank = os.path.basename(os.path.dirname(path))
+    stem = _COPY_RX.sub("", os.path.splitext(os.path.basename(path))[0])
+    marker = f" - {bank} - "
+    position = stem.split(marker, 1)[1] if marker in stem else stem.rsplit(" - ", 1)[-1]
+    return bank, position.replace("_", " ")
+
+# ————— Index partagé —————
+_default = None
+_default_lock = threading.Lock()
+
+def db_path() -> str:
+    p = getattr(config, "LETTER_INDEX_DB", "letters_index.sqlite3")
+    return p if os.path.isabs(p) else os.path.join(_app_dir(), p)
+
+def default_index() -> LetterIndex:
+    """Index partagé du processus (ouvert à la première utilisation)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = LetterIndex(db_path())
+        return _default
+
+def index_letter(letter, docx_path: str):
+    """Indexe une lettre qui vient d’être écrite (letter_model.Letter). Ne lève jamais :
+    l’index ne doit pas faire échouer une génération (l’échec est signalé sur stderr, `backfill` rattrape)."""
+    try:
+        default_index().add(docx_path, letter.bank, letter.position, letter.body)
+    except Exception as e:
+        print(f"letter_index : {docx_path} non indexée ({type(e).__name__}: {e})", file=sys.stderr)
+
+def _parse_date(s: str) -> float:
+    return datetime.datetime.fromisoformat(s).timestamp()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Recherche plein texte dans les lettres générées.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("search", help="recherche classée (mots, \"expressions\", préfixes)")
+    s.add_argument("text", nargs="?", default="")
+    s.add_argument("--bank")
+    s.add_argument("--position")
+    s.add_argument("--since", type=_parse_date, help="AAAA-MM-JJ")
+    s.add_argument("--until", type=_parse_date, help="AAAA-MM-JJ")
+    s.add_argument("-n", "--limit", type=int, default=20)
+    b = sub.add_parser("backfill", help="indexe les lettres déjà présentes sur disque")
+    b.add_argument("root", nargs="?")
+    a = ap.parse_args()
+
+    idx = default_index()
+    if a.command == "backfill":
+        t = time.perf_counter()
+        n = idx.backfill(a.root, progress=lambda k: print(f"  {k} lettres…"))
+        print(f"{n} lettre(s) indexée(s) en {time.perf_counter() - t:.1f}s — {len(idx)} au total ({db_path()})")
+    else:
+        t = time.perf_counter()
+        hits = idx.search(a.text, a.bank, a.position, a.since, a.until, a.limit)
+        ms = (time.perf_counter() - t) * 1000
+        for h in hits:
+            day = datetime.datetime.fromtimestamp(h.created).strftime("%Y-%m-%d")
+            print(f"{day}  {h.bank} – {h.position}\n    {h.snippet}\n    {h.path}")
+        print(f"{len(hits)} résultat(s) en {ms:.1f} ms")
@@ -0,0 +1,224 @@
+# letter_model.py — Représentation intermédiaire (immuable) d’une lettre, commune à tous les formats
+# On prend les décisions de contenu UNE fois (en-tête, sujet, salutation, corps nettoyé ≤ 4
+# paragraphes, formule finale, signature + style tiré de config.py), puis des renderers
+# interchangeables (DOCX, PDF, texte, HTML) consomment ce modèle — en parallèle si besoin,
+# sans passer par DOCX → PDF en série.
+import html, importlib, os, re, threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import config
+
+# Caractères invisibles qu’on rencontre souvent en copiant-collant du texte
+NBSP = "\u00A0"
+ZWS  = "\u200B"
+
+# On repère une éventuelle salutation au tout début (FR/EN) pour pouvoir la retirer proprement
+GREET_RX = re.compile(
+    r"^\s*(dear(\s+hiring\s+(team|manager))?|bonjour|madame|monsieur|a\s+l'attention|à\s+l'attention)\b[^\n]*?,?\s*",
+    re.IGNORECASE,
+)
+# On repère les formules de fin de lettre (FR/EN) pour les ignorer si l’utilisateur les a déjà mises
+CLOSE_RX = re.compile(
+    r"\b(yours\s+sincerely|kind\s+regards|best\s+regards|cordialement)\b.*$",
+    re.IGNORECASE,
+)
+
+def _cfg(name, default):
+    # Récupère une valeur depuis config.py, avec un secours si la clé n’existe pas
+    return getattr(config, name, default)
+
+def _normalize_ws(s: str) -> str:
+    # Nettoie les espaces chelous (NBSP/ZWS), enlève puces/chevrons en début de ligne, et trim
+    s = (s or "").replace(NBSP, " ").replace(ZWS, " ").strip()
+    s = re.sub(r"^[\u2022>\-\*\•\s]+", "", s)
+    return s
+
+def _clean(text: str) -> str:
+    # Nettoyage léger : espaces, markdown basique (* _ `), doublons d’espaces
+    s = _normalize_ws(text)
+    s = re.sub(r"[\*`_]+", "", s)
+    s = re.sub(r"[ \t]{2,}", " ", s)
+    return s.strip()
+
+def _sanitize_paragraphs(pars: list[str]) -> list[str]:
+    # Prépare proprement les paragraphes fournis avant de les injecter dans la lettre
+    out = []
+    for para in pars or []:
+        s = _clean(para)
+        # Si l’utilisateur a déjà commencé par “Bonjour/Dear…”, on enlève la salutation (on garde le reste)
+        s = GREET_RX.sub("", s)
+        # Si le paragraphe est en fait une formule de politesse de fin, on la laissera plutôt à la signature
+        if CLOSE_RX.search(s):
+            continue
+        if s:
+            out.append(s)
+    # On se limite à 4 paragraphes pour garder la lettre concise et lisible
+    return out[:4]
+
+# ————— Modèle —————
+@dataclass(frozen=True, slots=True)
+class Style:
+    """Réglages typographiques figés au moment de la construction (config.py)."""
+    font: str
+    size_pt: float
+    line_spacing: float
+    margins_inch: tuple          # (haut, bas, gauche, droite)
+    after_email_pt: float
+    after_subject_pt: float
+    after_salut_pt: float
+    after_par_pt: float
+    after_signature_pt: float
+
+    @classmethod
+    def from_config(cls) -> "Style":
+        return cls(
+            font=_cfg("POLICE", "Aptos"),
+            size_pt=float(_cfg("TAILLE_PT", 12)),
+            line_spacing=float(_cfg("LINE_SPACING", 1.22)),
+            margins_inch=tuple(_cfg("MARGES_INCH", (1.00, 0.60, 1.10, 1.10))),
+            after_email_pt=_cfg("ESP_APRES_EMAIL_PT", 12),
+            after_subject_pt=_cfg("ESP_APRES_SUJET_PT", 12),
+            after_salut_pt=_cfg("ESP_APRES_SALUT_PT", 12),
+            after_par_pt=_cfg("ESP_APRES_PAR_PT", 6),
+            after_signature_pt=_cfg("ESP_APRES_SIGNATURE_PT", 12),
+        )
+
+@dataclass(frozen=True, slots=True)
+class Block:
+    """Un paragraphe mis en page : lignes logiques (texte, gras), espace après, lien éventuel."""
+    lines: tuple                 # ((texte, gras), …)
+    space_after_pt: float = 0
+    link: str = None             # ex. "mailto:…" → tout le bloc est cliquable
+
+@dataclass(frozen=True, slots=True)
+class Letter:
+    """Lettre prête à rendre : contenu nettoyé + style. Construite une fois par job (build_letter)."""
+    bank: str
+    position: str
+    header: tuple                # (nom, adresse, ville/pays, téléphone)
+    email: str
+    subject: str
+    salutation: str
+    body: tuple                  # ≤ 4 paragraphes nettoyés
+    closing: str
+    signature: str
+    style: Style
+
+    def blocks(self) -> tuple:
+        """Séquence de blocs dans l’ordre de la page (utilisée par les renderers “dessinés”)."""
+        st = self.style
+        return (
+            Block(tuple((line, i == 0) for i, line in enumerate(self.header)), 0),
+            Block(((self.email, False),), st.after_email_pt, f"mailto:{self.email}"),
+            Block(((self.subject, True),), st.after_subject_pt),
+            Block(((self.salutation, False),), st.after_salut_pt),
+            *(Block(((p, False),), st.after_par_pt) for p in self.body),
+            Block(((self.closing, False),), st.after_signature_pt),
+            Block(((self.signature, True),), 0),
+        )
+
+def build_letter(bank: str, position: str, body_paragraphs: list[str]) -> Letter:
+    """Toutes les décisions de contenu de la lettre, en un seul endroit."""
+    return Letter(
+        bank=bank,
+        position=position,
+        header=(config.NOM, config.ADRESSE, config.VILLE_PAYS, config.TEL),
+        email=config.EMAIL,
+        subject=f"Subject: Application – {position}",
+        salutation="Dear Hiring Team,",
+        body=tuple(_clean(p) for p in _sanitize_paragraphs(body_paragraphs)),
+        closing="Yours sincerely,",
+        signature=config.NOM,
+        style=Style.from_config(),
+    )
+
+# ————— Renderers texte / HTML (les autres vivent avec leur bibliothèque) —————
+def render_text(letter: Letter) -> bytes:
+    """Version texte brut (UTF-8), pratique pour un copier-coller dans un formulaire en ligne."""
+    parts = ["\n".join(letter.header), letter.email, "", letter.subject, "", letter.salutation, ""]
+    for p in letter.body:
+        parts += [p, ""]
+    parts += [letter.closing, letter.signature, ""]
+    return "\n".join(parts).encode("utf-8")
+
+def render_html(letter: Letter) -> bytes:
+    """Aperçu HTML autonome, mêmes police/taille/interligne/marges/espacements que le DOCX."""
+    st, e = letter.style, html.escape
+    top, bottom, left, right = st.margins_inch
+    font = e(st.font.split("(")[0].strip())
+
+    def p(text, after, bold=False):
+        t = f"<strong>{e(text)}</strong>" if bold else e(text)
+        return f'<p style="margin:0 0 {after}pt 0">{t}</p>'
+
+    head = "<br>".join(f"<strong>{e(l)}</strong>" if i == 0 else e(l) for i, l in enumerate(letter.header))
+    rows = [
+        f'<p style="margin:0">{head}</p>',
+        f'<p style="margin:0 0 {st.after_email_pt}pt 0"><a href="mailto:{e(letter.email)}">{e(letter.email)}</a></p>',
+        p(letter.subject, st.after_subject_pt, True),
+        p(letter.salutation, st.after_salut_pt),
+        *(p(x, st.after_par_pt) for x in letter.body),
+        p(letter.closing, st.after_signature_pt),
+        p(letter.signature, 0, True),
+    ]
+    doc = (
+        f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{e(letter.subject)}</title></head>\n'
+        f'<body style="max-width:8.5in;margin:0 auto;padding:{top}in {right}in {bottom}in {left}in;'
+        f'font-family:\'{font}\',Calibri,Arial,sans-serif;font-size:{st.size_pt}pt;line-height:{st.line_spacing * 1.2:.3f}">\n'
+        + "\n".join(rows) + "\n</body></html>\n"
+    )
+    return doc.encode("utf-8")
+
+# Format → (extension, "module:fonction" prenant une Letter et renvoyant des octets).
+# Import paresseux : produire un .txt ne charge ni python-docx ni les polices du PDF.
+RENDERERS = {
+    "docx": (".docx", "writer:render_docx"),
+    "pdf":  (".pdf",  "pdf_native:render_pdf"),
+    "txt":  (".txt",  "letter_model:render_text"),
+    "html": (".html", "letter_model:render_html"),
+}
+
+def renderer(fmt: str):
+    """Fonction de rendu d’un format (ValueError si format inconnu)."""
+    if fmt not in RENDERERS:
+        raise ValueError(f"Format inconnu : {fmt} (attendus : {', '.join(RENDERERS)})")
+    mod, _, func = RENDERERS[fmt][1].partition(":")
+    return getattr(importlib.import_module(mod), func)
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="render")
+
+def render_all(letter: Letter, formats=("docx",)) -> dict:
+    """Rend tous les formats demandés en parallèle depuis le même modèle : {format: octets}."""
+    futures = {fmt: _pool.submit(renderer(fmt), letter) for fmt in formats}
+    return {fmt: f.result() for fmt, f in futures.items()}
+
+def write_all(rendered: dict, base_path: str) -> dict:
+    """Écrit {format: octets} sous `base_path` + extension ; si un fichier est verrouillé
+    (ouvert dans Word…), on suffixe (1), (2)… tout le jeu pour garder les formats appariés.
+    Chaque format est d’abord écrit sous un nom temporaire : jamais de demi-jeu sous un nom donné."""
+    os.makedirs(os.path.dirname(base_path) or ".", exist_ok=True)
+    base, n = base_path, 1
+    while True:
+        paths = {fmt: base + RENDERERS[fmt][0] for fmt in rendered}
+        tmps = {fmt: f"{p}.{os.getpid()}-{threading.get_ident()}.tmp" for fmt, p in paths.items()}
+        placed = []
+        try:
+            for fmt, data in rendered.items():
+                with open(tmps[fmt], "wb") as f:
+                    f.write(data)
+            for fmt in rendered:
+                os.replace(tmps[fmt], paths[fmt])
+                placed.append(paths[fmt])
+            return paths
+        except PermissionError:
+            # Un format verrouillé : on retire ceux déjà posés sous ce nom et on retente tout le jeu suffixé
+            for p in placed:
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            base = f"{base_path} ({n})"; n += 1
+        finally:
+            for t in tmps.values():
+                if os.path.exists(t):
+                    os.remove(t)
@@ -0,0 +1,116 @@
+# letter_validator.py — Contrôle local et rapide du corps de lettre renvoyé par le LLM
+# Vérifie : nombre de paragraphes, bornes de longueur, recopie de l’annonce (n-grammes communs)
+# et expressions interdites. Aucun appel réseau : on sait immédiatement quels paragraphes
+# refaire, au lieu de découvrir le problème dans le DOCX et de tout régénérer.
+import re
+import config
+
+WORD_RX = re.compile(r"\w+", re.UNICODE)
+# Champs à trous laissés par le modèle : [Your Name], [Company], {poste}…
+PLACEHOLDER_RX = re.compile(r"\[[^\]\n]{1,40}\]|\{[^}\n]{1,40}\}")
+
+# Tournures à proscrire (minuscules) : résidus de salutation/politesse, tics d’IA, gabarits
+FORBIDDEN = (
+    "dear hiring", "dear sir", "to whom it may concern", "yours sincerely", "kind regards",
+    "best regards", "as an ai", "language model", "i hope this letter finds you well",
+    "i am writing to express my interest", "lorem ipsum",
+    "madame, monsieur", "cordialement", "veuillez agréer", "en tant qu'ia", "en tant qu’ia",
+    "modèle de langage", "je me permets de vous écrire",
+) + tuple(p.lower() for p in getattr(config, "LETTER_FORBIDDEN", ()))
+
+class ValidationReport:
+    """Résultat de validate() : problème global de nombre + problèmes par paragraphe (index → motifs)."""
+    __slots__ = ("count", "count_issue", "paragraph_issues")
+
+    def __init__(self, count: int, count_issue: str = None, paragraph_issues: dict = None):
+        self.count = count
+        self.count_issue = count_issue
+        self.paragraph_issues = paragraph_issues or {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.count_issue and not self.paragraph_issues
+
+    def __repr__(self):
+        return f"ValidationReport(count={self.count}, count_issue={self.count_issue!r}, issues={self.paragraph_issues!r})"
+
+def _words(text: str) -> list:
+    return WORD_RX.findall((text or "").lower())
+
+def shingles(text: str, n: int) -> set:
+    """Ensemble des n-grammes de mots (hashés) d’un texte."""
+    w = _words(text)
+    return {hash(tuple(w[i:i + n])) for i in range(len(w) - n + 1)}
+
+def _limits():
+    return (
+        int(getattr(config, "LETTER_MIN_PARAS", 3)), int(getattr(config, "LETTER_MAX_PARAS", 4)),
+        int(getattr(config, "LETTER_MIN_WORDS", 35)), int(getattr(config, "LETTER_MAX_WORDS", 170)),
+        int(getattr(config, "LETTER_COPY_NGRAM", 8)),
+    )
+
+def check_paragraph(p: str, offer_shingles: set, n: int, min_words: int, max_words: int) -> list:
+    """Motifs de rejet d’un paragraphe (liste vide = OK)."""
+    issues = []
+    words = _words(p)
+    if len(words) < min_words:
+        issues.append(f"trop court ({len(words)} mots, minimum {min_words})")
+    elif len(words) > max_words:
+        issues.append(f"trop long ({len(words)} mots, maximum {max_words})")
+    if offer_shingles:
+        copied = sum(1 for i in range(len(words) - n + 1) if hash(tuple(words[i:i + n])) in offer_shingles)
+        if copied:
+            issues.append(f"recopie l’annonce ({copied} séquence(s) de {n} mots identiques)")
+    low = p.lower()
+    bad = [f for f in FORBIDDEN if f in low]
+    if bad:
+        issues.append("expression interdite : " + ", ".join(f"“{b}”" for b in bad))
+    if PLACEHOLDER_RX.search(p):
+        issues.append("champ à compléter laissé tel quel")
+    return issues
+
+def validate(paragraphs: list, offer: str = "", offer_shingles: set = None) -> ValidationReport:
+    """Valide la liste complète des paragraphes (avant toute troncature)."""
+    min_p, max_p, min_w, max_w, n = _limits()
+    if offer_shingles is None:
+        offer_shingles = shingles(offer, n)
+    count_issue = None
+    if len(paragraphs) < min_p:
+        count_issue = f"{len(paragraphs)} paragraphe(s), minimum {min_p}"
+    elif len(paragraphs) > max_p:
+        count_issue = f"{len(paragraphs)} paragraphes, maximum {max_p}"
+    issues = {}
+    for i, p in enumerate(paragraphs):
+        found = check_paragraph(p, offer_shingles, n, min_w, max_w)
+        if found:
+            issues[i] = found
+    return ValidationReport(len(paragraphs), count_issue, issues)
+
+# ————— Corrections locales du nombre de paragraphes (sans appel LLM) —————
+SENT_RX = re.compile(r"(?<=[.!?…])\s+(?=[A-ZÀ-Ý])")
+
+def fix_count(paragraphs: list) -> list:
+    """Ramène le nombre de paragraphes dans les bornes quand c’est possible localement :
+    fusion des paires voisines les plus courtes, ou découpe des blocs longs aux fins de phrase."""
+    min_p, max_p, min_w, _max_w, _n = _limits()
+    pars = list(paragraphs)
+    while len(pars) > max_p:
+        # On fusionne la paire adjacente la plus courte (garde l’ordre et le fil du texte)
+        i = min(range(len(pars) - 1), key=lambda k: len(_words(pars[k])) + len(_words(pars[k + 1])))
+        pars[i:i + 2] = [pars[i] + " " + pars[i + 1]]
+    while len(pars) < min_p:
+        # On coupe le plus long paragraphe en deux au plus près du milieu (en nombre de phrases)
+        i = max(range(len(pars)), key=lambda k: len(_words(pars[k]))) if pars else None
+        if i is None:
+            break
+        sents = SENT_RX.split(pars[i])
+        if len(sents) < 2 or len(_words(pars[i])) < 2 * min_w:
+            break
+        half, acc, total = 0, 0, len(_words(pars[i]))
+        for k, s in enumerate(sents[:-1]):
+            acc += len(_words(s))
+            half = k + 1
+            if acc >= total / 2:
+                break
+        pars[i:i + 1] = [" ".join(sents[:half]), " ".join(sents[half:])]
+    return pars
@@ -1,9 +1,12 @@
-import os, re
-from openai import OpenAI
+import json, re, uuid
 import config
+import letter_validator
+import llm_router
 
-# Client OpenAI configuré avec la clé d’API (via variable d’environnement)
-_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Routeur LLM (modèle principal + replis, cf. config.MODEL / MODEL_FALLBACKS)
+_router = llm_router.Router.from_config()
+# Client OpenAI de la route principale (clé d’API via variable d’environnement)
+_client = _router.routes[0].client
 
 # Instructions système en anglais pour l’IA :
 # → 3–4 paragraphes concis
@@ -72,8 +75,8 @@ def _strip_greetings_text(text: str) -> str:
         lines.pop()
     return "\n".join(lines).strip()
 
-def _paragraphize(text: str) -> list[str]:
-    """Découpe le texte propre en paragraphes (max 4), en ignorant toute salutation ou closing restants."""
+def _split_paragraphs(text: str) -> list[str]:
+    """Découpe le texte propre en paragraphes (sans limite), en ignorant toute salutation ou closing restants."""
     t = _strip_greetings_text(text)
     # On coupe sur les doubles sauts de ligne
     parts = [p for p in re.split(r"\n\s*\n+", t) if _normalize_ws(p)]
@@ -87,13 +90,141 @@ def _paragraphize(text: str) -> list[str]:
             continue
         if p:
             cleaned.append(p)
+    return cleaned
+
+def _paragraphize(text: str) -> list[str]:
+    """Découpe le texte propre en paragraphes (max 4), en ignorant toute salutation ou closing restants."""
     # On limite à 4 paragraphes max (standard pour une lettre de motivation)
-    return cleaned[:4]
+    return _split_paragraphs(text)[:4]
+
+# ————— Sortie structurée (JSON) —————
+# Avec LETTER_OUTPUT=json_schema|json_object, le modèle renvoie {"paragraphs": [...]} : plus besoin de
+# deviner les paragraphes (doubles sauts de ligne, salutations…) ; l’heuristique ci-dessus reste le repli.
+PARAGRAPHS_SCHEMA = {
+    "name": "letter_body",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {"paragraphs": {"type": "array", "items": {"type": "string"}}},
+        "required": ["paragraphs"],
+        "additionalProperties": False,
+    },
+}
+JSON_EN = 'Answer in JSON only: {"paragraphs": ["…", "…"]}, one string per paragraph.'
+JSON_FR = 'Réponds uniquement en JSON : {"paragraphs": ["…", "…"]}, une chaîne par paragraphe.'
+
+# Modèles acceptant json_schema (mode “auto”) ; les autres partent en json_object (gpt-3.5-turbo…)
+_JSON_SCHEMA_MODELS = ("gpt-4o", "chatgpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
+def output_mode(route=None) -> str:
+    """Mode de sortie demandé : config.LETTER_OUTPUT, ou en “auto” selon le modèle de la route
+    (principale par défaut). Une route qui refuse ce mode le rétrograde pour elle seule (llm_router)."""
+    mode = getattr(config, "LETTER_OUTPUT", "auto")
+    if mode in llm_router.FORMAT_MODES:
+        return mode
+    model = route.model if route is not None else config.MODEL
+    return "json_schema" if (model or "").lower().startswith(_JSON_SCHEMA_MODELS) else "json_object"
+
+def _structured() -> bool:
+    return output_mode() in ("json_schema", "json_object")
+
+def response_format(route=None):
+    """Paramètre `response_format` de l’API pour une route (None en mode texte). Passé tel quel
+    (la fonction) au routeur, qui l’évalue pour chaque route essayée."""
+    mode = output_mode(route)
+    if mode == "json_schema":
+        return {"type": "json_schema", "json_schema": PARAGRAPHS_SCHEMA}
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+def parse_json_paragraphs(raw: str):
+    """Chemin rapide : {"paragraphs": [str, …]} → liste nettoyée ; None si la réponse n’a pas cette forme."""
+    s = (raw or "").strip()
+    if s.startswith("```"):
+        # Bloc de code markdown (```json … ```) renvoyé par certains modèles en json_object
+        s = s.strip("`").strip()
+        s = s[s.find("{"):] if "{" in s else s
+    if not s.startswith("{"):
+        return None
+    try:
+        data = json.loads(s)
+    except ValueError:
+        return None
+    pars = data.get("paragraphs") if isinstance(data, dict) else None
+    if not isinstance(pars, list) or not all(isinstance(p, str) for p in pars):
+        return None
+    out = [p for p in (_normalize_ws(p) for p in pars) if p]
+    return out or None
 
-def generate_body_paragraphs(bank: str, position: str, offer: str, lang: str = "EN") -> list[str]:
-    """Appelle l’API OpenAI pour générer 3–4 paragraphes de lettre de motivation adaptés à l’offre."""
+def parse_paragraphs(raw: str) -> list[str]:
+    """Paragraphes d’une réponse (sans limite) : JSON si possible, sinon découpe heuristique du texte.
+    JSON tronqué ou mal formé : seules les chaînes déjà fermées sont gardées (liste vide au pire),
+    le texte JSON brut n’est jamais découpé (sa syntaxe finirait dans la lettre)."""
+    pars = parse_json_paragraphs(raw)
+    if pars:
+        return pars
+    s = (raw or "").strip().lstrip("`").strip()
+    if s[:4].lower() == "json":
+        s = s[4:].lstrip()
+    if s.startswith("{") or '"paragraphs"' in s:
+        reader = ParagraphStream()
+        reader.feed(s)
+        return reader.paragraphs
+    return _split_paragraphs(raw)
+
+class ParagraphStream:
+    """Lecteur JSON incrémental pour une réponse en flux : chaque paragraphe est rendu dès que sa
+    chaîne se ferme dans le tableau "paragraphs" (chaque caractère n’est examiné qu’une fois)."""
+    _START_RX = re.compile(r'"paragraphs"\s*:\s*\[')
+
+    def __init__(self):
+        self.text = ""           # réponse complète accumulée (pour le parse final / le repli)
+        self.paragraphs = []
+        self._pos = None         # position de lecture dans le tableau (None = tableau pas encore vu)
+        self._start = None       # début de la chaîne en cours
+        self._escape = False
+        self.closed = False
+
+    def feed(self, chunk: str) -> list[str]:
+        """Ajoute un morceau de réponse ; renvoie les paragraphes complétés par ce morceau."""
+        self.text += chunk
+        if self.closed:
+            return []
+        if self._pos is None:
+            m = self._START_RX.search(self.text)
+            if not m:
+                return []
+            self._pos = m.end()
+        new, t, i = [], self.text, self._pos
+        while i < len(t):
+            c = t[i]
+            if self._start is None:
+                if c == '"':
+                    self._start = i
+                elif c == "]":
+                    self.closed = True
+                    break
+            elif self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                p = _normalize_ws(json.loads(t[self._start:i + 1]))
+                self._start = None
+                if p:
+                    self.paragraphs.append(p)
+                    new.append(p)
+            i += 1
+        self._pos = i
+        return new
+
+def build_messages(bank: str, position: str, offer: str, lang: str = "EN") -> list[dict]:
+    """Messages (system + user) envoyés au modèle pour une lettre donnée."""
     # On choisit le prompt système selon la langue
     system = SYS_EN if lang.upper() == "EN" else SYS_FR
+    if _structured():
+        system += "\n" + (JSON_EN if lang.upper() == "EN" else JSON_FR)
 
     # Prompt utilisateur = contexte (banque, poste, description)
     user = (
@@ -105,16 +236,113 @@ def generate_body_paragraphs(bank: str, position: str, offer: str, lang: str = "
         "Rédige 3–4 paragraphes pertinents alignés sur l’annonce, orientés résultats. "
         "Aucune salutation ni formule finale."
     )
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
 
-    # Appel à l’API (chat.completions) avec modèle défini dans config.py
-    resp = _client.chat.completions.create(
-        model=config.MODEL,
-        messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
-        temperature=0.6,
-    )
+def _repair_messages(messages: list[dict], paragraphs: list[str], issues: dict, lang: str) -> list[dict]:
+    """Demande de réécriture ciblée : la lettre complète en contexte, seuls les paragraphes fautifs à refaire."""
+    numbered = "\n\n".join(f"[{i + 1}] {p}" for i, p in enumerate(paragraphs))
+    todo = "\n".join(f"- [{i + 1}] " + "; ".join(why) for i, why in sorted(issues.items()))
+    if lang.upper() == "EN":
+        ask = (
+            f"Here is the current letter body:\n\n{numbered}\n\n"
+            f"Rewrite ONLY these paragraphs, fixing the listed problems:\n{todo}\n\n"
+            "Keep the same role in the letter for each one, do not copy sentences from the job description, "
+            "40–150 words each. Return only the rewritten paragraphs, in the same order, "
+            + ("as the JSON paragraphs list" if _structured() else "separated by a blank line")
+            + ", without their [n] numbers."
+        )
+    else:
+        ask = (
+            f"Voici le corps actuel de la lettre :\n\n{numbered}\n\n"
+            f"Réécris UNIQUEMENT ces paragraphes en corrigeant les problèmes indiqués :\n{todo}\n\n"
+            "Garde le même rôle dans la lettre pour chacun, ne recopie pas de phrases de l’annonce, "
+            "40 à 150 mots chacun. Renvoie seulement les paragraphes réécrits, dans le même ordre, "
+            + ("dans la liste JSON paragraphs" if _structured() else "séparés par une ligne vide")
+            + ", sans leurs numéros [n]."
+        )
+    return messages + [{"role": "user", "content": ask}]
+
+def _complete(messages: list[dict], temperature: float, ledger: dict, on_paragraph=None) -> str:
+    """Appel routé → texte brut de la réponse. Avec `on_paragraph(i, texte)` et une sortie JSON,
+    la réponse est lue en flux et chaque paragraphe est signalé dès qu’il est complet.
+    Le response_format est choisi (et rétrogradé après un HTTP 400) route par route par le routeur."""
+    kw = {"response_format": response_format} if _structured() else {}
+    if on_paragraph is None or not kw:
+        resp, _route, _latency = _router.complete(messages=messages, temperature=temperature, ledger=ledger, **kw)
+        return (resp.choices[0].message.content or "").strip()
+    stream, _route, _latency = _router.complete(
+        messages=messages, temperature=temperature, ledger=ledger, stream=True,
+        stream_options={"include_usage": True}, **kw)
+    reader = ParagraphStream()
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        for p in reader.feed(delta or ""):
+            on_paragraph(len(reader.paragraphs) - 1, p)
+    return reader.text.strip()
 
-    # On récupère le texte brut renvoyé par l’IA
-    raw = (resp.choices[0].message.content or "").strip()
+def generate_body_paragraphs(bank: str, position: str, offer: str, lang: str = "EN", on_paragraph=None) -> list[str]:
+    """Appelle l’API OpenAI pour générer 3–4 paragraphes de lettre de motivation adaptés à l’offre.
+    `on_paragraph(i, texte)` (optionnel) : appelé au fil de l’eau pendant la génération."""
+    messages = build_messages(bank, position, offer, lang)
+    ledger = {"bank": bank, "position": position, "letter_id": uuid.uuid4().hex}
+
+    # Appel à l’API (chat.completions) via le routeur : modèle principal défini dans config.py,
+    # bascule sur les replis si besoin. L’usage (tokens, latence) est consigné dans le journal.
+    raw = _complete(messages, 0.6, ledger, on_paragraph)
+
+    # On découpe en paragraphes exploitables (JSON si disponible, sinon heuristiques)
+    if not getattr(config, "LETTER_VALIDATE", True):
+        paragraphs = parse_paragraphs(raw)[:4]
+        if not paragraphs:
+            # JSON tronqué sans aucun paragraphe complet : une régénération plutôt qu’une lettre vide
+            paragraphs = parse_paragraphs(_complete(messages, 0.6, {**ledger, "purpose": "regenerate"}))[:4]
+        if not paragraphs:
+            raise ValueError("Réponse du modèle inexploitable (aucun paragraphe).")
+        return paragraphs
+    return _validated(parse_paragraphs(raw), messages, offer, lang, ledger)
+
+def _validated(paragraphs: list[str], messages: list[dict], offer: str, lang: str, ledger: dict) -> list[str]:
+    """Post-validation locale + réécriture ciblée des seuls paragraphes fautifs.
+    Chaque tentative (LETTER_MAX_REPAIRS) ne renvoie au modèle que ce qui échoue."""
+    offer_sh = letter_validator.shingles(offer, int(getattr(config, "LETTER_COPY_NGRAM", 8)))
+    # Nombre hors bornes : on tente d’abord une correction locale (fusion / découpe), gratuite
+    paragraphs = letter_validator.fix_count(paragraphs)
+    report = letter_validator.validate(paragraphs, offer_shingles=offer_sh)
+
+    for _ in range(int(getattr(config, "LETTER_MAX_REPAIRS", 1))):
+        if report.ok:
+            break
+        if report.count_issue:
+            # Structure irrécupérable localement (ex. un seul bloc court) : seule une régénération complète aide
+            raw = _complete(messages, 0.6, {**ledger, "purpose": "regenerate"})
+            paragraphs = letter_validator.fix_count(parse_paragraphs(raw))
+            report = letter_validator.validate(paragraphs, offer_shingles=offer_sh)
+            continue
+        raw = _complete(_repair_messages(messages, paragraphs, report.paragraph_issues, lang),
+                        0.4, {**ledger, "purpose": "repair"})
+        fixed = parse_paragraphs(raw)
+        idx = sorted(report.paragraph_issues)
+        if len(fixed) != len(idx):
+            # Réponse mal formée : on garde la version précédente plutôt que de casser la structure
+            break
+        candidate = list(paragraphs)
+        for i, p in zip(idx, fixed):
+            candidate[i] = p
+        new_report = letter_validator.validate(candidate, offer_shingles=offer_sh)
+        # Paragraphe par paragraphe, la réécriture n’est gardée que si elle corrige quelque chose
+        # (strictement moins de problèmes) ; sinon on conserve l’original
+        improved = False
+        for i in idx:
+            if len(new_report.paragraph_issues.get(i, ())) < len(report.paragraph_issues[i]):
+                improved = True
+            else:
+                candidate[i] = paragraphs[i]
+        if not improved:
+            break
+        paragraphs = candidate
+        report = letter_validator.validate(paragraphs, offer_shingles=offer_sh)
 
-    # On découpe et nettoie en paragraphes exploitables
-    return _paragraphize(raw)
+    if not paragraphs:
+        raise ValueError("Réponse du modèle inexploitable (aucun paragraphe).")
+    # Filet de sécurité : jamais plus de 4 paragraphes dans la lettre
+    return paragraphs[:4]
@@ -0,0 +1,291 @@
+# llm_router.py — Routage des appels LLM : modèle principal + repli, santé et requêtes “hedgées”
+# Chaque route = un modèle sur un endpoint (OpenAI ou compatible). On garde pour chacune une
+# fenêtre glissante de latences/erreurs : si la principale devient lente (p95 > seuil) ou
+# renvoie des erreurs, les appels basculent vers une route plus rapide/saine.
+# Option “hedge” : passé un délai, on envoie un doublon à la route suivante et on garde
+# la première réponse arrivée — un endpoint lent ne fait plus s’écrouler un batch.
+import math, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from openai import OpenAI
+import config
+import usage_ledger
+
+# Sorties structurées, de la plus stricte à la plus permissive (valeurs de response_format.type) :
+# un HTTP 400 sur response_format fait descendre d’un cran la seule route qui l’a refusé.
+FORMAT_MODES = ("json_schema", "json_object", "text")
+
+def format_rejected(err) -> bool:
+    """HTTP 400 dont le message cite response_format (éventuellement chaîné sous AllRoutesFailed)."""
+    while err is not None:
+        if getattr(err, "status_code", None) == 400 and "response_format" in str(err):
+            return True
+        err = err.__cause__
+    return False
+
+# Pool partagé pour les appels (les requêtes hedgées perdantes finissent en arrière-plan)
+_pool = ThreadPoolExecutor(max_workers=int(getattr(config, "ROUTER_MAX_WORKERS", 32)),
+                           thread_name_prefix="llm-route")
+
+class Route:
+    """Un modèle servi par un endpoint donné (client OpenAI créé à la demande)."""
+    def __init__(self, model: str, base_url: str = None, api_key: str = None,
+                 timeout: float = 60.0, max_retries: int = 2):
+        self.model = model
+        self.base_url = base_url or None
+        self.api_key = api_key or config.OPENAI_API_KEY
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.format_mode = None   # plafond de sortie structurée après un refus de ce modèle (None = aucun)
+        self._client = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}@{self.base_url}" if self.base_url else self.model
+
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            base_url = self.base_url
+            if getattr(config, "LLM_RECORD", ""):
+                # Mode enregistrement : le trafic passe par le proxy local de cassette.py
+                import cassette
+                base_url = cassette.recording_base_url(base_url)
+            self._client = OpenAI(api_key=self.api_key, base_url=base_url,
+                                  timeout=self.timeout, max_retries=self.max_retries)
+        return self._client
+
+    def response_format(self, requested):
+        """`response_format` à envoyer à cette route : `requested` (dict, ou fonction route → dict) ramené
+        sous le plafond `format_mode` — json_schema → json_object → None (texte libre)."""
+        fmt = requested(self) if callable(requested) else requested
+        if not fmt or self.format_mode is None or fmt.get("type") not in FORMAT_MODES:
+            return fmt
+        if FORMAT_MODES.index(fmt["type"]) >= FORMAT_MODES.index(self.format_mode):
+            return fmt
+        return {"type": "json_object"} if self.format_mode == "json_object" else None
+
+    def __repr__(self):
+        return f"Route({self.name!r})"
+
+class RouteStats:
+    """Fenêtre glissante (latence, succès) d’une route + coupe-circuit temporaire."""
+    def __init__(self, window: int = 50):
+        self.samples = deque(maxlen=window)
+        self.down_until = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, latency_s: float, ok: bool):
+        with self.lock:
+            self.samples.append((latency_s, ok))
+
+    def p95(self) -> float:
+        with self.lock:
+            lat = sorted(l for l, ok in self.samples if ok)
+        if not lat:
+            return 0.0
+        return lat[max(0, math.ceil(0.95 * len(lat)) - 1)]
+
+    def error_rate(self) -> float:
+        with self.lock:
+            n = len(self.samples)
+            return sum(1 for _, ok in self.samples if not ok) / n if n else 0.0
+
+    def __len__(self):
+        return len(self.samples)
+
+class RecordedStream:
+    """Flux chat.completions (stream=True) dont l’usage est consigné à la fin de la lecture.
+    Demander `stream_options={"include_usage": True}` pour que le dernier chunk porte les tokens."""
+    def __init__(self, stream, model: str, t0: float, ledger: dict):
+        self.stream, self.model, self.t0, self.ledger = stream, model, t0, ledger
+        self.recorded = False
+
+    def __iter__(self):
+        usage, model = None, self.model
+        try:
+            for chunk in self.stream:
+                if getattr(chunk, "usage", None):
+                    usage, model = chunk.usage, getattr(chunk, "model", None) or model
+                yield chunk
+        except Exception:
+            if not self.recorded:
+                self.recorded = True
+                usage_ledger.record(self.model, time.perf_counter() - self.t0, ok=False, **self.ledger)
+            raise
+        if self.recorded:
+            return
+        self.recorded = True
+        details = getattr(usage, "prompt_tokens_details", None)
+        usage_ledger.record(
+            model, time.perf_counter() - self.t0,
+            getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0,
+            getattr(details, "cached_tokens", 0) or 0, **self.ledger,
+        )
+
+    def close(self):
+        """Abandonne le flux sans le lire (requête hedgée perdante) : la connexion HTTP est libérée
+        et l’appel consigné — sans tokens, l’API ne les renvoie qu’en fin de flux."""
+        if self.recorded:
+            return
+        self.recorded = True
+        close = getattr(self.stream, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+        usage_ledger.record(self.model, time.perf_counter() - self.t0, **self.ledger)
+
+def _discard(fut):
+    """Résultat d’une requête hedgée perdante : un flux non lu garderait sa connexion ouverte."""
+    if fut.cancelled() or fut.exception() is not None:
+        return
+    resp = fut.result()[0]
+    if isinstance(resp, RecordedStream):
+        resp.close()
+
+class AllRoutesFailed(RuntimeError):
+    """Toutes les routes ont échoué pour une requête (la dernière erreur est chaînée)."""
+
+class Router:
+    """Choisit la route, bascule en cas d’erreur et hedge les requêtes lentes."""
+    def __init__(self, routes: list, p95_max_s: float = 20.0, max_error_rate: float = 0.5,
+                 hedge_after_s: float = 0.0, cooldown_s: float = 60.0, window: int = 50,
+                 min_samples: int = 5):
+        if not routes:
+            raise ValueError("Router : au moins une route est nécessaire.")
+        self.routes = list(routes)
+        self.p95_max_s = p95_max_s
+        self.max_error_rate = max_error_rate
+        self.hedge_after_s = hedge_after_s
+        self.cooldown_s = cooldown_s
+        self.min_samples = min_samples
+        self.stats = {r.name: RouteStats(window) for r in self.routes}
+
+    @classmethod
+    def from_config(cls) -> "Router":
+        """Route principale = MODEL (+ OPENAI_API_BASE), puis MODEL_FALLBACKS dans l’ordre.
+        Syntaxe d’un repli : “modele” ou “modele@http://hote:port/v1”."""
+        timeout = float(getattr(config, "LLM_TIMEOUT_S", 60.0))
+        specs = [(config.MODEL, config.OPENAI_API_BASE)]
+        for spec in getattr(config, "MODEL_FALLBACKS", ()):
+            model, _, base = spec.partition("@")
+            specs.append((model.strip(), base.strip() or config.OPENAI_API_BASE))
+        # Avec plusieurs routes, le routeur gère lui-même la reprise → pas de retries SDK cachés
+        retries = 0 if len(specs) > 1 else 2
+        routes = [Route(m, b, timeout=timeout, max_retries=retries) for m, b in specs]
+        return cls(
+            routes,
+            p95_max_s=float(getattr(config, "ROUTER_P95_MAX_S", 20.0)),
+            max_error_rate=float(getattr(config, "ROUTER_MAX_ERROR_RATE", 0.5)),
+            hedge_after_s=float(getattr(config, "ROUTER_HEDGE_AFTER_S", 0.0)),
+            cooldown_s=float(getattr(config, "ROUTER_COOLDOWN_S", 60.0)),
+        )
+
+    # ————— Santé et ordre des routes —————
+    def _health(self, route: Route) -> int:
+        # 0 = saine, 1 = lente (p95 au-dessus du seuil), 2 = en erreur (coupe-circuit ouvert)
+        st = self.stats[route.name]
+        if st.down_until > time.monotonic():
+            return 2
+        if len(st) >= self.min_samples and st.p95() > self.p95_max_s:
+            return 1
+        return 0
+
+    def ordered(self) -> list:
+        """Routes dans l’ordre d’essai : saines (ordre déclaré), lentes (par p95), en panne en dernier."""
+        decorated = []
+        for i, r in enumerate(self.routes):
+            h = self._health(r)
+            decorated.append((h, self.stats[r.name].p95() if h == 1 else 0.0, i, r))
+        return [r for *_, r in sorted(decorated, key=lambda t: t[:3])]
+
+    def _observe(self, route: Route, latency_s: float, ok: bool):
+        st = self.stats[route.name]
+        st.add(latency_s, ok)
+        if ok:
+            return
+        # Trop d’erreurs récentes → on écarte la route le temps du cooldown, puis on la réessaie
+        # avec une fenêtre vierge (état “semi-ouvert”).
+        if len(st) >= 3 and st.error_rate() >= self.max_error_rate:
+            with st.lock:
+                st.samples.clear()
+            st.down_until = time.monotonic() + self.cooldown_s
+
+    def snapshot(self) -> dict:
+        """État courant par route (pour le debug / l’UI) : p95, taux d’erreur, santé."""
+        return {r.name: {"p95_s": self.stats[r.name].p95(), "error_rate": self.stats[r.name].error_rate(),
+                         "samples": len(self.stats[r.name]), "health": self._health(r)}
+                for r in self.routes}
+
+    # ————— Appel —————
+    def _call(self, route: Route, kwargs: dict, ledger: dict):
+        requested = kwargs.get("response_format")
+        while True:
+            fmt = route.response_format(requested)
+            kw = {k: v for k, v in kwargs.items() if k != "response_format"}
+            if fmt:
+                kw["response_format"] = fmt
+            t0 = time.perf_counter()
+            try:
+                resp = route.client.chat.completions.create(model=route.model, **kw)
+                if kw.get("stream"):
+                    # Flux : la santé de la route se mesure à l’arrivée des en-têtes ; l’usage
+                    # (dernier chunk) n’est connu qu’une fois le flux lu → consigné par RecordedStream.
+                    dt = time.perf_counter() - t0
+                    self._observe(route, dt, True)
+                    return RecordedStream(resp, route.model, t0, ledger), route, dt
+            except Exception as e:
+                dt = time.perf_counter() - t0
+                usage_ledger.record(route.model, dt, ok=False, **ledger)
+                if fmt and fmt.get("type") in FORMAT_MODES[:-1] and format_rejected(e):
+                    # Paramètre refusé par ce modèle, pas une panne : la route n’est pas pénalisée,
+                    # elle descend d’un cran (pour la suite du processus) et on relance aussitôt
+                    route.format_mode = FORMAT_MODES[FORMAT_MODES.index(fmt["type"]) + 1]
+                    continue
+                self._observe(route, dt, False)
+                raise
+            dt = time.perf_counter() - t0
+            self._observe(route, dt, True)
+            # Les doublons perdants sont aussi facturés → on les consigne comme les autres
+            usage_ledger.record_response(resp, route.model, dt, **ledger)
+            return resp, route, dt
+
+    def complete(self, ledger: dict = None, **kwargs):
+        """chat.completions.create routé. Retourne (resp, route, latence_s) ; avec stream=True,
+        resp est un RecordedStream à itérer. `response_format` (dict, ou fonction route → dict)
+        est adapté à chaque route (cf. Route.response_format).
+        `ledger` = contexte pour usage_ledger (bank, position, letter_id, purpose)."""
+        ledger = ledger or {}
+        candidates = self.ordered()
+        pending = {}
+        last_err = None
+
+        def launch():
+            r = candidates.pop(0)
+            pending[_pool.submit(self._call, r, kwargs, ledger)] = r
+
+        launch()
+        while pending:
+            # Tant qu’il reste une route de secours, on n’attend que `hedge_after_s` avant d’en lancer une autre
+            hedge = self.hedge_after_s if (self.hedge_after_s > 0 and candidates) else None
+            done, _ = wait(list(pending), timeout=hedge, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()  # délai dépassé → requête dupliquée sur la route suivante
+                continue
+            for fut in done:
+                pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    last_err = e
+                    continue
+                # Requêtes encore en vol (ou arrivées en même temps) : leurs flux sont fermés dès réception
+                for other in list(pending) + [f for f in done if f is not fut]:
+                    other.add_done_callback(_discard)
+                return result
+            # Échec sans autre requête en vol → on bascule immédiatement sur la suivante
+            if not pending and candidates:
+                launch()
+        raise AllRoutesFailed(f"Toutes les routes LLM ont échoué : {last_err}") from last_err
@@ -0,0 +1,444 @@
+# pdf_native.py — Rendu PDF direct en pur Python (sans Word ni LibreOffice)
+# Nos lettres ont une mise en page fixe et simple (en-tête, email cliquable, sujet, salutation,
+# ≤ 4 paragraphes, signature) : on la dessine directement en PDF, avec les réglages de config.py.
+# - police TrueType embarquée (sous-ensemble des glyphes utilisés) et mesurée pour la césure
+# - lien “mailto:” cliquable (annotation /Link)
+# - repli sur Helvetica (police standard PDF, non embarquée) si aucune TTF n’est trouvée
+# Une lettre se génère en quelques millisecondes, contre plusieurs secondes via Word/LibreOffice.
+import hashlib, os, struct, threading, unicodedata, zlib
+import config
+import letter_model
+
+PAGE_W, PAGE_H = 612.0, 792.0   # Letter (format par défaut du modèle python-docx)
+LINK_RGB = (0x05 / 255, 0x63 / 255, 0xC1 / 255)  # même bleu que le style “Hyperlink” de Word
+
+def _cfg(name, default):
+    return getattr(config, name, default)
+
+# ===================== Polices =====================
+# Fichiers candidats par famille (Windows, macOS, Linux) : (régulier, gras)
+_FONT_DIRS = [
+    os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+    os.path.expanduser("~/AppData/Local/Microsoft/Windows/Fonts"),
+    "/Library/Fonts", "/System/Library/Fonts/Supplemental", os.path.expanduser("~/Library/Fonts"),
+    "/usr/share/fonts/truetype/dejavu", "/usr/share/fonts/truetype/liberation",
+    "/usr/share/fonts/truetype/msttcorefonts", "/usr/share/fonts/TTF", "/usr/share/fonts/truetype",
+]
+_FAMILIES = {
+    "aptos":   [("aptos.ttf", "aptos-bold.ttf")],
+    "calibri": [("calibri.ttf", "calibrib.ttf")],
+    "arial":   [("arial.ttf", "arialbd.ttf"), ("Arial.ttf", "Arial Bold.ttf")],
+    "liberation sans": [("LiberationSans-Regular.ttf", "LiberationSans-Bold.ttf")],
+    "dejavu sans": [("DejaVuSans.ttf", "DejaVuSans-Bold.ttf")],
+}
+# Ordre d’essai si la police configurée est introuvable (métriques proches d’abord)
+_FALLBACK_ORDER = ["calibri", "arial", "liberation sans", "dejavu sans"]
+
+def _find_font_files():
+    """(régulier, gras) : chemins explicites de config, sinon recherche par nom de famille."""
+    reg, bold = _cfg("PDF_FONT_FILE", None), _cfg("PDF_FONT_BOLD_FILE", None)
+    if reg and os.path.isfile(reg):
+        return reg, (bold if bold and os.path.isfile(bold) else reg)
+    # “Aptos (Body)” → “aptos”
+    family = _cfg("POLICE", "Aptos").split("(")[0].strip().lower()
+    for fam in [family] + [f for f in _FALLBACK_ORDER if f != family]:
+        for r_name, b_name in _FAMILIES.get(fam, []):
+            for d in _FONT_DIRS:
+                r = os.path.join(d, r_name)
+                if os.path.isfile(r):
+                    b = os.path.join(d, b_name)
+                    return r, (b if os.path.isfile(b) else r)
+    return None, None
+
+class TrueTypeFont:
+    """Lecture minimale d’une police TrueType : métriques, cmap, largeurs, sous-ensemble de glyphes."""
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.data = data = f.read()
+        self.path = path
+        if data[:4] not in (b"\x00\x01\x00\x00", b"true"):
+            raise ValueError(f"Police non TrueType (glyf) : {path}")
+        n = struct.unpack(">H", data[4:6])[0]
+        self.tables = {}
+        for i in range(n):
+            tag, _chk, off, ln = struct.unpack(">4sLLL", data[12 + 16 * i: 28 + 16 * i])
+            self.tables[tag.decode("latin-1")] = (off, ln)
+
+        head = self._t("head")
+        self.upem = struct.unpack(">H", head[18:20])[0]
+        self.bbox = struct.unpack(">hhhh", head[36:44])
+        self.loca_long = struct.unpack(">h", head[50:52])[0] == 1
+        hhea = self._t("hhea")
+        self.ascent, self.descent, self.line_gap = struct.unpack(">hhh", hhea[4:10])
+        n_hm = struct.unpack(">H", hhea[34:36])[0]
+        self.num_glyphs = struct.unpack(">H", self._t("maxp")[4:6])[0]
+        hmtx = self._t("hmtx")
+        adv = [struct.unpack(">H", hmtx[4 * i: 4 * i + 2])[0] for i in range(n_hm)]
+        self.advances = adv + [adv[-1]] * (self.num_glyphs - n_hm)
+        post = self._t("post") if "post" in self.tables else b""
+        self.italic_angle = struct.unpack(">l", post[4:8])[0] / 65536.0 if len(post) >= 8 else 0.0
+        os2 = self._t("OS/2") if "OS/2" in self.tables else b""
+        self.cap_height = (struct.unpack(">h", os2[88:90])[0] if len(os2) >= 90
+                           else int(self.ascent * 0.7))
+        self.ps_name = self._ps_name()
+        self._cmap = self._parse_cmap()
+
+    def _t(self, tag: str) -> bytes:
+        off, ln = self.tables[tag]
+        return self.data[off: off + ln]
+
+    def _ps_name(self) -> str:
+        # Nom PostScript (name ID 6), sinon nom du fichier
+        try:
+            t = self._t("name")
+            count, str_off = struct.unpack(">HH", t[2:6])
+            for i in range(count):
+                pid, eid, _lang, nid, ln, off = struct.unpack(">HHHHHH", t[6 + 12 * i: 18 + 12 * i])
+                if nid == 6:
+                    raw = t[str_off + off: str_off + off + ln]
+                    name = raw.decode("utf-16-be") if pid in (0, 3) else raw.decode("latin-1")
+                    return "".join(c for c in name if c.isalnum() or c in "-_") or "Font"
+        except Exception:
+            pass
+        return "".join(c for c in os.path.splitext(os.path.basename(self.path))[0] if c.isalnum()) or "Font"
+
+    def _parse_cmap(self) -> dict:
+        # Table Unicode (3,10) format 12 ou (3,1)/(0,x) format 4, réduite au jeu cp1252 utilisé par le PDF
+        t = self._t("cmap")
+        n = struct.unpack(">H", t[2:4])[0]
+        subtables = {}
+        for i in range(n):
+            pid, eid, off = struct.unpack(">HHL", t[4 + 8 * i: 12 + 8 * i])
+            subtables[(pid, eid)] = off
+        wanted = {ord(c) for c in _WINANSI if c}
+        for key in ((3, 10), (0, 4), (3, 1), (0, 3), (0, 1), (0, 0)):
+            if key not in subtables:
+                continue
+            off = subtables[key]
+            fmt = struct.unpack(">H", t[off: off + 2])[0]
+            if fmt == 4:
+                return self._cmap4(t, off, wanted)
+            if fmt == 12:
+                return self._cmap12(t, off, wanted)
+        return {}
+
+    @staticmethod
+    def _cmap4(t, off, wanted):
+        seg2 = struct.unpack(">H", t[off + 6: off + 8])[0]
+        seg = seg2 // 2
+        ends = struct.unpack(f">{seg}H", t[off + 14: off + 14 + seg2])
+        starts = struct.unpack(f">{seg}H", t[off + 16 + seg2: off + 16 + 2 * seg2])
+        deltas = struct.unpack(f">{seg}h", t[off + 16 + 2 * seg2: off + 16 + 3 * seg2])
+        ro_pos = off + 16 + 3 * seg2
+        ranges = struct.unpack(f">{seg}H", t[ro_pos: ro_pos + seg2])
+        out = {}
+        for cp in wanted:
+            for i in range(seg):
+                if starts[i] <= cp <= ends[i]:
+                    if ranges[i] == 0:
+                        g = (cp + deltas[i]) & 0xFFFF
+                    else:
+                        p = ro_pos + 2 * i + ranges[i] + 2 * (cp - starts[i])
+                        g = struct.unpack(">H", t[p: p + 2])[0]
+                        g = (g + deltas[i]) & 0xFFFF if g else 0
+                    if g:
+                        out[cp] = g
+                    break
+        return out
+
+    @staticmethod
+    def _cmap12(t, off, wanted):
+        n = struct.unpack(">L", t[off + 12: off + 16])[0]
+        out = {}
+        for i in range(n):
+            a, b, g = struct.unpack(">LLL", t[off + 16 + 12 * i: off + 28 + 12 * i])
+            for cp in wanted:
+                if a <= cp <= b:
+                    out[cp] = g + cp - a
+        return out
+
+    def glyph(self, ch: str) -> int:
+        return self._cmap.get(ord(ch), 0)
+
+    def width(self, ch: str) -> float:
+        """Largeur d’avance d’un caractère en millièmes d’em (unité des /Widths PDF)."""
+        return self.advances[self.glyph(ch)] * 1000.0 / self.upem
+
+    # ————— Sous-ensemble : on ne garde que le contour des glyphes utilisés —————
+    def _glyph_range(self, loca: bytes, gid: int):
+        if self.loca_long:
+            a, b = struct.unpack(">LL", loca[4 * gid: 4 * gid + 8])
+        else:
+            a, b = (x * 2 for x in struct.unpack(">HH", loca[2 * gid: 2 * gid + 4]))
+        return a, b
+
+    def subset(self, gids: set) -> bytes:
+        """Fichier TrueType où les glyphes non utilisés sont vidés (indices conservés → cmap intact)."""
+        glyf, loca = self._t("glyf"), self._t("loca")
+        keep, todo = set(), {0} | set(gids)
+        while todo:
+            g = todo.pop()
+            if g in keep or g >= self.num_glyphs:
+                continue
+            keep.add(g)
+            a, b = self._glyph_range(loca, g)
+            if b - a >= 10 and struct.unpack(">h", glyf[a: a + 2])[0] < 0:
+                # Glyphe composite : on ajoute ses composants
+                p = a + 10
+                while True:
+                    flags, comp = struct.unpack(">HH", glyf[p: p + 4])
+                    todo.add(comp)
+                    p += 4 + (4 if flags & 0x0001 else 2)
+                    p += 2 if flags & 0x0008 else 4 if flags & 0x0040 else 8 if flags & 0x0080 else 0
+                    if not flags & 0x0020:
+                        break
+        new_glyf, offsets = bytearray(), []
+        for g in range(self.num_glyphs):
+            offsets.append(len(new_glyf))
+            if g in keep:
+                a, b = self._glyph_range(loca, g)
+                new_glyf += glyf[a:b]
+                new_glyf += b"\0" * (-len(new_glyf) % 4)
+        offsets.append(len(new_glyf))
+        head = bytearray(self._t("head"))
+        head[8:12] = b"\0\0\0\0"                 # checkSumAdjustment (ignoré par les lecteurs PDF)
+        head[50:52] = struct.pack(">h", 1)       # loca au format long
+        tables = {"head": bytes(head), "glyf": bytes(new_glyf),
+                  "loca": struct.pack(f">{len(offsets)}L", *offsets)}
+        for tag in ("hhea", "hmtx", "maxp", "cmap", "cvt ", "fpgm", "prep", "OS/2"):
+            if tag in self.tables:
+                tables[tag] = self._t(tag)
+        if "post" in self.tables:
+            # post format 3 : en-tête seul, sans la liste (volumineuse) des noms de glyphes
+            tables["post"] = struct.pack(">L", 0x00030000) + self._t("post")[4:32]
+        return _build_sfnt(tables)
+
+def _checksum(b: bytes) -> int:
+    b = b + b"\0" * (-len(b) % 4)
+    return sum(struct.unpack(f">{len(b) // 4}L", b)) & 0xFFFFFFFF
+
+def _build_sfnt(tables: dict) -> bytes:
+    tags = sorted(tables)
+    n = len(tags)
+    es = max(k for k in range(8) if 2 ** k <= n)
+    out = bytearray(struct.pack(">LHHHH", 0x00010000, n, 16 * 2 ** es, es, 16 * n - 16 * 2 ** es))
+    off = 12 + 16 * n
+    body = bytearray()
+    for tag in tags:
+        data = tables[tag]
+        out += struct.pack(">4sLLL", tag.encode("latin-1"), _checksum(data), off + len(body), len(data))
+        body += data + b"\0" * (-len(data) % 4)
+    return bytes(out + body)
+
+# Jeu de caractères WinAnsi (cp1252) : index = code 0..255 → caractère Unicode ('' si non défini)
+_WINANSI = [bytes([i]).decode("cp1252", errors="ignore") for i in range(256)]
+
+# Largeurs Helvetica / Helvetica-Bold (AFM standard) pour l’ASCII imprimable 32..126 — repli sans TTF
+_HELV = [278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+         556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+         1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+         667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+         333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+         556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584]
+_HELV_BOLD = [278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+              556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+              975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+              667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+              333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+              611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584]
+
+class Base14Font:
+    """Helvetica / Helvetica-Bold (non embarquées) : largeurs AFM, accents → lettre de base."""
+    def __init__(self, bold: bool):
+        self.ps_name = "Helvetica-Bold" if bold else "Helvetica"
+        self.widths = _HELV_BOLD if bold else _HELV
+        self.ascent, self.descent, self.line_gap, self.upem = 718, -207, 231, 1000
+
+    def width(self, ch: str) -> float:
+        c = ord(ch)
+        if not 32 <= c <= 126:
+            base = unicodedata.normalize("NFKD", ch)[:1]
+            c = ord(base) if base and 32 <= ord(base) <= 126 else ord("o")
+        return self.widths[c - 32]
+
+_font_lock = threading.Lock()
+_font_cache = {}
+
+def _fonts():
+    """(régulière, grasse) — analysées une seule fois par processus (rendu suivant = quelques ms)."""
+    with _font_lock:
+        key = (_cfg("POLICE", "Aptos"), _cfg("PDF_FONT_FILE", None), _cfg("PDF_FONT_BOLD_FILE", None))
+        if key not in _font_cache:
+            reg, bold = _find_font_files()
+            try:
+                if reg:
+                    # Sans fichier gras, la régulière sert aux deux : une seule police embarquée
+                    r = TrueTypeFont(reg)
+                    fonts = (r, r if bold == reg else TrueTypeFont(bold))
+                else:
+                    fonts = None
+            except Exception:
+                fonts = None
+            _font_cache[key] = fonts or (Base14Font(False), Base14Font(True))
+        return _font_cache[key]
+
+# ===================== Mise en page =====================
+def _to_winansi(s: str) -> str:
+    # Le PDF est encodé en cp1252 : on remplace proprement ce qui n’y figure pas
+    out = []
+    for ch in s:
+        try:
+            ch.encode("cp1252")
+            out.append(ch)
+        except UnicodeEncodeError:
+            base = unicodedata.normalize("NFKD", ch).encode("cp1252", errors="ignore").decode("cp1252")
+            out.append(base[:1] or "?")
+    return "".join(out)
+
+def _text_width(font, s: str, size: float) -> float:
+    return sum(font.width(c) for c in s) * size / 1000.0
+
+def _wrap(font, text: str, size: float, max_w: float) -> list:
+    """Césure gloutonne mot à mot sur la largeur utile (mots trop longs coupés au caractère)."""
+    lines, cur = [], ""
+    space = _text_width(font, " ", size)
+    cur_w = 0.0
+    for word in text.split():
+        w = _text_width(font, word, size)
+        if cur and cur_w + space + w <= max_w:
+            cur += " " + word; cur_w += space + w
+            continue
+        if cur:
+            lines.append(cur)
+        while w > max_w:
+            # Mot plus large que la ligne : on coupe au dernier caractère qui tient
+            k, acc = 0, 0.0
+            while k < len(word) and acc + font.width(word[k]) * size / 1000.0 <= max_w:
+                acc += font.width(word[k]) * size / 1000.0; k += 1
+            k = max(1, k)
+            lines.append(word[:k]); word = word[k:]; w = _text_width(font, word, size)
+        cur, cur_w = word, w
+    if cur:
+        lines.append(cur)
+    return lines or [""]
+
+def _pdf_str(s: str) -> bytes:
+    b = _to_winansi(s).encode("cp1252")
+    return b"(" + b.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+def render_blocks(blocks: tuple, style: letter_model.Style) -> bytes:
+    """Dessine les blocs du modèle de lettre et renvoie les octets du PDF."""
+    reg, bold = _fonts()
+    size = float(style.size_pt)
+    top, bottom, left, right = style.margins_inch
+    x0, max_w = left * 72, PAGE_W - (left + right) * 72
+    y_top, y_min = PAGE_H - top * 72, bottom * 72
+    # Interligne “multiple” façon Word : hauteur de ligne naturelle de la police × LINE_SPACING
+    line_h = size * (reg.ascent - reg.descent + reg.line_gap) / reg.upem * style.line_spacing
+    ascent = size * reg.ascent / reg.upem
+
+    pages, ops, links = [], [], []
+    used = {id(reg): set(), id(bold): set()}
+    y = y_top
+
+    def new_page():
+        nonlocal ops, links, y
+        pages.append((ops, links))
+        ops, links, y = [], [], y_top
+
+    for block in blocks:
+        uri = block.link
+        for text, is_bold in block.lines:
+            font = bold if is_bold else reg
+            for ln in _wrap(font, _to_winansi(text), size, max_w):
+                if y - line_h < y_min and (ops or links):
+                    new_page()
+                baseline = y - ascent
+                used[id(font)].update(ln)
+                fname = b"/F2" if is_bold else b"/F1"
+                if uri:
+                    r, g, b = LINK_RGB
+                    w = _text_width(font, ln, size)
+                    ops.append(b"%.4f %.4f %.4f rg %.4f %.4f %.4f RG" % (r, g, b, r, g, b))
+                    ops.append(b"BT %s %.2f Tf %.2f %.2f Td %s Tj ET" % (fname, size, x0, baseline, _pdf_str(ln)))
+                    # Soulignement (comme le style Hyperlink de Word)
+                    ops.append(b"%.2f w %.2f %.2f m %.2f %.2f l S 0 g 0 G" % (
+                        size / 18, x0, baseline - size * 0.12, x0 + w, baseline - size * 0.12))
+                    links.append((x0, baseline + size * reg.descent / reg.upem, x0 + w, baseline + ascent, uri))
+                else:
+                    ops.append(b"BT %s %.2f Tf %.2f %.2f Td %s Tj ET" % (fname, size, x0, baseline, _pdf_str(ln)))
+                y -= line_h
+        y -= block.space_after_pt
+    pages.append((ops, links))
+    return _assemble(pages, (reg, used[id(reg)]), (bold, used[id(bold)]))
+
+# ===================== Sérialisation PDF =====================
+def _font_objects(add, font, chars: set) -> int:
+    """Ajoute les objets d’une police (simple, WinAnsi) et renvoie le numéro de l’objet /Font."""
+    if isinstance(font, Base14Font):
+        return add(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>"
+                   % font.ps_name.encode())
+    gids = {font.glyph(c) for c in chars} | {font.glyph(" ")}
+    ttf = font.subset(gids)
+    # Tag de sous-ensemble déterministe (6 majuscules), requis par la norme pour une police partielle
+    h = hashlib.md5(repr(sorted(gids)).encode()).digest()
+    tag = "".join(chr(65 + b % 26) for b in h[:6])
+    name = f"{tag}+{font.ps_name}".encode()
+    packed = zlib.compress(ttf)
+    ff = add(b"<< /Length %d /Length1 %d /Filter /FlateDecode >>\nstream\n" % (len(packed), len(ttf))
+             + packed + b"\nendstream")
+    k = 1000.0 / font.upem
+    bb = " ".join(str(int(v * k)) for v in font.bbox).encode()
+    desc = add(b"<< /Type /FontDescriptor /FontName /%s /Flags 32 /FontBBox [%s] /ItalicAngle %d"
+               b" /Ascent %d /Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>"
+               % (name, bb, int(font.italic_angle), int(font.ascent * k), int(font.descent * k),
+                  int(font.cap_height * k), ff))
+    widths = b" ".join(b"%d" % round(font.width(_WINANSI[c])) if _WINANSI[c] else b"0" for c in range(32, 256))
+    return add(b"<< /Type /Font /Subtype /TrueType /BaseFont /%s /FirstChar 32 /LastChar 255"
+               b" /Widths [%s] /Encoding /WinAnsiEncoding /FontDescriptor %d 0 R >>" % (name, widths, desc))
+
+def _assemble(pages: list, regular: tuple, bold: tuple) -> bytes:
+    objs = []
+
+    def add(body: bytes) -> int:
+        objs.append(body)
+        return len(objs)
+
+    catalog = add(b"")   # rempli à la fin (références connues)
+    pages_id = add(b"")
+    f1 = _font_objects(add, *regular)
+    f2 = f1 if bold[0] is regular[0] else _font_objects(add, *bold)
+    fonts = b"<< /F1 %d 0 R /F2 %d 0 R >>" % (f1, f2)
+    kids = []
+    for ops, links in pages:
+        content = zlib.compress(b"\n".join(ops))
+        c_id = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content) + content + b"\nendstream")
+        annots = [add(b"<< /Type /Annot /Subtype /Link /Rect [%.2f %.2f %.2f %.2f] /Border [0 0 0]"
+                      b" /A << /S /URI /URI %s >> >>" % (x1, y1, x2, y2, _pdf_str(uri)))
+                  for x1, y1, x2, y2, uri in links]
+        annot = b" /Annots [%s]" % b" ".join(b"%d 0 R" % a for a in annots) if annots else b""
+        kids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources << /Font %s >>"
+                        b" /Contents %d 0 R%s >>" % (pages_id, PAGE_W, PAGE_H, fonts, c_id, annot)))
+    objs[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    objs[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, body in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, catalog, xref)
+    return bytes(out)
+
+# ===================== API =====================
+def render_pdf(letter: letter_model.Letter) -> bytes:
+    """Renderer PDF du modèle de lettre (même contenu et mêmes réglages de style que le DOCX)."""
+    return render_blocks(letter.blocks(), letter.style)
+
+def render_letter(bank: str, position: str, body_paragraphs: list) -> bytes:
+    """Raccourci : octets PDF d’une lettre à partir de ses paragraphes bruts."""
+    return render_pdf(letter_model.build_letter(bank, position, body_paragraphs))
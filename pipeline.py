@@ -0,0 +1,71 @@
+# pipeline.py — Chaîne de génération complète, sans UI : LLM → modèle de lettre → fichiers → PDF
+# Point d’entrée unique partagé par l’app, le serveur HTTP et les modes automatiques,
+# pour que tous produisent exactement les mêmes fichiers.
+import config
+import dedup
+import export_pdf
+import letter_model
+import llm_body
+import writer
+
+def _noop(_stage: str, _message: str):
+    pass
+
+def _render(bank: str, position: str, body: list, do_pdf: bool, extra_formats, progress) -> tuple:
+    """Modèle de lettre (construit une fois) → DOCX + formats annexes rendus en parallèle, puis PDF.
+    En rendu PDF natif, le PDF part dans le même lot (pas de conversion DOCX → PDF)."""
+    progress("render", "Création du DOCX…")
+    letter = letter_model.build_letter(bank, position, body)
+    native_pdf = do_pdf and getattr(config, "PDF_BACKEND", "auto") == "native"
+    if extra_formats is None:
+        extra_formats = getattr(config, "EXTRA_FORMATS", ())
+    formats = ("docx",) + (("pdf",) if native_pdf else ()) + tuple(f for f in extra_formats if f not in ("docx", "pdf"))
+    result = dict(writer.save_letter_files(letter, formats))
+
+    # Export PDF via Word / LibreOffice (optionnel)
+    if do_pdf and not native_pdf:
+        progress("pdf", "Export PDF…")
+        try:
+            result["pdf"] = export_pdf.letter_to_pdf(result["docx"], letter)
+        except Exception as e:
+            # On n’échoue pas tout : DOCX OK, PDF KO → on remonte une alerte.
+            result["pdf_error"] = f"DOCX OK. Export PDF a échoué : {e}"
+    return letter, result
+
+def reused_result(match: dedup.Match, bank: str, position: str, do_pdf: bool = True,
+                  extra_formats=None, progress=_noop) -> dict:
+    """Lettre d’une offre quasi identique, sans appel LLM : son corps (`match.body`) est re-rendu
+    pour la banque et le poste demandés, les fichiers de l’ancienne offre ne sont pas renvoyés."""
+    _letter, result = _render(bank, position, match.body, do_pdf, extra_formats, progress)
+    result["duplicate_of"] = {"bank": match.bank, "position": match.position, "docx": match.letter_path,
+                              "similarity": round(match.similarity, 3), "created": match.created}
+    return result
+
+def run_letter(bank: str, position: str, offer: str, lang: str = "EN", do_pdf: bool = True,
+               extra_formats=None, progress=_noop, on_duplicate: str = None) -> dict:
+    """Génère une lettre et renvoie {"docx": chemin, "pdf": chemin?, "<format>": chemin…, "pdf_error": msg?}.
+    `progress(étape, message)` est appelé à chaque étape (dedup, llm, paragraph, render, pdf).
+    `on_duplicate` : "reuse" → si l’offre est quasi identique à une offre déjà traitée (même banque,
+    même intitulé au lieu près), le corps de sa lettre est repris sans appel LLM et rendu pour ce poste
+    (clé "duplicate_of") ; "generate" → on génère quand même. Par défaut : config.DEDUP_ON_DUPLICATE."""
+    dedup_on = getattr(config, "DEDUP_ENABLED", True)
+    sig = dedup.signature(offer) if dedup_on else None
+    if dedup_on and (on_duplicate or getattr(config, "DEDUP_ON_DUPLICATE", "reuse")) == "reuse":
+        match = dedup.find_reusable(bank, position, sig=sig)
+        if match:
+            progress("dedup", f"Offre déjà traitée ({match.similarity:.0%}, {match.position}) : corps de lettre réutilisé")
+            return reused_result(match, bank, position, do_pdf, extra_formats, progress)
+
+    # 1) Génération du corps via LLM
+    progress("llm", "Envoi à GPT…")
+    body = llm_body.generate_body_paragraphs(
+        bank, position, offer, lang,
+        on_paragraph=lambda i, _text: progress("paragraph", f"Paragraphe {i + 1} reçu…"))
+
+    # 2) Modèle de lettre → fichiers (+ PDF)
+    letter, result = _render(bank, position, body, do_pdf, extra_formats, progress)
+
+    # 3) Offre mémorisée (avec son corps) pour repérer ses futures republications
+    if dedup_on:
+        dedup.default_index().add(bank, position, letter_path=result["docx"], sig=sig, body=letter.body)
+    return result
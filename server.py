@@ -0,0 +1,413 @@
+# server.py — Mode serveur sans interface : API HTTP locale pour piloter la génération
+# Permet à d’autres outils (ex. notre suivi de candidatures) d’envoyer des lettres à produire.
+#   POST /jobs                     {"bank", "position", "offer", "lang", "pdf", "formats", "on_duplicate"} → 202 {"id", …}
+#   GET  /jobs/<id>                état du job (queued / running / done / error) + fichiers produits
+#   GET  /jobs/<id>/events         progression en direct (Server-Sent Events)
+#   GET  /jobs/<id>/files/<fmt>    octets du DOCX / PDF / txt / html
+#   GET  /health                   taille de file, workers, état des routes LLM
+# Le client LLM, les polices PDF et python-docx restent chargés d’une requête à l’autre,
+# les connexions sont keep-alive (HTTP/1.1) et la file est bornée : quand elle est pleine,
+# on répond 503 + Retry-After (contre-pression) au lieu d’accumuler sans limite.
+#
+# Lancement :      python server.py --port 8765
+# Bench local :    python server.py --stub-latency 0.5 &   puis   python server.py bench --jobs 200
+import argparse, http.client, json, os, queue, re, sys, threading, time, uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import config
+import letter_model
+
+CONTENT_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "pdf": "application/pdf",
+    "txt": "text/plain; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+}
+
+class Job:
+    """Un job de génération + son fil d’événements (lu en direct par /events)."""
+    def __init__(self, params: dict):
+        self.id = uuid.uuid4().hex[:16]
+        self.params = params
+        self.status = "queued"
+        self.created = time.time()
+        self.finished = None
+        self.result = {}
+        self.error = None
+        self.events = []
+        self.cond = threading.Condition()
+        self.emit("queued", "En file d’attente")
+
+    def emit(self, stage: str, message: str):
+        with self.cond:
+            self.events.append({"ts": time.time(), "stage": stage, "message": message})
+            self.cond.notify_all()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "error")
+
+    def to_dict(self) -> dict:
+        files = {k: f"/jobs/{self.id}/files/{k}" for k, v in self.result.items() if k in CONTENT_TYPES}
+        return {"id": self.id, "status": self.status, "created": self.created, "finished": self.finished,
+                "error": self.error, "pdf_error": self.result.get("pdf_error"), "files": files,
+                "duplicate_of": self.result.get("duplicate_of"),
+                "events": f"/jobs/{self.id}/events"}
+
+class JobManager:
+    """File bornée + pool de workers ; garde les N derniers jobs pour consultation."""
+    def __init__(self, run, workers: int, queue_size: int, keep: int = 1000,
+                 worker_init=None, worker_exit=None):
+        self.run = run
+        # Appelés dans chaque worker à son démarrage / à son arrêt (ressources liées au thread)
+        self.worker_init, self.worker_exit = worker_init, worker_exit
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.jobs = OrderedDict()
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.workers = workers
+        self.busy = 0
+        self.durations = []   # dernières durées de job (estimation du Retry-After)
+        self.threads = [threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+                        for i in range(workers)]
+        for t in self.threads:
+            t.start()
+
+    def submit(self, params: dict):
+        """Job accepté, ou None si la file est pleine (le client doit réessayer plus tard)."""
+        job = Job(params)
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            return None
+        with self.lock:
+            self.jobs[job.id] = job
+            # Rétention bornée : on oublie les plus anciens jobs terminés
+            while len(self.jobs) > self.keep:
+                oldest = next((k for k, j in self.jobs.items() if j.done), None)
+                if oldest is None:
+                    break
+                self.jobs.pop(oldest)
+        return job
+
+    def get(self, job_id: str):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def retry_after(self) -> int:
+        # Temps estimé pour qu’une place se libère : durée moyenne × file / workers
+        with self.lock:
+            avg = sum(self.durations) / len(self.durations) if self.durations else 5.0
+        return max(1, int(avg * (self.queue.qsize() + 1) / max(1, self.workers)))
+
+    def close(self, timeout: float = 30.0):
+        """Arrête les workers une fois la file vidée (jobs en cours terminés), sans dépasser `timeout`."""
+        deadline = time.monotonic() + timeout
+        for _ in self.threads:
+            try:
+                self.queue.put(None, timeout=max(0.1, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for t in self.threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+
+    def _loop(self):
+        if self.worker_init is not None:
+            try:
+                self.worker_init()
+            except Exception:
+                pass  # ressource facultative (ex. Word absent) : le job s’en passera
+        try:
+            self._serve()
+        finally:
+            if self.worker_exit is not None:
+                self.worker_exit()
+
+    def _serve(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                return
+            with self.lock:
+                self.busy += 1
+            job.status = "running"
+            t0 = time.perf_counter()
+            try:
+                p = job.params
+                job.result = self.run(p["bank"], p["position"], p["offer"], p.get("lang", "EN"),
+                                      p.get("pdf", True), p.get("formats"), progress=job.emit,
+                                      on_duplicate=p.get("on_duplicate"))
+                job.status = "done"
+                job.emit("done", "Terminé")
+            except Exception as e:
+                job.error = str(e)
+                job.status = "error"
+                job.emit("error", job.error)
+            finally:
+                job.finished = time.time()
+                with self.lock:
+                    self.busy -= 1
+                    self.durations = (self.durations + [time.perf_counter() - t0])[-50:]
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "capacity": self.queue.maxsize,
+                "workers": self.workers, "busy": self.busy, "jobs": len(self.jobs)}
+
+JOB_RX = re.compile(r"^/jobs/([0-9a-f]{16})(/events|/files/(\w+))?$")
+# banque / poste servent de noms de dossier et de fichier : ni séparateur, ni lecteur, ni “..”
+UNSAFE_NAME_RX = re.compile(r"[/\\:\x00-\x1f]|^\s*\.\.?\s*$")
+
+def check_params(params: dict):
+    """Message d’erreur (→ 400) si les paramètres d’un job sont invalides, sinon None."""
+    missing = [k for k in ("bank", "position", "offer")
+               if not isinstance(params.get(k), str) or not params[k].strip()]
+    if missing:
+        return "champs manquants : " + ", ".join(missing)
+    bad = [k for k in ("bank", "position") if UNSAFE_NAME_RX.search(params[k])]
+    if bad:
+        return "caractères interdits (/ \\ : ou ..) dans : " + ", ".join(bad)
+    lang = params.get("lang", "EN")
+    if not isinstance(lang, str) or lang.upper() not in ("EN", "FR"):
+        return "lang attendu : EN ou FR"
+    if not isinstance(params.get("pdf", True), bool):
+        return "pdf attendu : booléen"
+    formats = params.get("formats")
+    if formats is not None and (not isinstance(formats, list) or not all(isinstance(f, str) for f in formats)
+                                or set(formats) - set(letter_model.RENDERERS)):
+        return "formats attendus parmi : " + ", ".join(letter_model.RENDERERS)
+    if params.get("on_duplicate") not in (None, "reuse", "generate"):
+        return "on_duplicate attendu : reuse ou generate"
+    return None
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128   # backlog TCP : des rafales de clients ne se font pas rejeter au connect()
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive : un client réutilise la même connexion TCP
+    server_version = "CoverLetterServer/1.0"
+
+    def log_message(self, fmt, *args):
+        if getattr(self.server, "verbose", False):
+            super().log_message(fmt, *args)
+
+    # ————— Réponses —————
+    def _send(self, code: int, body: bytes, ctype: str, headers: dict = None):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, code: int, obj: dict, headers: dict = None):
+        self._send(code, json.dumps(obj, ensure_ascii=False).encode("utf-8"), "application/json", headers)
+
+    def _error(self, code: int, message: str, headers: dict = None):
+        self._json(code, {"error": message}, headers)
+
+    # ————— Routes —————
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip("/")
+        mgr = self.server.manager
+        if path == "/health":
+            router = getattr(sys.modules.get("llm_body"), "_router", None)
+            return self._json(200, {**mgr.stats(), "routes": router.snapshot() if router else {}})
+        m = JOB_RX.match(path)
+        job = mgr.get(m.group(1)) if m else None
+        if job is None:
+            return self._error(404, "job inconnu")
+        if m.group(2) == "/events":
+            return self._stream_events(job)
+        if m.group(3):
+            return self._send_file(job, m.group(3))
+        self._json(200, job.to_dict())
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            self.close_connection = True  # corps non lu : la connexion n’est plus réutilisable
+            return self._error(404, "route inconnue", {"Connection": "close"})
+        try:
+            n = int(self.headers.get("Content-Length") or 0)
+            if n < 0:
+                raise ValueError
+        except ValueError:
+            self.close_connection = True  # longueur du corps inconnue : la connexion n’est plus réutilisable
+            return self._error(400, "Content-Length invalide", {"Connection": "close"})
+        if n > self.server.max_body:
+            self.close_connection = True
+            return self._error(413, "requête trop volumineuse", {"Connection": "close"})
+        try:
+            params = json.loads(self.rfile.read(n) or b"{}")
+        except ValueError:
+            return self._error(400, "JSON invalide")
+        if not isinstance(params, dict):
+            return self._error(400, "objet JSON attendu")
+        problem = check_params(params)
+        if problem:
+            return self._error(400, problem)
+        job = self.server.manager.submit(params)
+        if job is None:
+            # Contre-pression : le client réessaie après le délai indiqué
+            return self._error(503, "file pleine, réessayer plus tard",
+                               {"Retry-After": str(self.server.manager.retry_after())})
+        self._json(202, job.to_dict(), {"Location": f"/jobs/{job.id}"})
+
+    def _send_file(self, job: Job, fmt: str):
+        path = job.result.get(fmt)
+        if fmt not in CONTENT_TYPES or not path:
+            return self._error(404 if job.done else 409, "fichier indisponible")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            return self._error(410, f"fichier introuvable : {e}")
+        name = os.path.basename(path).encode("ascii", "replace").decode("ascii")
+        self._send(200, data, CONTENT_TYPES[fmt], {"Content-Disposition": f'attachment; filename="{name}"'})
+
+    def _stream_events(self, job: Job):
+        # SSE en “chunked” : la connexion reste réutilisable (keep-alive) une fois le flux terminé
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        sent = 0
+        try:
+            while True:
+                with job.cond:
+                    while sent == len(job.events) and not job.done:
+                        job.cond.wait(timeout=15)
+                        if sent == len(job.events) and not job.done:
+                            break  # rien de neuf : on envoie un commentaire keep-alive
+                    new, done = job.events[sent:], job.done
+                sent += len(new)
+                if new:
+                    chunk(b"".join(b"event: %s\ndata: %s\n\n" % (e["stage"].encode(), json.dumps(e, ensure_ascii=False).encode("utf-8"))
+                                   for e in new))
+                elif not done:
+                    chunk(b": ping\n\n")
+                if done and sent == len(job.events):
+                    break
+            chunk(b"")  # fin du flux chunked
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, workers: int = None, queue_size: int = None,
+                run=None) -> Server:
+    """Serveur prêt à servir ; `run` = fonction de génération (pipeline.run_letter par défaut)."""
+    hooks = {}
+    if run is None:
+        import pipeline
+        run = pipeline.run_letter
+        _warm_up()
+        if getattr(config, "PDF_BACKEND", "auto") != "native":
+            # Une instance Word par worker, gardée ouverte d’un job à l’autre
+            import export_pdf
+            hooks = {"worker_init": export_pdf.keep_word_open, "worker_exit": export_pdf.release_word}
+    srv = Server((host, port), Handler)
+    srv.max_body = 1_000_000
+    srv.manager = JobManager(
+        run,
+        workers or int(getattr(config, "SERVER_WORKERS", 4)),
+        queue_size or int(getattr(config, "SERVER_QUEUE_SIZE", 64)),
+        **hooks,
+    )
+    return srv
+
+def _warm_up():
+    # Charge une fois pour toutes python-docx, le modèle DOCX et les polices du rendu PDF natif
+    # (Word, lui, est démarré dans chaque worker : voir make_server)
+    import letter_model, writer
+    letter = letter_model.build_letter("Warm-up", "Warm-up", ["Warm-up."])
+    writer.render_docx(letter)
+    if getattr(config, "PDF_BACKEND", "auto") != "office":
+        import pdf_native
+        pdf_native.render_pdf(letter)
+
+# ===================== Bench local =====================
+def bench(url: str, jobs: int, concurrency: int, offer: str = "Stub offer for load testing.") -> dict:
+    """Soumet `jobs` lettres avec `concurrency` clients keep-alive, attend la fin, mesure débit/latence."""
+    u = urlparse(url)
+    lat, rejected, failed = [], [0], [0]
+    lock = threading.Lock()
+    per_client = [jobs // concurrency + (1 if i < jobs % concurrency else 0) for i in range(concurrency)]
+
+    def client(n: int):
+        conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=600)
+        for i in range(n):
+            t0 = time.perf_counter()
+            body = json.dumps({"bank": "Bench Bank", "position": f"Bench {i}", "offer": offer,
+                               "pdf": True}).encode()
+            while True:
+                conn.request("POST", "/jobs", body, {"Content-Type": "application/json"})
+                resp = conn.getresponse(); data = resp.read()
+                if resp.status != 503:
+                    break
+                with lock:
+                    rejected[0] += 1
+                time.sleep(min(2.0, float(resp.getheader("Retry-After") or 1)))
+            job_id = json.loads(data)["id"]
+            # On suit le flux d’événements jusqu’à la fin (même connexion)
+            conn.request("GET", f"/jobs/{job_id}/events")
+            resp = conn.getresponse(); events = resp.read()
+            ok = b"event: done" in events
+            with lock:
+                lat.append(time.perf_counter() - t0)
+                failed[0] += 0 if ok else 1
+        conn.close()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        list(ex.map(client, per_client))
+    total = time.perf_counter() - t0
+    lat.sort()
+    return {"jobs": jobs, "seconds": round(total, 2), "jobs_per_s": round(jobs / total, 2),
+            "p50_s": round(lat[len(lat) // 2], 3), "p95_s": round(lat[int(len(lat) * 0.95) - 1], 3),
+            "rejected_503": rejected[0], "failed": failed[0]}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="API HTTP locale de génération de lettres.")
+    ap.add_argument("mode", nargs="?", default="serve", choices=["serve", "bench"])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=int(getattr(config, "SERVER_PORT", 8765)))
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--queue", type=int, default=None, help="taille max de la file d’attente")
+    ap.add_argument("--stub-latency", type=float, default=None,
+                    help="remplace l’API OpenAI par un stub local de cette latence (secondes)")
+    ap.add_argument("--jobs", type=int, default=100, help="(bench) nombre de lettres")
+    ap.add_argument("--concurrency", type=int, default=8, help="(bench) clients simultanés")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    a = ap.parse_args()
+
+    if a.mode == "bench":
+        print(json.dumps(bench(f"http://{a.host}:{a.port}", a.jobs, a.concurrency), indent=2))
+        sys.exit(0)
+
+    if a.stub_latency is not None:
+        # Le routeur LLM est construit à l’import de llm_body : on le pointe d’abord sur le stub
+        import stub_openai
+        stub = stub_openai.start_in_thread(latency=a.stub_latency)
+        config.OPENAI_API_BASE, config.MODEL_FALLBACKS = stub.base_url, []
+        print(f"LLM simulé : {stub.base_url} ({a.stub_latency}s)")
+    srv = make_server(a.host, a.port, a.workers, a.queue)
+    srv.verbose = a.verbose
+    print(f"Serveur prêt sur http://{a.host}:{srv.server_address[1]} "
+          f"({srv.manager.workers} workers, file {srv.manager.queue.maxsize})")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+        srv.manager.close()   # termine les jobs en cours et ferme les instances Word des workers
@@ -0,0 +1,132 @@
+# soak.py — Test d’endurance mémoire : des centaines de générations simulées, RSS censé rester plat
+# Le LLM est remplacé par le stub local (stub_openai.py) et toutes les sorties (lettres, journaux,
+# index, cache PDF) partent dans un dossier temporaire. On mesure après un échauffement (polices,
+# imports, caches remplis) puis en fin de course : RSS du processus + allocations Python suivies
+# par tracemalloc (les 10 plus fortes croissances sont affichées pour trouver une fuite).
+# Code de sortie 1 si la croissance dépasse --max-growth-mb ; version courte dans tests/test_soak.py.
+#
+# Usage : python soak.py [--runs 300] [--warmup 50] [--gui]
+#   --gui : chaque lettre passe par l’app comme un clic sur “Générer” (thread de génération,
+#           fenêtre de résultat réutilisée…), nécessite customtkinter et un affichage.
+import argparse, gc, os, sys, tempfile, time, tracemalloc
+os.environ.setdefault("OPENAI_API_KEY", "sk-soak")   # le stub n’en vérifie pas : aucune vraie clé requise
+import config
+
+def rss_mb() -> float:
+    """Mémoire résidente actuelle du processus (Mo)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1e6
+    except ImportError:
+        # Repli : pic (ru_maxrss), ne redescend jamais mais suffit à voir une dérive
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+def _isolate(tmp: str, patch=setattr):
+    """Pointe l’app sur le stub et un dossier temporaire. `patch(objet, nom, valeur)` : setattr,
+    ou monkeypatch.setattr dans les tests pour tout restaurer ensuite."""
+    import stub_openai, llm_body, llm_router
+    stub = stub_openai.start_in_thread()
+    patch(config, "OPENAI_API_BASE", stub.base_url)
+    patch(config, "MODEL_FALLBACKS", [])
+    patch(config, "OUT_DIR", os.path.join(tmp, "letters"))
+    patch(config, "USAGE_DB", os.path.join(tmp, "usage.sqlite3"))
+    patch(config, "LETTER_INDEX_DB", os.path.join(tmp, "index.sqlite3"))
+    patch(config, "PDF_CACHE_DIR", os.path.join(tmp, "pdf_cache"))
+    patch(config, "PDF_BACKEND", "native")
+    # Chaque offre identique serait sinon servie par la déduplication, sans rien générer
+    patch(config, "DEDUP_ENABLED", False)
+    # Routeur construit à l’import de llm_body (peut-être déjà importé) : on le refait sur le stub
+    patch(llm_body, "_router", llm_router.Router.from_config())
+    return stub
+
+def soak(runs: int, warmup: int, gui: bool = False) -> dict:
+    import pipeline
+    app = None
+    if gui:
+        import app as app_module
+        app = app_module.App()
+        app.withdraw()
+
+    offer = ("We are looking for a junior trader to join our market making desk: pricing, risk "
+             "management and automation in Python. ") * 8
+
+    finished = []
+    if app is not None:
+        on_done = app._on_done
+        app._on_done = lambda *a: (on_done(*a), finished.append(a))
+
+    def one(i: int):
+        # 20 postes distincts : les fichiers sont réécrits, l’espace disque reste borné
+        if app is None:
+            pipeline.run_letter("Soak Bank", f"Soak {i % 20}", offer, "EN", do_pdf=True)
+            return
+        # Même chemin qu’un clic sur “Générer” : formulaire → thread de génération → _on_done
+        app.bank_combo.set("Soak Bank")
+        app.position_entry.delete(0, "end")
+        app.position_entry.insert(0, f"Soak {i % 20}")
+        app.offer_text.delete("1.0", "end")
+        app.offer_text.insert("1.0", offer)
+        n = len(finished)
+        app._on_generate()
+        deadline = time.monotonic() + 60
+        while len(finished) == n:
+            if time.monotonic() > deadline:
+                raise TimeoutError("génération sans réponse de l’app")
+            app.update()
+            time.sleep(0.002)
+        if finished[-1][2] and not finished[-1][0]:
+            raise RuntimeError(finished[-1][2])
+
+    for i in range(warmup):
+        one(i)
+    gc.collect()
+    tracemalloc.start()   # 1 seule trame : suffisant pour les stats par ligne, 20× plus rapide que 25
+    base_snap, base_rss = tracemalloc.take_snapshot(), rss_mb()
+    samples = [base_rss]
+    t0 = time.perf_counter()
+    for i in range(warmup, warmup + runs):
+        one(i)
+        if (i - warmup + 1) % max(1, runs // 10) == 0:
+            samples.append(rss_mb())
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    end_snap, end_rss = tracemalloc.take_snapshot(), rss_mb()
+    traced = sum(s.size_diff for s in end_snap.compare_to(base_snap, "filename"))
+    top = end_snap.compare_to(base_snap, "lineno")[:10]
+    tracemalloc.stop()
+    if app is not None:
+        app._on_close()
+    return {"runs": runs, "seconds": round(elapsed, 1), "rss_start_mb": round(base_rss, 1),
+            "rss_end_mb": round(end_rss, 1), "rss_growth_mb": round(end_rss - base_rss, 2),
+            "traced_growth_mb": round(traced / 1e6, 3), "rss_samples_mb": [round(s, 1) for s in samples],
+            "top": top}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Test d’endurance mémoire (générations simulées contre le stub).")
+    ap.add_argument("--runs", type=int, default=300)
+    ap.add_argument("--warmup", type=int, default=50)
+    ap.add_argument("--max-growth-mb", type=float, default=8.0)
+    ap.add_argument("--gui", action="store_true", help="passe aussi par la fenêtre de l’app")
+    a = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="soak-") as tmp:
+        stub = _isolate(tmp)
+        r = soak(a.runs, a.warmup, a.gui)
+        stub.shutdown()
+
+    print(f"{r['runs']} générations en {r['seconds']}s")
+    print(f"RSS : {r['rss_start_mb']} → {r['rss_end_mb']} Mo ({r['rss_growth_mb']:+} Mo)  "
+          f"échantillons {r['rss_samples_mb']}")
+    print(f"tracemalloc : {r['traced_growth_mb']:+} Mo — plus fortes croissances :")
+    for stat in r["top"]:
+        print(f"  {stat}")
+    ok = r["rss_growth_mb"] <= a.max_growth_mb and r["traced_growth_mb"] <= a.max_growth_mb / 2
+    print("OK : mémoire stable" if ok else f"ÉCHEC : croissance au-delà de {a.max_growth_mb} Mo")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,283 @@
+# stub_openai.py — Faux serveur compatible OpenAI pour tester en local (sans réseau ni clé)
+# Sert /v1/chat/completions avec une lettre factice (JSON si response_format le demande, flux SSE
+# si stream=True), une latence réglable, un taux d’erreur, des response_format refusés (HTTP 400,
+# comme un modèle qui ne les accepte pas),
+# ainsi que /v1/files et /v1/batches (Batch API, traitement simulé après --batch-delay secondes).
+# Exemple (deux endpoints à latences différentes) :
+#   python stub_openai.py --port 8001 --latency 0.2
+#   python stub_openai.py --port 8002 --latency 3.0
+# puis OPENAI_API_BASE=http://127.0.0.1:8002/v1 MODEL_FALLBACKS=stub@http://127.0.0.1:8001/v1
+import argparse, json, random, sys, threading, time, uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Corps de lettre renvoyé par défaut (4 paragraphes séparés par des lignes vides)
+STUB_LETTER = (
+    "I am applying with genuine enthusiasm for this role, which matches the direction I have "
+    "deliberately given to my studies and internships in markets. Working close to clients and "
+    "traders is what motivates me most, and your team offers exactly that exposure.\n\n"
+    "During my last internship I built pricing and risk tools used daily by the desk, which taught "
+    "me to deliver reliable results under time pressure. I automated a daily report in Python that "
+    "saved the team an hour every morning and reduced booking errors.\n\n"
+    "My quantitative background, my programming skills in Python and my taste for teamwork would "
+    "let me contribute quickly to your team. I learn fast, I ask precise questions and I enjoy "
+    "turning ambiguous requests into clear and well tested deliverables.\n\n"
+    "I would welcome the opportunity to discuss how my profile could support your objectives. "
+    "I am available for an interview at your convenience and would be glad to share more details "
+    "about my projects and the concrete results they delivered."
+)
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, comme l’API réelle
+
+    def log_message(self, *_):
+        pass  # silencieux (les benchs ne veulent pas de bruit sur stderr)
+
+    def _json(self, code: int, obj: dict):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n)
+
+    def _read_json(self) -> dict:
+        return json.loads(self._read_body() or b"{}")
+
+    def _stream(self, req: dict, content: str, step: int = 24):
+        """Réponse en flux SSE (chunks chat.completion.chunk), usage en dernier si include_usage."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        cid, model = f"chatcmpl-{uuid.uuid4().hex[:24]}", req.get("model", "stub")
+
+        def send(obj):
+            data = (f"data: {json.dumps(obj)}\n\n" if obj is not None else "data: [DONE]\n\n").encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish=None):
+            return {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+
+        send(chunk({"role": "assistant", "content": ""}))
+        for i in range(0, len(content), step):
+            send(chunk({"content": content[i:i + step]}))
+        send(chunk({}, "stop"))
+        if (req.get("stream_options") or {}).get("include_usage"):
+            usage = chat_completion(model, content, req.get("messages"))["usage"]
+            send({"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                  "choices": [], "usage": usage})
+        send(None)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _not_found(self):
+        self._json(404, {"error": {"message": f"stub: route inconnue {self.path}"}})
+
+    def do_POST(self):
+        srv = self.server
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            req = self._read_json()
+            time.sleep(max(0.0, srv.latency + random.uniform(-srv.jitter, srv.jitter)))
+            if random.random() < srv.error_rate:
+                return self._json(500, {"error": {"message": "stub: erreur simulée", "type": "server_error"}})
+            refused = _format_refusal(req, srv)
+            if refused:
+                return self._json(400, refused)
+            content = _content_for(req, srv.content)
+            if req.get("stream"):
+                return self._stream(req, content)
+            return self._json(200, chat_completion(req.get("model", "stub"), content, req.get("messages")))
+        if path.endswith("/files"):
+            fields = _multipart(self.headers.get("Content-Type", ""), self._read_body())
+            filename, data = fields.get("file", ("upload.jsonl", b""))
+            return self._json(200, srv.batch_api.add_file(data, filename, fields.get("purpose", (None, b""))[1].decode()))
+        if path.endswith("/batches"):
+            req = self._read_json()
+            if req.get("input_file_id") not in srv.batch_api.files:
+                return self._json(404, {"error": {"message": "stub: fichier d’entrée inconnu"}})
+            return self._json(200, srv.batch_api.create_batch(req, srv))
+        if path.endswith("/cancel") and "/batches/" in path:
+            batch = srv.batch_api.cancel(path.split("/")[-2])
+            return self._json(200, batch) if batch else self._not_found()
+        self._not_found()
+
+    def do_GET(self):
+        api = self.server.batch_api
+        parts = self.path.split("?")[0].rstrip("/").split("/")
+        if len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content" and parts[-2] in api.files:
+            data = api.files[parts[-2]]["data"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if len(parts) >= 2 and parts[-2] == "files" and parts[-1] in api.files:
+            return self._json(200, api.files[parts[-1]]["meta"])
+        if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in api.batches:
+            return self._json(200, api.batches[parts[-1]])
+        self._not_found()
+
+def _multipart(content_type: str, body: bytes) -> dict:
+    """Champs d’un formulaire multipart : {nom: (nom de fichier, octets)}."""
+    msg = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    out = {}
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        out[name] = (part.get_filename(), part.get_payload(decode=True) or b"")
+    return out
+
+class StubBatchAPI:
+    """Fichiers + lots en mémoire. Un lot passe validating → in_progress → completed après `delay` s ;
+    chaque requête du JSONL est traitée comme un appel chat.completions (même taux d’erreur)."""
+    def __init__(self, delay: float = 1.0):
+        self.delay = delay
+        self.files, self.batches = {}, {}
+        self.lock = threading.Lock()
+
+    def add_file(self, data: bytes, filename: str, purpose: str) -> dict:
+        fid = f"file-{uuid.uuid4().hex[:24]}"
+        meta = {"id": fid, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        with self.lock:
+            self.files[fid] = {"data": data, "meta": meta}
+        return meta
+
+    def create_batch(self, req: dict, srv) -> dict:
+        now = int(time.time())
+        lines = [l for l in self.files[req["input_file_id"]]["data"].decode("utf-8").splitlines() if l.strip()]
+        batch = {"id": f"batch_{uuid.uuid4().hex[:24]}", "object": "batch", "endpoint": req.get("endpoint"),
+                 "errors": None, "input_file_id": req["input_file_id"],
+                 "completion_window": req.get("completion_window", "24h"), "status": "validating",
+                 "output_file_id": None, "error_file_id": None, "created_at": now,
+                 "in_progress_at": None, "expires_at": now + 86400, "completed_at": None,
+                 "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+                 "metadata": req.get("metadata")}
+        with self.lock:
+            self.batches[batch["id"]] = batch
+        threading.Thread(target=self._process, args=(batch, lines, srv), daemon=True).start()
+        return batch
+
+    def cancel(self, batch_id: str):
+        batch = self.batches.get(batch_id)
+        if batch and batch["status"] in ("validating", "in_progress"):
+            batch["status"] = "cancelled"
+            batch["cancelled_at"] = int(time.time())
+        return batch
+
+    def _process(self, batch: dict, lines: list, srv):
+        time.sleep(self.delay / 2)
+        if batch["status"] == "cancelled":
+            return
+        batch.update(status="in_progress", in_progress_at=int(time.time()))
+        time.sleep(self.delay / 2)
+        out, err = [], []
+        for line in lines:
+            req = json.loads(line)
+            rid = f"batch_req_{uuid.uuid4().hex[:24]}"
+            if random.random() < srv.error_rate:
+                err.append({"id": rid, "custom_id": req["custom_id"], "error": None, "response": {
+                    "status_code": 500, "request_id": rid,
+                    "body": {"error": {"message": "stub: erreur simulée", "type": "server_error"}}}})
+                continue
+            body = req.get("body") or {}
+            refused = _format_refusal(body, srv)
+            if refused:
+                err.append({"id": rid, "custom_id": req["custom_id"], "error": None, "response": {
+                    "status_code": 400, "request_id": rid, "body": refused}})
+                continue
+            out.append({"id": rid, "custom_id": req["custom_id"], "error": None, "response": {
+                "status_code": 200, "request_id": rid,
+                "body": chat_completion(body.get("model", "stub"), _content_for(body, srv.content),
+                                        body.get("messages"))}})
+        # Comme l’API réelle : l’ordre des résultats n’est pas garanti
+        random.shuffle(out)
+        dump = lambda rows: "".join(json.dumps(r) + "\n" for r in rows).encode("utf-8")
+        batch["output_file_id"] = self.add_file(dump(out), "batch_output.jsonl", "batch_output")["id"] if out else None
+        batch["error_file_id"] = self.add_file(dump(err), "batch_errors.jsonl", "batch_output")["id"] if err else None
+        batch["request_counts"] = {"total": len(lines), "completed": len(out), "failed": len(err)}
+        batch.update(status="completed", completed_at=int(time.time()))
+
+def _format_refusal(req: dict, srv):
+    """Corps d’erreur 400 de l’API si le response_format demandé fait partie des refusés, sinon None."""
+    kind = (req.get("response_format") or {}).get("type")
+    if kind and kind in srv.reject_formats:
+        return {"error": {"message": f"Invalid parameter: 'response_format' of type '{kind}' is not supported "
+                                     "with this model.", "type": "invalid_request_error",
+                          "param": "response_format", "code": None}}
+    return None
+
+def _content_for(req: dict, content: str) -> str:
+    """Sortie structurée demandée (response_format JSON) → {"paragraphs": [...]}, sinon texte libre."""
+    if (req.get("response_format") or {}).get("type") in ("json_schema", "json_object"):
+        return json.dumps({"paragraphs": [p.strip() for p in content.split("\n\n") if p.strip()]},
+                          ensure_ascii=False)
+    return content
+
+def chat_completion(model: str, content: str, messages=None) -> dict:
+    """Réponse chat.completions au format OpenAI (usage estimé à ~4 caractères par token)."""
+    prompt_chars = sum(len(m.get("content") or "") for m in (messages or []))
+    prompt_tokens, completion_tokens = max(1, prompt_chars // 4), max(1, len(content) // 4)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens,
+                  "prompt_tokens_details": {"cached_tokens": 0}},
+    }
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Le client a fermé une connexion keep-alive de son pool : rien d’anormal, pas de trace
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+def make_server(port: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                content: str = STUB_LETTER, host: str = "127.0.0.1", handler=StubHandler,
+                batch_delay: float = 1.0, reject_formats=()) -> StubServer:
+    """Crée le serveur (port 0 = port libre choisi par l’OS) ; base_url = server.base_url."""
+    srv = StubServer((host, port), handler)
+    srv.latency, srv.jitter, srv.error_rate, srv.content = latency, jitter, error_rate, content
+    srv.reject_formats = tuple(reject_formats)
+    srv.batch_api = StubBatchAPI(batch_delay)
+    srv.base_url = f"http://{host}:{srv.server_address[1]}/v1"
+    return srv
+
+def start_in_thread(**kw) -> StubServer:
+    """Démarre un stub en tâche de fond (pratique dans un script de bench). Arrêt : srv.shutdown()."""
+    srv = make_server(**kw)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Faux serveur OpenAI (chat.completions) pour tests locaux.")
+    ap.add_argument("--port", type=int, default=8001)
+    ap.add_argument("--latency", type=float, default=0.0, help="latence de réponse en secondes")
+    ap.add_argument("--jitter", type=float, default=0.0, help="variation aléatoire ± en secondes")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="part des requêtes en erreur 500 (0–1)")
+    ap.add_argument("--batch-delay", type=float, default=1.0, help="durée de traitement simulée d’un lot (s)")
+    ap.add_argument("--reject-format", action="append", default=[], choices=("json_schema", "json_object"),
+                    help="response_format refusé en HTTP 400 (répétable)")
+    a = ap.parse_args()
+    srv = make_server(a.port, a.latency, a.jitter, a.error_rate, batch_delay=a.batch_delay,
+                      reject_formats=a.reject_format)
+    print(f"Stub OpenAI sur {srv.base_url} (latence {a.latency}s ± {a.jitter}s, erreurs {a.error_rate:.0%})")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,20 @@
+# Configuration commune des tests : modules à la racine du dépôt, aucune vraie clé ni base partagée.
+# Les variables sont posées avant le premier `import config` (lu une seule fois à l’import).
+import os, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp = tempfile.mkdtemp(prefix="clg-tests-")
+os.environ.update(
+    OPENAI_API_KEY="sk-test",
+    OPENAI_API_BASE="http://127.0.0.1:9/v1",   # jamais joignable : un test qui oublie le stub échoue vite
+    MODEL_FALLBACKS="",
+    LLM_RECORD="",
+    OUTPUT_DIR=os.path.join(_tmp, "letters"),
+    USAGE_DB=os.path.join(_tmp, "usage.sqlite3"),
+    LETTER_INDEX_DB=os.path.join(_tmp, "index.sqlite3"),
+    DEDUP_DB=os.path.join(_tmp, "dedup.sqlite3"),
+    PDF_CACHE_DIR=os.path.join(_tmp, "pdf_cache"),
+    PDF_BACKEND="native",
+)
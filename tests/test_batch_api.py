@@ -0,0 +1,120 @@
+# Mode lot testé de bout en bout contre la Batch API simulée de stub_openai.py
+import os
+import openai
+import pytest
+import batch_api
+import config
+import dedup
+import stub_openai
+import usage_ledger
+
+OFFERS = [
+    {"bank": "Optiver", "position": "Junior Trader", "lang": "EN", "source": "a.txt",
+     "offer": "Junior trader in Amsterdam: options market making, probability and fast mental arithmetic."},
+    {"bank": "BNP Paribas", "position": "Quant Analyst", "lang": "EN", "source": "b.txt",
+     "offer": "Quantitative analyst on the equity derivatives desk in Paris, Python and stochastic calculus."},
+    {"bank": "Natixis", "position": "Risk Analyst", "lang": "EN", "source": "c.txt",
+     "offer": "Market risk analyst in Paris: VaR, stress tests and daily reporting to the trading floor."},
+]
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    """Sorties, index dedup et journal d’usage isolés ; renvoie la liste des lignes du journal."""
+    monkeypatch.setattr(config, "OUT_DIR", str(tmp_path / "letters"), raising=False)
+    monkeypatch.setattr(dedup, "_default", dedup.NearDupIndex(":memory:"))
+    rows = []
+    monkeypatch.setattr(usage_ledger, "record", lambda **kw: rows.append(kw))
+    return rows
+
+@pytest.fixture
+def stub():
+    started = []
+
+    def start(**kw):
+        srv = stub_openai.start_in_thread(batch_delay=0.2, **kw)
+        started.append(srv)
+        return srv, openai.OpenAI(api_key="sk-test", base_url=srv.base_url, max_retries=0)
+    yield start
+    for srv in started:
+        srv.shutdown()
+
+def test_custom_ids_are_stable_content_hashes(env):
+    a, b = batch_api.new_state(OFFERS), batch_api.new_state(list(OFFERS))
+    assert list(a["jobs"]) == list(b["jobs"])
+    assert all(cid.startswith("letter-") for cid in a["jobs"])
+    # Même offre deux fois : identifiant suffixé, pas d’écrasement
+    dup = batch_api.new_state(OFFERS + OFFERS[:1])
+    first = next(iter(a["jobs"]))
+    assert list(dup["jobs"]) == list(a["jobs"]) + [f"{first}-2"]
+    changed = batch_api.new_state([{**OFFERS[0], "offer": OFFERS[0]["offer"] + " London."}])
+    assert first not in changed["jobs"]
+
+def test_submit_poll_collect_writes_letters_ledger_and_dedup(env, stub, tmp_path):
+    srv, client = stub()
+    path = str(tmp_path / "state.json")
+    state = batch_api.new_state(OFFERS)
+    state = batch_api.submit(state, path, client)
+    assert state["status"] and all(j["status"] == "submitted" for j in state["jobs"].values())
+    state = batch_api.poll(state, path, client, interval=0.05, progress=lambda *_: None)
+    assert state["status"] == "completed" and state["collected"]
+    for job in state["jobs"].values():
+        assert job["status"] == "done" and os.path.isfile(job["docx"])
+    assert batch_api.load_state(path) == state
+    assert sorted(r["letter_id"] for r in env) == sorted(state["jobs"])
+    assert {r["purpose"] for r in env} == {"batch"} and all(r["cost_factor"] == 0.5 for r in env)
+    assert len(dedup.default_index()) == len(OFFERS)
+    # Une offre rejouée est reprise depuis l’index, sans repartir dans un lot
+    again = batch_api.new_state(OFFERS[:1])
+    assert next(iter(again["jobs"].values()))["status"] == "reused"
+
+def test_resume_after_restart_neither_resubmits_nor_double_counts(env, stub, tmp_path, monkeypatch):
+    srv, client = stub()
+    path = str(tmp_path / "state.json")
+    batch_api.submit(batch_api.new_state(OFFERS), path, client)
+    # Redémarrage : l’état relu porte déjà fichier et lot, submit ne renvoie rien
+    state = batch_api.submit(batch_api.load_state(path), path, client)
+    assert len(srv.batch_api.batches) == 1 and len(srv.batch_api.files) == 1
+
+    # Coupure pendant la collecte, après la première sauvegarde intermédiaire
+    monkeypatch.setattr(batch_api, "CHECKPOINT_EVERY", 1)
+    real_save, written = batch_api.writer.save_letter, []
+
+    def save_letter(*a):
+        if len(written) == 1:
+            raise KeyboardInterrupt
+        written.append(a)
+        return real_save(*a)
+    monkeypatch.setattr(batch_api.writer, "save_letter", save_letter)
+    with pytest.raises(KeyboardInterrupt):
+        batch_api.poll(state, path, client, interval=0.05, progress=lambda *_: None)
+    saved = batch_api.load_state(path)
+    assert sorted(j["status"] for j in saved["jobs"].values()) == ["done", "submitted", "submitted"]
+    assert len(env) == 1 and len(dedup.default_index()) == 1
+
+    monkeypatch.setattr(batch_api.writer, "save_letter", real_save)
+    state = batch_api.poll(saved, path, client, interval=0.05, progress=lambda *_: None)
+    assert all(j["status"] == "done" for j in state["jobs"].values())
+    assert sorted(r["letter_id"] for r in env) == sorted(state["jobs"])
+    assert len(dedup.default_index()) == len(OFFERS)
+    # Collecte déjà faite : relancer ne réécrit ni ne recompte rien
+    batch_api.collect(state, path, client)
+    assert len(env) == len(OFFERS)
+
+def test_unparsable_reply_fails_then_retry_resubmits(env, stub, tmp_path):
+    srv, client = stub(content="")
+    path = str(tmp_path / "state.json")
+    state = batch_api.submit(batch_api.new_state(OFFERS[:2]), path, client)
+    first_batch = state["batch_id"]
+    state = batch_api.poll(state, path, client, interval=0.05, progress=lambda *_: None)
+    assert [j["status"] for j in state["jobs"].values()] == ["failed", "failed"]
+    assert all("aucun paragraphe" in j["error"] for j in state["jobs"].values())
+    assert len(dedup.default_index()) == 0
+
+    srv.content = stub_openai.STUB_LETTER
+    state = batch_api.retry(state, path)
+    assert state["history"][0]["batch_id"] == first_batch and "batch_id" not in state
+    assert all(j["status"] == "pending" and "error" not in j for j in state["jobs"].values())
+    state = batch_api.submit(state, path, client)
+    assert state["batch_id"] != first_batch
+    state = batch_api.poll(state, path, client, interval=0.05, progress=lambda *_: None)
+    assert [j["status"] for j in state["jobs"].values()] == ["done", "done"]
@@ -0,0 +1,136 @@
+# Enregistrement / rejeu (cassette.py) testés contre le stub local
+import http.client, json, os, time
+import openai
+import pytest
+import cassette
+import config
+import llm_router
+import stub_openai
+
+MSGS = [{"role": "user", "content": "offre 1"}]
+
+def entry(key, path="/chat/completions", stream=False, chunks=None, headers_ms=0.0, **kw):
+    body = json.dumps({"choices": [], "tag": key})
+    return {"at": 0, "method": "POST", "path": path, "key": key, "model": "m", "stream": stream,
+            "status": 200, "ctype": "application/json", "headers_ms": headers_ms,
+            "ttft_ms": headers_ms, "total_ms": headers_ms, "usage": None,
+            "chunks": chunks if chunks is not None else [[headers_ms, body]], **kw}
+
+def tag(e):
+    return json.loads(e["chunks"][0][1])["tag"]
+
+def test_match_exact_in_order_then_loose_by_endpoint():
+    c = cassette.Cassette([entry("poll", n=1), entry("poll", n=2), entry("poll", n=3), entry("other"),
+                           entry("s", stream=True)])
+    # Même requête répétée (sondage d’un lot) : réponses dans l’ordre, la dernière se répète
+    assert [c.match("POST", "/chat/completions", "poll")["n"] for _ in range(4)] == [1, 2, 3, 3]
+    # Empreinte inconnue : entrées du même endpoint (et même mode flux) dans l’ordre enregistré
+    loose = [tag(c.match("POST", "/chat/completions", "new")) for _ in range(5)]
+    assert loose == ["poll", "poll", "poll", "other", "poll"]
+    assert tag(c.match("POST", "/chat/completions", "new", stream=True)) == "s"
+    assert c.match("POST", "/files", "new") is None
+    assert c.stats == {"exact": 4, "loose": 6, "missing": 1}
+    strict = cassette.Cassette([entry("a")], strict=True)
+    assert strict.match("POST", "/chat/completions", "b") is None
+    assert tag(strict.match("POST", "/chat/completions", "a")) == "a"
+
+def test_load_ignores_truncated_last_member(tmp_path):
+    path = str(tmp_path / "t.cassette.gz")
+    w = cassette.CassetteWriter(path)
+    for k in ("a", "b", "c"):
+        w.write(entry(k))
+    assert [e["key"] for e in cassette.load(path)] == ["a", "b", "c"]
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 10)   # processus tué pendant l’écriture du dernier membre
+    assert [e["key"] for e in cassette.load(path)] == ["a", "b"]
+
+def timed_request(srv):
+    """(délai jusqu’aux en-têtes, délai jusqu’au 1er octet du corps, durée totale) en ms."""
+    conn = http.client.HTTPConnection(srv.server_address[0], srv.server_address[1], timeout=10)
+    t0 = time.perf_counter()
+    conn.request("POST", "/v1/chat/completions", body=b"{}", headers={"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    headers = time.perf_counter() - t0
+    first = resp.read1(1)
+    ttft = time.perf_counter() - t0
+    rest = first + resp.read()
+    total = time.perf_counter() - t0
+    conn.close()
+    assert rest == b"ab"
+    return headers * 1000, ttft * 1000, total * 1000
+
+@pytest.mark.parametrize("speed, scale", [(1.0, 1.0), (4.0, 0.25)])
+def test_replay_speed_scales_headers_ttft_and_chunks(tmp_path, speed, scale):
+    path = str(tmp_path / "t.cassette.gz")
+    cassette.CassetteWriter(path).write(entry("x", headers_ms=200, chunks=[[400, "a"], [600, "b"]]))
+    srv = cassette.start_replay(path, speed=speed)
+    try:
+        headers, ttft, total = timed_request(srv)
+    finally:
+        srv.shutdown()
+    assert 200 * scale <= headers < 200 * scale + 150
+    assert 400 * scale <= ttft < 400 * scale + 150
+    assert 600 * scale <= total < 600 * scale + 150
+
+def test_replay_speed_zero_never_waits(tmp_path):
+    path = str(tmp_path / "t.cassette.gz")
+    cassette.CassetteWriter(path).write(entry("x", headers_ms=2000, chunks=[[3000, "a"], [4000, "b"]]))
+    srv = cassette.start_replay(path, speed=0)
+    try:
+        assert timed_request(srv)[2] < 500
+    finally:
+        srv.shutdown()
+
+@pytest.fixture
+def recording(monkeypatch, tmp_path):
+    path = str(tmp_path / "rec.cassette.gz")
+    monkeypatch.setattr(config, "LLM_RECORD", path)
+    monkeypatch.setattr(cassette, "_recorders", {})
+    monkeypatch.setattr(cassette, "_writer", None)
+    stub = stub_openai.start_in_thread(latency=0.05)
+    yield stub, path
+    for srv in cassette._recorders.values():
+        srv.shutdown()
+    stub.shutdown()
+
+def wait_entries(path, n):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        entries = cassette.load(path) if os.path.exists(path) else []
+        if len(entries) >= n:
+            return entries
+        time.sleep(0.02)
+    pytest.fail(f"{n} échanges attendus dans la cassette")
+
+def test_record_then_replay_round_trip(recording):
+    stub, path = recording
+    route = llm_router.Route("stub", stub.base_url, api_key="sk-test", timeout=10, max_retries=0)
+    assert route.client.base_url != stub.base_url   # LLM_RECORD : le client passe par le proxy
+    assert cassette.recording_base_url(stub.base_url) == cassette.recording_base_url(stub.base_url)
+    plain = route.client.chat.completions.create(model="stub", messages=MSGS)
+    streamed = "".join(c.choices[0].delta.content or ""
+                       for c in route.client.chat.completions.create(
+                           model="stub", messages=MSGS, stream=True, stream_options={"include_usage": True})
+                       if c.choices)
+
+    entries = wait_entries(path, 2)
+    assert [e["stream"] for e in entries] == [False, True]
+    assert all(e["path"] == "/chat/completions" and e["status"] == 200 for e in entries)
+    assert all(e["usage"]["total_tokens"] > 0 for e in entries)
+    assert all(0 < e["headers_ms"] <= e["ttft_ms"] <= e["total_ms"] for e in entries)
+    assert "offre 1" not in json.dumps(entries)   # seule l’empreinte de la requête est stockée
+
+    srv = cassette.start_replay(path, speed=0, strict=True)
+    try:
+        client = openai.OpenAI(api_key="sk-test", base_url=srv.base_url, max_retries=0)
+        again = client.chat.completions.create(model="stub", messages=MSGS)
+        assert again.choices[0].message.content == plain.choices[0].message.content
+        assert again.usage.total_tokens == plain.usage.total_tokens
+        replayed = "".join(c.choices[0].delta.content or "" for c in client.chat.completions.create(
+            model="stub", messages=MSGS, stream=True, stream_options={"include_usage": True}) if c.choices)
+        assert replayed == streamed
+        with pytest.raises(openai.NotFoundError):
+            client.chat.completions.create(model="stub", messages=[{"role": "user", "content": "autre"}])
+        assert srv.cassette.stats == {"exact": 2, "loose": 0, "missing": 1}
+    finally:
+        srv.shutdown()
@@ -0,0 +1,62 @@
+import pytest
+import config
+import dedup
+import pipeline
+
+OFFER = ("We are looking for a trader to join our market making desk. You will quote options on European "
+         "indices, manage risk in real time and work closely with developers and quantitative researchers. "
+         "Strong mental arithmetic, a degree in a numerate field and a passion for markets are required.")
+REPOST = OFFER.replace("European", "Asian") + " Apply before the end of the month."
+
+@pytest.mark.parametrize("a, b", [
+    ("Analyst – Paris", "Analyst London"),
+    ("Junior Trader (H/F)", "Junior Trader - New York"),
+    ("Quant Analyst", "quant  analyst, remote"),
+])
+def test_same_role(a, b):
+    assert dedup._role_key(a) == dedup._role_key(b)
+
+@pytest.mark.parametrize("a, b", [
+    ("Junior Trader", "Senior Trader"),
+    ("Trader 1", "Trader 2"),
+    ("Quant Analyst", "Credit Analyst"),
+    ("Trader", "Trader Intern"),
+])
+def test_different_role(a, b):
+    assert dedup._role_key(a) != dedup._role_key(b)
+
+def test_find_repost_same_bank_and_role():
+    idx = dedup.NearDupIndex(":memory:", threshold=0.6)
+    idx.add("Optiver", "Junior Trader - Amsterdam", OFFER, "a.docx", body=["Para 1", "Para 2"])
+    (m,) = idx.find("optiver", "Junior Trader London", REPOST)
+    assert m.position == "Junior Trader - Amsterdam" and m.similarity >= 0.6
+    assert idx.body(m.oid) == ["Para 1", "Para 2"]
+    assert idx.find("Optiver", "Senior Trader", REPOST) == []
+    assert idx.find("IMC", "Junior Trader", REPOST) == []
+    assert idx.find("Optiver", "Junior Trader", "An unrelated offer about retail banking in Lyon.") == []
+
+def test_index_persists_across_reopen(tmp_path):
+    p = str(tmp_path / "offers.sqlite3")
+    dedup.NearDupIndex(p, threshold=0.6).add("Optiver", "Junior Trader", OFFER, "a.docx", body=["x"])
+    idx = dedup.NearDupIndex(p, threshold=0.6)
+    assert len(idx) == 1
+    (m,) = idx.find("Optiver", "Junior Trader", REPOST)
+    assert m.letter_path == "a.docx" and idx.body(m.oid) == ["x"]
+
+def test_reused_letter_rendered_for_new_position(monkeypatch, tmp_path):
+    idx = dedup.NearDupIndex(":memory:", threshold=0.6)
+    monkeypatch.setattr(dedup, "_default", idx)
+    monkeypatch.setattr(config, "OUT_DIR", str(tmp_path), raising=False)
+    old = tmp_path / "old.docx"
+    old.write_bytes(b"")
+    idx.add("Optiver", "Junior Trader - Amsterdam", OFFER, str(old),
+            body=["I want to make markets at Optiver.", "I have built an options pricer."])
+    monkeypatch.setattr(pipeline.llm_body, "generate_body_paragraphs",
+                        lambda *a, **k: pytest.fail("aucun appel LLM attendu"))
+    stages = []
+    res = pipeline.run_letter("Optiver", "Junior Trader London", REPOST, do_pdf=False, extra_formats=("txt",),
+                              progress=lambda stage, _msg: stages.append(stage), on_duplicate="reuse")
+    assert res["duplicate_of"]["position"] == "Junior Trader - Amsterdam"
+    assert res["docx"] != str(old) and "dedup" in stages
+    txt = open(res["txt"], encoding="utf-8").read()
+    assert "Junior Trader London" in txt and "I have built an options pricer." in txt
@@ -0,0 +1,24 @@
+import zipfile
+import export_pdf
+
+def make_docx(path, body: str):
+    xml = ('<?xml version="1.0"?><w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+           f"<w:body>{body}</w:body></w:document>")
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("word/document.xml", xml)
+        z.writestr("docProps/core.xml", f"<created>{path}</created>")   # ignoré par l’empreinte
+    return str(path)
+
+RUN = '<w:p w:rsidR="{}"><w:r><w:t>Market</w:t></w:r><w:r><w:t xml:space="preserve">{}</w:t></w:r><w:r><w:t>making</w:t></w:r></w:p>'
+
+def test_rsid_and_docprops_ignored(tmp_path):
+    a = make_docx(tmp_path / "a.docx", RUN.format("00A1", " "))
+    b = make_docx(tmp_path / "b.docx", RUN.format("00FF", " "))
+    assert export_pdf.docx_fingerprint(a) == export_pdf.docx_fingerprint(b)
+
+def test_whitespace_runs_change_fingerprint(tmp_path):
+    # Un run qui ne contient qu’une espace est du texte : “Market making” ≠ “Marketmaking”
+    a = make_docx(tmp_path / "a.docx", RUN.format("00A1", " "))
+    b = make_docx(tmp_path / "b.docx", RUN.format("00A1", ""))
+    c = make_docx(tmp_path / "c.docx", RUN.format("00A1", "  "))
+    assert len({export_pdf.docx_fingerprint(p) for p in (a, b, c)}) == 3
@@ -0,0 +1,71 @@
+import os, zipfile
+import pytest
+import letter_index
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+def write_docx(path, paragraphs, mtime=None):
+    """DOCX minimal (seul word/document.xml est lu par l’index)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    body = "".join(f"<w:p><w:r><w:t>{p}</w:t></w:r></w:p>" for p in paragraphs)
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("word/document.xml", f"<w:document {W}><w:body>{body}</w:body></w:document>")
+    if mtime:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+@pytest.fixture
+def idx():
+    return letter_index.LetterIndex(":memory:")
+
+def test_match_query_quotes_operators_and_prefixes():
+    q = letter_index._match_query('"market making" AND opt* NEAR(x)', position="Junior-Trader")
+    assert q == ('"market making" AND "AND"* AND "opt"* AND "NEAR"* AND "x"*'
+                 ' AND position : "Junior"* AND position : "Trader"*')
+    assert letter_index._match_query('"unbalanced') == '"unbalanced"*'
+    assert letter_index._match_query('* - "" ()') == ""
+
+@pytest.mark.parametrize("text", ['"market', 'AND', 'NEAR(a b)', 'x OR', "O'Neil", '*', 'col:umn', '^start'])
+def test_search_never_raises_on_free_input(idx, text):
+    idx.add("/tmp/a.docx", "Optiver", "Trader", ["I love market making and O'Neil books."])
+    assert isinstance(idx.search(text), list)
+
+def test_search_ranks_and_filters_by_bank_and_date(idx):
+    day = 86400
+    idx.add("/l/a.docx", "Optiver", "Junior Trader", ["Options market making in Amsterdam."], created=10 * day)
+    idx.add("/l/b.docx", "IMC", "Quant Trader", ["Market making and Python tooling."], created=20 * day)
+    idx.add("/l/c.docx", "BNP Paribas", "Risk Analyst", ["Stress tests and VaR."], created=30 * day)
+    assert {h.bank for h in idx.search("market making")} == {"Optiver", "IMC"}
+    assert [h.bank for h in idx.search("market", bank="optiver")] == ["Optiver"]
+    assert [h.bank for h in idx.search("market", since=15 * day)] == ["IMC"]
+    assert [h.bank for h in idx.search(until=25 * day)] == ["IMC", "Optiver"]
+    assert [h.bank for h in idx.search(position="trader", bank="IMC")] == ["IMC"]
+    (hit,) = idx.search('"options market"')
+    assert "[" in hit.snippet and hit.path == "/l/a.docx"
+
+def test_backfill_skips_unchanged_reindexes_changed_prunes_deleted(idx, tmp_path):
+    root = tmp_path / "letters"
+    a = write_docx(root / "Optiver" / "Cover Letter Jean - Optiver - Junior Trader.docx",
+                   ["Dear Hiring Team,", "Market making is what I want.", "Kind regards"], mtime=1_000_000)
+    b = write_docx(root / "IMC" / "Cover Letter Jean - IMC - Quant.docx", ["Python and statistics."])
+    idx.add(str(tmp_path / "elsewhere.docx"), "X", "Y", ["outside root"])
+    assert idx.backfill(str(root)) == 2
+    (hit,) = idx.search("market", bank="Optiver")
+    assert hit.position == "Junior Trader" and "Dear" not in hit.snippet and "regards" not in hit.snippet
+    assert idx.backfill(str(root)) == 0
+
+    write_docx(a, ["Volatility surfaces now."], mtime=2_000_000)
+    os.remove(b)
+    assert idx.backfill(str(root)) == 1
+    assert idx.search("market") == [] and [h.path for h in idx.search("volatility")] == [a]
+    assert idx.search(bank="IMC") == []
+    assert len(idx) == 2   # la lettre hors du dossier rattrapé reste indexée
+
+def test_index_letter_reports_failure_without_raising(monkeypatch, capsys):
+    def broken():
+        raise OSError("disk full")
+    monkeypatch.setattr(letter_index, "default_index", broken)
+    letter = type("L", (), {"bank": "Optiver", "position": "Trader", "body": ["x"]})()
+    letter_index.index_letter(letter, "/out/a.docx")
+    err = capsys.readouterr().err
+    assert "/out/a.docx" in err and "disk full" in err
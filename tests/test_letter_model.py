@@ -0,0 +1,56 @@
+import os
+import pytest
+import letter_model
+
+def test_build_letter_sanitizes_body():
+    letter = letter_model.build_letter("Optiver", "Trader", [
+        "Dear Hiring Team, I am **excited** to apply.",
+        "•  Second​paragraph  with   `code` and _emphasis_.",
+        "   ",
+        "Kind regards, Jane",
+        "Third.", "Fourth.", "Fifth, dropped.",
+    ])
+    assert letter.body == ("I am excited to apply.", "Second paragraph with code and emphasis.",
+                           "Third.", "Fourth.")
+    assert letter.subject == "Subject: Application – Trader"
+    assert letter.salutation == "Dear Hiring Team," and letter.closing == "Yours sincerely,"
+
+@pytest.fixture
+def letter():
+    return letter_model.build_letter("Optiver", "Trader <Quant & Co>", ["Para one.", "Para two."])
+
+def test_render_text(letter):
+    text = letter_model.render_text(letter).decode("utf-8")
+    lines = text.split("\n")
+    assert lines[:len(letter.header)] == list(letter.header)
+    assert "Subject: Application – Trader <Quant & Co>\n\nDear Hiring Team,\n\nPara one.\n\nPara two.\n\n" in text
+    assert text.endswith(f"Yours sincerely,\n{letter.signature}\n")
+
+def test_render_html_escapes(letter):
+    doc = letter_model.render_html(letter).decode("utf-8")
+    assert doc.startswith("<!DOCTYPE html>") and '<meta charset="utf-8">' in doc
+    assert "Trader &lt;Quant &amp; Co&gt;" in doc and "<Quant" not in doc
+    assert f'href="mailto:{letter.email}"' in doc
+    assert doc.index("Para one.") < doc.index("Para two.") < doc.index("Yours sincerely,")
+
+def test_write_all_writes_set(tmp_path):
+    base = str(tmp_path / "sub" / "Letter")
+    paths = letter_model.write_all({"txt": b"t", "html": b"h"}, base)
+    assert paths == {"txt": base + ".txt", "html": base + ".html"}
+    assert open(paths["html"], "rb").read() == b"h"
+    assert sorted(os.listdir(tmp_path / "sub")) == ["Letter.html", "Letter.txt"]
+
+def test_write_all_suffixes_whole_set_when_locked(tmp_path, monkeypatch):
+    base = str(tmp_path / "Letter")
+    real = os.replace
+    locked = {base + ".html", base + " (1).html"}
+
+    def replace(src, dst):
+        if dst in locked:
+            raise PermissionError(dst)
+        real(src, dst)
+    monkeypatch.setattr(letter_model.os, "replace", replace)
+    paths = letter_model.write_all({"txt": b"t", "html": b"h"}, base)
+    assert paths == {"txt": base + " (2).txt", "html": base + " (2).html"}
+    # Aucun demi-jeu sous les noms verrouillés, aucun fichier temporaire
+    assert sorted(os.listdir(tmp_path)) == ["Letter (2).html", "Letter (2).txt"]
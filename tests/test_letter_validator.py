@@ -0,0 +1,44 @@
+import config
+import letter_validator
+import llm_body
+
+def para(n, word="growth"):
+    return " ".join(f"{word}{i}" for i in range(n)) + "."
+
+GOOD = [para(60, "alpha"), para(60, "beta"), para(60, "gamma")]
+
+def test_valid_letter_ok():
+    assert letter_validator.validate(GOOD).ok
+
+def test_count_and_length_issues():
+    r = letter_validator.validate([para(10)])
+    assert r.count_issue and r.paragraph_issues[0][0].startswith("trop court")
+    r = letter_validator.validate(GOOD + [para(60, "d"), para(60, "e")])
+    assert "maximum" in r.count_issue
+
+def test_copied_offer_detected():
+    offer = "We are looking for a motivated analyst to join our global markets team in Paris this year"
+    copied = "Overall " + offer + " " + para(40, "x")
+    r = letter_validator.validate([copied, GOOD[1], GOOD[2]], offer=offer)
+    assert "recopie" in r.paragraph_issues[0][0]
+
+def test_fix_count_merges_and_splits():
+    merged = letter_validator.fix_count([para(40, c) for c in "abcdef"])
+    assert len(merged) == config.LETTER_MAX_PARAS
+    long_par = " ".join(f"Sentence number {i} talks about markets and risk management." for i in range(30))
+    assert len(letter_validator.fix_count([long_par])) >= config.LETTER_MIN_PARAS
+
+def test_rewrite_kept_only_if_it_fixes_something(monkeypatch):
+    short = para(10, "short")
+    answers = iter([para(12, "stillshort")])
+    monkeypatch.setattr(llm_body, "_complete", lambda *a, **k: next(answers))
+    monkeypatch.setattr(config, "LETTER_MAX_REPAIRS", 2, raising=False)
+    out = llm_body._validated([short, GOOD[1], GOOD[2]], [], "", "EN", {})
+    # Même nombre de problèmes → l’original est conservé, et on n’insiste pas
+    assert out[0] == short
+
+def test_rewrite_accepted_when_it_fixes(monkeypatch):
+    short = para(10, "short")
+    monkeypatch.setattr(llm_body, "_complete", lambda *a, **k: para(60, "fixed"))
+    out = llm_body._validated([short, GOOD[1], GOOD[2]], [], "", "EN", {})
+    assert out[0].startswith("fixed0")
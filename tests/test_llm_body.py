@@ -0,0 +1,64 @@
+import json
+import pytest
+import config
+import llm_body
+import llm_router
+import stub_openai
+import usage_ledger
+
+PARAS = ["First paragraph about markets.", 'Second one with "quotes" and \\ backslash.', "Third, é accentué."]
+RAW = json.dumps({"paragraphs": PARAS}, ensure_ascii=False)
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(RAW)])
+def test_paragraph_stream_chunks(size):
+    reader, seen = llm_body.ParagraphStream(), []
+    for i in range(0, len(RAW), size):
+        seen += reader.feed(RAW[i:i + size])
+    assert seen == PARAS and reader.paragraphs == PARAS and reader.closed
+    assert reader.text == RAW
+
+def test_parse_paragraphs_json_and_fenced():
+    assert llm_body.parse_paragraphs(RAW) == PARAS
+    assert llm_body.parse_paragraphs(f"```json\n{RAW}\n```") == PARAS
+
+@pytest.mark.parametrize("cut, kept", [(-2, 3), (-10, 2), (-40, 1)])
+def test_truncated_json_keeps_completed_strings(cut, kept):
+    out = llm_body.parse_paragraphs(RAW[:cut])
+    assert out == PARAS[:kept]
+
+def test_truncated_json_without_paragraph_is_empty():
+    assert llm_body.parse_paragraphs('{"paragraphs": ["Dear team, I am wri') == []
+    assert llm_body.parse_paragraphs('{"paragr') == []
+
+def test_plain_text_split():
+    assert llm_body.parse_paragraphs("One para here.\n\nAnother para there.") == ["One para here.", "Another para there."]
+
+@pytest.mark.parametrize("model, mode", [("gpt-3.5-turbo", "json_object"), ("gpt-4o-mini", "json_schema"),
+                                         ("gpt-4.1", "json_schema"), ("llama3", "json_object")])
+def test_auto_mode_per_model(monkeypatch, model, mode):
+    monkeypatch.setattr(config, "LETTER_OUTPUT", "auto")
+    monkeypatch.setattr(config, "MODEL", model)
+    assert llm_body.output_mode() == mode
+    # Même décision pour une route de repli servant ce modèle
+    monkeypatch.setattr(config, "MODEL", "other")
+    assert llm_body.output_mode(llm_router.Route(model, "http://127.0.0.1:9/v1")) == mode
+
+def test_forced_mode_ignores_model(monkeypatch):
+    monkeypatch.setattr(config, "LETTER_OUTPUT", "text")
+    assert llm_body.response_format(llm_router.Route("gpt-4o")) is None
+    monkeypatch.setattr(config, "LETTER_OUTPUT", "json_object")
+    assert llm_body.response_format(llm_router.Route("gpt-4o")) == {"type": "json_object"}
+
+def test_fallback_route_downgraded_on_its_own(monkeypatch):
+    monkeypatch.setattr(config, "LETTER_OUTPUT", "auto")
+    monkeypatch.setattr(usage_ledger, "record", lambda *a, **k: None)
+    down, picky = stub_openai.start_in_thread(error_rate=1.0), stub_openai.start_in_thread(reject_formats=("json_schema",))
+    try:
+        routes = [llm_router.Route(m, s.base_url, api_key="sk-test", timeout=10, max_retries=0)
+                  for m, s in (("gpt-3.5-turbo", down), ("gpt-4o", picky))]
+        monkeypatch.setattr(llm_body, "_router", llm_router.Router(routes))
+        raw = llm_body._complete([{"role": "user", "content": "x"}], 0.6, {})
+        assert llm_body.parse_paragraphs(raw)
+        assert [r.format_mode for r in routes] == [None, "json_object"]
+    finally:
+        down.shutdown(); picky.shutdown()
@@ -0,0 +1,151 @@
+# Routage testé contre deux stubs locaux (stub_openai.py) de latences différentes
+import threading, time
+import pytest
+import llm_router
+import stub_openai
+import usage_ledger
+
+MSGS = [{"role": "user", "content": "Write a short letter."}]
+
+@pytest.fixture
+def stubs():
+    started = []
+
+    def start(**kw):
+        srv = stub_openai.start_in_thread(**kw)
+        started.append(srv)
+        return srv
+    yield start
+    for srv in started:
+        srv.shutdown()
+
+def route(srv, model):
+    return llm_router.Route(model, srv.base_url, api_key="sk-test", timeout=10, max_retries=0)
+
+@pytest.fixture
+def calls(monkeypatch):
+    rows, lock = [], threading.Lock()
+
+    def record(model, latency_s, prompt_tokens=0, completion_tokens=0, cached_tokens=0, ok=True, **kw):
+        with lock:
+            rows.append({"model": model, "prompt_tokens": prompt_tokens,
+                         "completion_tokens": completion_tokens, "ok": ok, **kw})
+    monkeypatch.setattr(usage_ledger, "record", record)
+    return rows
+
+def test_failover_to_fallback_on_errors(stubs, calls):
+    bad, good = stubs(error_rate=1.0), stubs(latency=0.01)
+    router = llm_router.Router([route(bad, "primary"), route(good, "fallback")])
+    resp, r, _ = router.complete(messages=MSGS)
+    assert r.model == "fallback"
+    assert resp.choices[0].message.content
+    assert [c["ok"] for c in calls if c["model"] == "primary"] == [False]
+
+def test_circuit_breaker_moves_failing_route_last(stubs, calls):
+    bad, good = stubs(error_rate=1.0), stubs()
+    router = llm_router.Router([route(bad, "primary"), route(good, "fallback")], cooldown_s=60)
+    for _ in range(3):
+        router.complete(messages=MSGS)
+    assert router.snapshot()[router.routes[0].name]["health"] == 2
+    assert [r.model for r in router.ordered()] == ["fallback", "primary"]
+    # Coupe-circuit ouvert : la route en panne n’est plus essayée en premier
+    n_bad = sum(1 for c in calls if c["model"] == "primary")
+    router.complete(messages=MSGS)
+    assert sum(1 for c in calls if c["model"] == "primary") == n_bad
+
+def test_slow_route_demoted_by_p95(stubs, calls):
+    slow, fast = stubs(latency=0.3), stubs(latency=0.01)
+    router = llm_router.Router([route(slow, "slow"), route(fast, "fast")], p95_max_s=0.1, min_samples=2)
+    for _ in range(2):
+        router.complete(messages=MSGS)
+    assert [r.model for r in router.ordered()] == ["fast", "slow"]
+    _, r, _ = router.complete(messages=MSGS)
+    assert r.model == "fast"
+
+def test_hedged_request_returns_fastest(stubs, calls):
+    slow, fast = stubs(latency=1.5), stubs(latency=0.01)
+    router = llm_router.Router([route(slow, "slow"), route(fast, "fast")], hedge_after_s=0.1)
+    t0 = time.perf_counter()
+    _, r, _ = router.complete(messages=MSGS)
+    assert r.model == "fast"
+    assert time.perf_counter() - t0 < 1.0
+
+def test_all_routes_failed(stubs, calls):
+    a, b = stubs(error_rate=1.0), stubs(error_rate=1.0)
+    router = llm_router.Router([route(a, "a"), route(b, "b")])
+    with pytest.raises(llm_router.AllRoutesFailed):
+        router.complete(messages=MSGS)
+
+def test_streaming_usage_recorded(stubs, calls):
+    srv = stubs()
+    router = llm_router.Router([route(srv, "m")])
+    stream, _, _ = router.complete(messages=MSGS, stream=True, stream_options={"include_usage": True})
+    text = "".join(c.choices[0].delta.content or "" for c in stream if c.choices)
+    assert text
+    assert len(calls) == 1 and calls[0]["completion_tokens"] > 0
+
+def test_hedge_loser_stream_closed_and_recorded(stubs, calls, monkeypatch):
+    closed = []
+    real_close = llm_router.RecordedStream.close
+
+    def close(self):
+        closed.append(self.model)
+        real_close(self)
+    monkeypatch.setattr(llm_router.RecordedStream, "close", close)
+    slow, fast = stubs(latency=0.5), stubs(latency=0.01)
+    router = llm_router.Router([route(slow, "slow"), route(fast, "fast")], hedge_after_s=0.05)
+    stream, r, _ = router.complete(messages=MSGS, stream=True, stream_options={"include_usage": True})
+    assert r.model == "fast"
+    list(stream)
+    deadline = time.time() + 5
+    while "slow" not in closed and time.time() < deadline:
+        time.sleep(0.05)
+    assert closed == ["slow"]
+    assert {c["model"] for c in calls} == {"slow", "fast"}
+
+SCHEMA = {"type": "json_schema", "json_schema": {"name": "letter_body", "schema": {"type": "object"}}}
+
+def test_fallback_rejecting_json_schema_downgrades_only_that_route(stubs, calls):
+    bad, picky = stubs(error_rate=1.0), stubs(reject_formats=("json_schema",))
+    router = llm_router.Router([route(bad, "primary"), route(picky, "fallback")], cooldown_s=60)
+    resp, r, _ = router.complete(messages=MSGS, response_format=SCHEMA)
+    assert r.model == "fallback" and resp.choices[0].message.content.startswith('{"paragraphs"')
+    assert r.format_mode == "json_object" and router.routes[0].format_mode is None
+    # Le 400 est consigné (appel facturé) mais ne compte pas dans la santé de la route
+    assert [c["ok"] for c in calls if c["model"] == "fallback"] == [False, True]
+    assert router.snapshot()[r.name]["error_rate"] == 0.0
+    calls.clear()
+    router.complete(messages=MSGS, response_format=SCHEMA)
+    assert [c["ok"] for c in calls if c["model"] == "fallback"] == [True]
+
+def test_format_refusals_never_open_the_circuit(stubs, calls):
+    srv = stubs(reject_formats=("json_schema", "json_object"))
+    router = llm_router.Router([route(srv, "m")], cooldown_s=60)
+    for _ in range(4):
+        resp, r, _ = router.complete(messages=MSGS, response_format=SCHEMA)
+    assert r.format_mode == "text" and not resp.choices[0].message.content.startswith("{")
+    assert router.snapshot()[r.name]["health"] == 0
+    assert [c["ok"] for c in calls] == [False, False] + [True] * 4
+
+def test_response_format_callable_evaluated_per_route(stubs, calls):
+    a, b = stubs(error_rate=1.0), stubs()
+    seen = []
+
+    def fmt(r):
+        seen.append(r.model)
+        return {"type": "json_object"}
+    router = llm_router.Router([route(a, "primary"), route(b, "fallback")])
+    router.complete(messages=MSGS, response_format=fmt)
+    assert seen == ["primary", "fallback"]
+
+def test_other_400_is_not_a_format_refusal():
+    class Rejected(Exception):
+        status_code = 400
+    assert not llm_router.format_rejected(Rejected("maximum context length exceeded"))
+    try:
+        try:
+            raise Rejected("Invalid parameter: 'response_format' of type 'json_schema' is not supported")
+        except Rejected as e:
+            raise llm_router.AllRoutesFailed("x") from e
+    except llm_router.AllRoutesFailed as e:
+        assert llm_router.format_rejected(e)
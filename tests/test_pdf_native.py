@@ -0,0 +1,88 @@
+import re, zlib
+import pytest
+import letter_model
+import pdf_native
+
+LONG_WORD = "Supercalifragilisticexpialidocious" * 4
+BODY = ["I would like to join your desk. " * 12 + LONG_WORD,
+        "My experience in market making and risk management fits the role. " * 6]
+
+@pytest.fixture
+def helvetica(monkeypatch):
+    monkeypatch.setattr(pdf_native, "_find_font_files", lambda: (None, None))
+    monkeypatch.setattr(pdf_native, "_font_cache", {})
+
+def objects(pdf: bytes) -> dict:
+    return {int(n): body for n, body in re.findall(rb"(\d+) 0 obj\n(.*?)\nendobj\n", pdf, re.S)}
+
+def stream(body: bytes) -> bytes:
+    raw = body.split(b"stream\n", 1)[1].rsplit(b"\nendstream", 1)[0]
+    return zlib.decompress(raw) if b"/FlateDecode" in body else raw
+
+def test_xref_offsets_valid(helvetica):
+    pdf = pdf_native.render_letter("Optiver", "Trader", BODY)
+    assert pdf.startswith(b"%PDF-1.4") and pdf.rstrip().endswith(b"%%EOF")
+    xref = int(re.search(rb"startxref\n(\d+)\n", pdf).group(1))
+    assert pdf[xref:xref + 4] == b"xref"
+    count = int(re.match(rb"xref\n0 (\d+)\n", pdf[xref:]).group(1))
+    entries = re.findall(rb"(\d{10}) 00000 n \n", pdf[xref:])
+    assert len(entries) == count - 1 == len(objects(pdf))
+    for i, off in enumerate(entries, 1):
+        assert pdf[int(off):].startswith(b"%d 0 obj\n" % i)
+
+def test_mailto_link_annotation(helvetica):
+    letter = letter_model.build_letter("Optiver", "Trader", BODY)
+    pdf = pdf_native.render_pdf(letter)
+    links = [b for b in objects(pdf).values() if b"/Subtype /Link" in b]
+    assert len(links) == 1 and b"(mailto:%s)" % letter.email.encode() in links[0]
+    assert re.search(rb"/Annots \[\d+ 0 R\]", pdf)
+
+def test_lines_wrapped_within_margin(helvetica):
+    letter = letter_model.build_letter("Optiver", "Trader", BODY)
+    pdf = pdf_native.render_pdf(letter)
+    reg, bold = pdf_native._fonts()
+    _top, _bottom, left, right = letter.style.margins_inch
+    limit = pdf_native.PAGE_W - right * 72 + 0.01
+    texts = []
+    for body in objects(pdf).values():
+        if b"stream" in body and b"/Length1" not in body:
+            for font, size, x, s in re.findall(rb"BT /(F\d) ([\d.]+) Tf ([\d.]+) [\d.]+ Td \((.*?)\) Tj ET",
+                                               stream(body)):
+                text = s.replace(b"\\(", b"(").replace(b"\\)", b")").replace(b"\\\\", b"\\").decode("cp1252")
+                f = bold if font == b"F2" else reg
+                assert float(x) + pdf_native._text_width(f, text, float(size)) <= limit, text
+                texts.append(text)
+    # Le mot trop long est coupé sur plusieurs lignes, sans rien perdre
+    joined = "".join(texts)
+    assert LONG_WORD not in texts and LONG_WORD in joined
+
+def test_bold_uses_real_afm_widths():
+    regular, bold = pdf_native.Base14Font(False), pdf_native.Base14Font(True)
+    assert (regular.width("m"), bold.width("m")) == (833, 889)
+    assert (regular.width("i"), bold.width("i")) == (222, 278)
+    assert bold.width("W") == regular.width("W") == 944
+    assert bold.width("é") == bold.width("e") == 556
+
+def test_wrap_bold_fits(helvetica):
+    _reg, bold = pdf_native._fonts()
+    lines = pdf_native._wrap(bold, "Application for the Market Making Trader Internship " * 5, 12, 300)
+    assert len(lines) > 1 and all(pdf_native._text_width(bold, ln, 12) <= 300 for ln in lines)
+
+def test_ttf_subset_embedded(monkeypatch):
+    reg, _bold = pdf_native._find_font_files()
+    if not reg:
+        pytest.skip("aucune police TrueType trouvée sur ce système")
+    monkeypatch.setattr(pdf_native.config, "PDF_FONT_FILE", reg, raising=False)
+    monkeypatch.setattr(pdf_native.config, "PDF_FONT_BOLD_FILE", None, raising=False)
+    monkeypatch.setattr(pdf_native, "_font_cache", {})
+    pdf = pdf_native.render_letter("Optiver", "Trader", BODY)
+    objs = objects(pdf).values()
+    font_files = [b for b in objs if b"/Length1" in b]
+    assert len(font_files) == 1   # PDF_FONT_BOLD_FILE absent : la régulière sert aussi pour le gras
+    ttf = stream(font_files[0])
+    assert int(re.search(rb"/Length1 (\d+)", font_files[0]).group(1)) == len(ttf)
+    assert ttf[:4] == b"\x00\x01\x00\x00"
+    # Sous-ensemble : plus petit que la police complète, tag “ABCDEF+” dans le nom
+    assert len(ttf) < len(open(reg, "rb").read())
+    assert any(re.search(rb"/BaseFont /[A-Z]{6}\+", b) and b"/Subtype /TrueType" in b for b in objs)
+    assert any(b"/FontFile2" in b for b in objs)
@@ -0,0 +1,95 @@
+import http.client, json, os, threading, time
+import pytest
+import server
+
+def fake_run(bank, position, offer, lang, do_pdf, formats=None, progress=None, on_duplicate=None):
+    progress("llm", "…")
+    return {"docx": None}
+
+@pytest.fixture
+def srv():
+    s = server.make_server(port=0, workers=2, queue_size=4, run=fake_run)
+    threading.Thread(target=s.serve_forever, daemon=True).start()
+    yield s
+    s.shutdown()
+    s.server_close()
+    s.manager.close(timeout=5)
+
+def post(conn, body: bytes):
+    conn.request("POST", "/jobs", body, {"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read())
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b'"x"', b"42", b"null", b"{not json"])
+def test_non_object_body_rejected_and_connection_kept(srv, body):
+    conn = http.client.HTTPConnection("127.0.0.1", srv.server_address[1], timeout=5)
+    status, data = post(conn, body)
+    assert status == 400 and "error" in data
+    # Même connexion keep-alive : la requête suivante est servie normalement
+    status, data = post(conn, json.dumps({"bank": "B", "position": "P", "offer": "O"}).encode())
+    assert status == 202 and data["id"]
+
+def test_missing_fields():
+    s = server.make_server(port=0, workers=1, queue_size=1, run=fake_run)
+    try:
+        threading.Thread(target=s.serve_forever, daemon=True).start()
+        conn = http.client.HTTPConnection("127.0.0.1", s.server_address[1], timeout=5)
+        status, data = post(conn, b'{"bank": "B"}')
+        assert status == 400 and "position" in data["error"]
+    finally:
+        s.shutdown()
+        s.server_close()
+        s.manager.close(timeout=5)
+
+def test_worker_hooks_run_in_each_worker_thread():
+    seen, lock = {"init": set(), "exit": set()}, threading.Lock()
+
+    def hook(kind):
+        def f():
+            with lock:
+                seen[kind].add(threading.current_thread().name)
+        return f
+    mgr = server.JobManager(fake_run, 3, 8, worker_init=hook("init"), worker_exit=hook("exit"))
+    job = mgr.submit({"bank": "B", "position": "P", "offer": "O"})
+    t0 = time.time()
+    while not job.done and time.time() - t0 < 5:
+        time.sleep(0.01)
+    assert job.status == "done"
+    mgr.close(timeout=5)
+    assert seen["init"] == seen["exit"] == {f"job-worker-{i}" for i in range(3)}
+    assert not any(t.is_alive() for t in mgr.threads)
+
+GOOD = {"bank": "B", "position": "P", "offer": "O"}
+
+@pytest.mark.parametrize("extra", [
+    {"bank": "../../x"}, {"bank": "/etc"}, {"bank": ".."}, {"position": "C:\\Windows\\x"},
+    {"position": "a\\b"}, {"bank": 42}, {"offer": ["x"]},
+    {"lang": "DE"}, {"lang": 1}, {"pdf": "yes"}, {"pdf": 0},
+    {"formats": "pdf"}, {"formats": ["exe"]}, {"formats": [{"a": 1}]}, {"on_duplicate": "skip"},
+])
+def test_invalid_params_rejected(srv, extra):
+    conn = http.client.HTTPConnection("127.0.0.1", srv.server_address[1], timeout=5)
+    status, data = post(conn, json.dumps({**GOOD, **extra}).encode())
+    assert status == 400 and "error" in data
+
+def test_valid_params_accepted(srv):
+    conn = http.client.HTTPConnection("127.0.0.1", srv.server_address[1], timeout=5)
+    status, _ = post(conn, json.dumps({**GOOD, "bank": "BNP Paribas", "lang": "fr", "pdf": False,
+                                       "formats": ["txt", "html"], "on_duplicate": "generate"}).encode())
+    assert status == 202
+
+def test_bad_content_length_closes_connection(srv):
+    conn = http.client.HTTPConnection("127.0.0.1", srv.server_address[1], timeout=5)
+    conn.putrequest("POST", "/jobs")
+    conn.putheader("Content-Length", "abc")
+    conn.endheaders(b"{}")
+    resp = conn.getresponse()
+    assert resp.status == 400 and resp.getheader("Connection") == "close"
+    assert "Content-Length" in json.loads(resp.read())["error"]
+
+def test_letter_path_stays_in_output_dir():
+    import writer
+    root = os.path.realpath(os.path.join(writer.app_dir(), writer._cfg("OUT_DIR", "generated_letters")))
+    for bank, position in [("../../x", "../y"), ("/etc", "C:\\z"), ("..", "a/b")]:
+        p = os.path.realpath(writer.letter_base_path(bank, position))
+        assert os.path.dirname(os.path.dirname(p)) == root, p
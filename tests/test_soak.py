@@ -0,0 +1,25 @@
+# Version courte de soak.py : la mémoire doit rester plate sur une centaine de générations
+import os
+import pytest
+import soak
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    stub = soak._isolate(str(tmp_path), monkeypatch.setattr)
+    yield
+    stub.shutdown()
+
+def check(r, traced_mb):
+    assert r["traced_growth_mb"] <= traced_mb, r["top"]
+    # RSS : l’allocateur se remplit encore sur le premier dixième ; une fuite, elle, grimpe jusqu’au bout
+    rss = r["rss_samples_mb"]
+    assert rss[-1] - rss[1] <= 3.0, rss
+
+def test_memory_bounded(isolated):
+    check(soak.soak(runs=100, warmup=20), 1.0)
+
+def test_memory_bounded_gui(isolated):
+    pytest.importorskip("customtkinter")
+    if os.name != "nt" and not os.environ.get("DISPLAY"):
+        pytest.skip("aucun affichage")
+    check(soak.soak(runs=60, warmup=10, gui=True), 1.5)
@@ -0,0 +1,63 @@
+import time
+import pytest
+import config
+import usage_ledger
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "USAGE_DB", str(tmp_path / "usage.sqlite3"))
+    monkeypatch.setattr(usage_ledger, "_conn", None)
+    yield usage_ledger
+    if usage_ledger._conn is not None:
+        usage_ledger._conn.close()
+
+def test_percentile_nearest_rank():
+    assert usage_ledger._percentile([], 95) == 0.0
+    assert usage_ledger._percentile([3, 1, 2], 50) == 2
+    assert usage_ledger._percentile(list(range(1, 101)), 95) == 95
+    assert usage_ledger._percentile([7], 99) == 7
+
+def test_cost_longest_prefix():
+    assert usage_ledger.cost_usd("gpt-4o-mini-2024-07-18", 1_000_000, 0) == pytest.approx(0.15)
+    assert usage_ledger.cost_usd("gpt-4o", 1_000_000, 1_000_000, cached_tokens=1_000_000) == pytest.approx(11.25)
+    assert usage_ledger.cost_usd("mystery", 10, 10) == 0.0
+
+def test_latency_percentiles_exclude_batch_and_errors(ledger):
+    for ms in (100, 200, 300, 400):
+        ledger.record("gpt-4o-mini", ms / 1000)
+    ledger.record("gpt-4o-mini", 5000, ok=False)
+    ledger.record("gpt-4o-mini", 3600, purpose="batch")
+    ledger.record("gpt-4o", 0.05)
+    p = ledger.latency_percentiles(95)
+    assert p["gpt-4o-mini"] == pytest.approx(400) and p["gpt-4o"] == pytest.approx(50)
+    assert ledger.latency_percentiles(50)["gpt-4o-mini"] == pytest.approx(200)
+    assert ledger.latency_percentiles(since=time.time() + 60) == {}
+
+def test_tokens_per_letter_groups_calls(ledger):
+    ledger.record("gpt-4o-mini", 1, 100, 50, letter_id="a")
+    ledger.record("gpt-4o-mini", 1, 60, 40, letter_id="a", purpose="repair")
+    ledger.record("gpt-4o-mini", 1, 200, 100, letter_id="b")
+    ledger.record("gpt-4o-mini", 1, 999, 999)   # sans lettre : ignoré
+    ((period, n, avg_tokens, avg_cost),) = ledger.tokens_per_letter("day")
+    assert period == time.strftime("%Y-%m-%d") and n == 2 and avg_tokens == pytest.approx(275)
+    assert avg_cost == pytest.approx(((160 + 200) * 0.15 + (90 + 100) * 0.60) / 2 / 1e6)
+    assert ledger.tokens_per_letter("month")[0][0] == time.strftime("%Y-%m")
+
+def test_spend_per_run_latest_first(ledger, monkeypatch):
+    monkeypatch.setattr(ledger, "RUN_ID", "old")
+    ledger.record("gpt-4o", 1, 1000, 0)
+    time.sleep(0.01)
+    monkeypatch.setattr(ledger, "RUN_ID", "new")
+    ledger.record("gpt-4o", 1, 10, 5)
+    ledger.record("gpt-4o", 1, 10, 5)
+    rows = ledger.spend_per_run()
+    assert [(r[0], r[2], r[3]) for r in rows] == [("new", 2, 30), ("old", 1, 1000)]
+    assert rows[1][4] == pytest.approx(1000 * 2.5 / 1e6)
+    assert len(ledger.spend_per_run(limit=1)) == 1
+
+def test_cache_hit_rate(ledger):
+    ledger.record("gpt-4o-mini", 1, 2000, 10, cached_tokens=1024)
+    ledger.record("gpt-4o-mini", 1, 2000, 10)
+    ledger.record("gpt-4o-mini", 1, 2000, 10, cached_tokens=1024, ok=False)
+    ledger.record("gpt-4o", 1, 2000, 10, cached_tokens=1024)
+    assert ledger.cache_hit_rate() == {"gpt-4o-mini": 0.5, "gpt-4o": 1.0}
@@ -0,0 +1,76 @@
+import os, time
+import pytest
+import watcher
+
+OFFER = '{"bank": "Optiver", "position": "Junior Trader", "offer": "We are hiring a trader for our Amsterdam desk."}'
+
+@pytest.fixture
+def folder(tmp_path):
+    d = tmp_path / "offers"
+    d.mkdir()
+    (d / "a.json").write_text(OFFER, encoding="utf-8")
+    return d
+
+def make(folder, tmp_path, handler, **kw):
+    return watcher.Watcher(str(folder), handler, debounce_s=0, use_inotify=False,
+                           index_path=str(tmp_path / "index.sqlite3"), **kw)
+
+def test_unchanged_file_not_reprocessed(folder, tmp_path):
+    calls = []
+    make(folder, tmp_path, lambda p, m: calls.append(m) or {"docx": "x.docx"}).run_once()
+    make(folder, tmp_path, lambda p, m: calls.append(m) or {}).run_once()
+    assert len(calls) == 1 and calls[0]["bank"] == "Optiver"
+    # Simple “touch” : nouvelle date, même contenu → toujours pas de génération
+    os.utime(folder / "a.json", ns=(time.time_ns(), time.time_ns() + 10**9))
+    make(folder, tmp_path, lambda p, m: calls.append(m) or {}).run_once()
+    assert len(calls) == 1
+
+def test_index_kept_outside_watched_folder(folder, tmp_path):
+    make(folder, tmp_path, lambda p, m: {}).run_once()
+    assert os.listdir(folder) == ["a.json"]
+    assert (tmp_path / "index.sqlite3").exists()
+
+def test_failure_retried_on_restart(folder, tmp_path):
+    def boom(p, m):
+        raise RuntimeError("réseau")
+    msgs = []
+    make(folder, tmp_path, boom, progress=msgs.append).run_once()
+    assert any(m.startswith("[erreur] a.json") for m in msgs)
+    calls = []
+    make(folder, tmp_path, lambda p, m: calls.append(p) or {}).run_once()
+    assert len(calls) == 1
+
+def test_failure_retried_with_backoff(folder, tmp_path):
+    attempts = []
+    def flaky(p, m):
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RuntimeError("429")
+        return {}
+    w = make(folder, tmp_path, flaky, retry_s=0.1)
+    w.full_scan()
+    deadline = time.monotonic() + 5
+    while len(attempts) < 3 and time.monotonic() < deadline:
+        w._flush_ready()
+        time.sleep(0.02)
+    w.pool.shutdown(wait=True)
+    assert len(attempts) == 3
+    assert attempts[2] - attempts[1] >= attempts[1] - attempts[0] >= 0.1   # attente doublée
+    assert not w.retries
+
+def test_rotating_restat_catches_in_place_rewrites(tmp_path):
+    d = tmp_path / "many"
+    d.mkdir()
+    for i in range(50):
+        (d / f"o{i:02}.json").write_text(OFFER, encoding="utf-8")
+    w = watcher.Watcher(str(d), lambda p, m: {}, debounce_s=0, use_inotify=False, stat_budget=7,
+                        index_path=str(tmp_path / "index.sqlite3"))
+    w.full_scan()
+    w.pending.clear()
+    (d / "o03.json").unlink()
+    (d / "o41.json").write_text(OFFER + " ", encoding="utf-8")   # réécriture sur place
+    w.dir_mtime = os.stat(d).st_mtime_ns                            # le dossier “n’a pas bougé”
+    for _ in range(8):                                              # 8 × 7 ≥ 50 : un tour complet
+        w._poll()
+    assert "o41.json" in w.pending and "o03.json" not in w.names
+    assert sorted(w.ring) == sorted(w.names) and all(w.ring[i] == n for n, i in w.ring_pos.items())
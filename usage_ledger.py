@@ -0,0 +1,185 @@
+# usage_ledger.py — Journal persistant de la consommation LLM (tokens, latence, coût)
+# Chaque appel à l’API est consigné dans une petite base SQLite (stdlib, zéro dépendance) :
+# modèle, tokens prompt/completion/cachés, latence, hit/miss du cache de prompt, banque/poste.
+# Des helpers d’agrégation permettent ensuite d’ajuster modèle et taille de prompt.
+import math, os, sys, sqlite3, threading, time, uuid
+import config
+
+# Identifiant de la session courante (un lancement de l’app / du script = un “run”)
+RUN_ID = uuid.uuid4().hex[:12]
+
+# Tarifs indicatifs en USD par million de tokens : (prompt, prompt caché, completion).
+# Modèle inconnu → coût 0 (on garde quand même les tokens, c’est l’essentiel).
+PRICES = {
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+    "gpt-4o-mini":   (0.15, 0.075, 0.60),
+    "gpt-4o":        (2.50, 1.25, 10.00),
+    "gpt-4.1-nano":  (0.10, 0.025, 0.40),
+    "gpt-4.1-mini":  (0.40, 0.10, 1.60),
+    "gpt-4.1":       (2.00, 0.50, 8.00),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id                INTEGER PRIMARY KEY,
+    ts                REAL    NOT NULL,
+    run_id            TEXT    NOT NULL,
+    letter_id         TEXT,
+    purpose           TEXT    NOT NULL DEFAULT 'letter',
+    model             TEXT    NOT NULL,
+    bank              TEXT,
+    position          TEXT,
+    prompt_tokens     INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens     INTEGER NOT NULL DEFAULT 0,
+    latency_ms        REAL    NOT NULL,
+    cache_hit         INTEGER NOT NULL DEFAULT 0,
+    cost_usd          REAL    NOT NULL DEFAULT 0,
+    ok                INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS calls_ts     ON calls(ts);
+CREATE INDEX IF NOT EXISTS calls_model  ON calls(model);
+CREATE INDEX IF NOT EXISTS calls_run    ON calls(run_id);
+CREATE INDEX IF NOT EXISTS calls_letter ON calls(letter_id);
+"""
+
+_lock = threading.Lock()
+_conn = None
+
+# Totaux de la session en mémoire (lecture instantanée pour le badge de l’UI)
+_session = {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cached_tokens": 0, "cost_usd": 0.0}
+
+def _app_dir() -> str:
+    # Même logique que writer.app_dir (supporte l’exécutable gelé type PyInstaller)
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+def db_path() -> str:
+    """Chemin de la base (relatif → à côté de l’app)."""
+    p = getattr(config, "USAGE_DB", "usage_ledger.sqlite3")
+    return p if os.path.isabs(p) else os.path.join(_app_dir(), p)
+
+def _db() -> sqlite3.Connection:
+    # Connexion unique partagée entre threads (protégée par _lock)
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(db_path(), check_same_thread=False)
+        _conn.executescript(_SCHEMA)
+    return _conn
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """Coût estimé d’un appel (préfixe le plus long de PRICES, ex. “gpt-4o-mini-2024-07-18”)."""
+    key = max((k for k in PRICES if (model or "").startswith(k)), key=len, default=None)
+    if key is None:
+        return 0.0
+    p_in, p_cached, p_out = PRICES[key]
+    fresh = max(0, prompt_tokens - cached_tokens)
+    return (fresh * p_in + cached_tokens * p_cached + completion_tokens * p_out) / 1_000_000
+
+def record(model: str, latency_s: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+           cached_tokens: int = 0, bank: str = None, position: str = None,
+           letter_id: str = None, purpose: str = "letter", ok: bool = True, cost_factor: float = 1.0) -> None:
+    """Consigne un appel. Ne lève jamais : la compta ne doit pas casser une génération.
+    `cost_factor` : remise appliquée au tarif (ex. 0.5 pour la Batch API)."""
+    cost = cost_usd(model, prompt_tokens, completion_tokens, cached_tokens) * cost_factor
+    row = (time.time(), RUN_ID, letter_id, purpose, model, bank, position,
+           int(prompt_tokens), int(completion_tokens), int(cached_tokens),
+           latency_s * 1000.0, int(cached_tokens > 0), cost, int(bool(ok)))
+    with _lock:
+        _session["calls"] += 1
+        _session["errors"] += 0 if ok else 1
+        _session["prompt_tokens"] += int(prompt_tokens)
+        _session["completion_tokens"] += int(completion_tokens)
+        _session["cached_tokens"] += int(cached_tokens)
+        _session["cost_usd"] += cost
+        try:
+            db = _db()
+            db.execute(
+                "INSERT INTO calls (ts, run_id, letter_id, purpose, model, bank, position, prompt_tokens,"
+                " completion_tokens, cached_tokens, latency_ms, cache_hit, cost_usd, ok)"
+                " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)", row)
+            db.commit()
+        except Exception:
+            pass
+
+def record_response(resp, model: str, latency_s: float, **kw) -> None:
+    """Extrait `resp.usage` (chat.completions) et le consigne via record()."""
+    usage = getattr(resp, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    record(
+        getattr(resp, "model", None) or model, latency_s,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+        **kw,
+    )
+
+def session_totals() -> dict:
+    """Copie des totaux de la session courante."""
+    with _lock:
+        return dict(_session)
+
+# ————— Requêtes d’agrégation —————
+def _query(sql: str, args=()) -> list:
+    with _lock:
+        return _db().execute(sql, args).fetchall()
+
+def _percentile(values: list, q: float) -> float:
+    # Percentile “nearest rank” : suffisant pour du pilotage, pas besoin de numpy
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, math.ceil(q / 100.0 * len(values)) - 1))
+    return values[k]
+
+def latency_percentiles(q: float = 95.0, since: float = None) -> dict:
+    """Latence (ms) au percentile `q` par modèle, appels réussis uniquement. Ex. p95 par modèle.
+    Les appels en lot (purpose "batch", délai de traitement de plusieurs heures) sont exclus."""
+    rows = _query("SELECT model, latency_ms FROM calls WHERE ok = 1 AND purpose != 'batch' AND ts >= ?",
+                  (since or 0,))
+    by_model = {}
+    for model, ms in rows:
+        by_model.setdefault(model, []).append(ms)
+    return {m: _percentile(v, q) for m, v in by_model.items()}
+
+def tokens_per_letter(period: str = "day", since: float = None) -> list:
+    """Tokens moyens par lettre regroupés par jour/semaine/mois : [(période, lettres, tokens moyens, coût moyen)]."""
+    fmt = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}[period]
+    return _query(
+        "SELECT period, COUNT(*), AVG(tokens), AVG(cost) FROM ("
+        "  SELECT strftime(?, MIN(ts), 'unixepoch', 'localtime') AS period,"
+        "         SUM(prompt_tokens + completion_tokens) AS tokens, SUM(cost_usd) AS cost"
+        "  FROM calls WHERE letter_id IS NOT NULL AND ts >= ? GROUP BY letter_id"
+        ") GROUP BY period ORDER BY period",
+        (fmt, since or 0),
+    )
+
+def spend_per_run(limit: int = 20) -> list:
+    """Dépense par run : [(run_id, début, appels, tokens, coût USD)], du plus récent au plus ancien."""
+    return _query(
+        "SELECT run_id, datetime(MIN(ts), 'unixepoch', 'localtime'), COUNT(*),"
+        " SUM(prompt_tokens + completion_tokens), SUM(cost_usd)"
+        " FROM calls GROUP BY run_id ORDER BY MIN(ts) DESC LIMIT ?",
+        (limit,),
+    )
+
+def cache_hit_rate(since: float = None) -> dict:
+    """Part des appels ayant bénéficié du cache de prompt, par modèle."""
+    rows = _query("SELECT model, AVG(cache_hit) FROM calls WHERE ok = 1 AND ts >= ? GROUP BY model",
+                  (since or 0,))
+    return dict(rows)
+
+# Petit rapport en ligne de commande : python usage_ledger.py
+if __name__ == "__main__":
+    print(f"Base : {db_path()}\n")
+    print("p95 latence par modèle (ms)")
+    for m, v in sorted(latency_percentiles().items()):
+        print(f"  {m:<28} {v:9.0f}")
+    print("\nTokens par lettre (par jour)")
+    for period, n, tok, cost in tokens_per_letter():
+        print(f"  {period}  {n:4d} lettres  {tok:8.0f} tokens  ${cost:.4f}")
+    print("\nDépense par run")
+    for run_id, start, n, tok, cost in spend_per_run():
+        print(f"  {run_id}  {start}  {n:4d} appels  {tok or 0:8d} tokens  ${cost or 0:.4f}")
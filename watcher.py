@@ -0,0 +1,400 @@
+# watcher.py — Mode “dossier surveillé” : les offres déposées par le scraper partent en génération
+# Le scraper écrit des fichiers .txt / .json dans un dossier ; on détecte les nouveaux (ou modifiés),
+# on attend qu’ils soient complètement écrits (anti-rebond), on lit banque/poste/langue puis on
+# lance la génération. Un index d’empreintes (SQLite, hors du dossier surveillé) garantit qu’un
+# fichier inchangé n’est jamais retraité, même après un redémarrage ; un échec est retenté.
+# - Linux : inotify (via ctypes, aucun paquet requis) → aucun balayage tant que rien ne bouge
+# - ailleurs : sondage économe — on ne relit la liste des fichiers que si la date du dossier
+#   change, et on ne “stat” que les nouveaux noms + une petite tranche tournante des anciens
+#   (pour attraper les réécritures sur place). Tient des dizaines de milliers de fichiers.
+#
+# Usage : python watcher.py <dossier> [--once] [--poll] [--workers 2]
+import argparse, ctypes, ctypes.util, hashlib, json, os, re, select, sqlite3, struct, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+OFFER_EXT = (".txt", ".json")
+# Fichiers en cours d’écriture / temporaires à ignorer
+IGNORE_RX = re.compile(r"(^\.|~$|\.(tmp|part|crdownload|swp)$)", re.IGNORECASE)
+
+# ===================== Lecture des offres =====================
+_KEYS = {
+    "bank": ("bank", "company", "banque", "entreprise", "employer"),
+    "position": ("position", "title", "role", "poste", "job_title"),
+    "lang": ("lang", "language", "langue"),
+    "offer": ("offer", "description", "text", "body", "annonce", "job_description"),
+}
+_FR_WORDS = {"le", "la", "les", "des", "et", "vous", "nous", "pour", "dans", "une", "du", "au", "sur", "avec"}
+_EN_WORDS = {"the", "and", "you", "we", "for", "with", "our", "in", "to", "of", "a", "is", "will", "on"}
+
+def _pick(d: dict, field: str):
+    low = {str(k).lower(): v for k, v in d.items()}
+    for k in _KEYS[field]:
+        if low.get(k):
+            return str(low[k]).strip()
+    return None
+
+def detect_lang(text: str) -> str:
+    """EN / FR par comptage de mots-outils (suffisant pour choisir le prompt)."""
+    words = re.findall(r"[a-zà-ÿ]+", (text or "").lower()[:4000])
+    fr = sum(1 for w in words if w in _FR_WORDS)
+    en = sum(1 for w in words if w in _EN_WORDS)
+    return "FR" if fr > en else "EN"
+
+def canonical_bank(name: str) -> str:
+    """Nom de banque normalisé sur la liste config.BANQUES quand il y correspond (casse/espaces)."""
+    key = re.sub(r"\s+", " ", (name or "").strip()).lower()
+    for b in getattr(config, "BANQUES", ()):
+        if b.lower() == key:
+            return b
+    return (name or "").strip()
+
+def parse_offer(path: str) -> dict:
+    """{bank, position, lang, offer} depuis un .json (clés usuelles FR/EN) ou un .txt à en-tête :
+        Bank: Optiver
+        Position: Junior Trader
+        Lang: EN
+        <ligne vide>
+        texte de l’annonce…
+    ValueError si la banque, le poste ou le texte manque."""
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        raw = f.read()
+    if path.lower().endswith(".json"):
+        return offer_from_dict(json.loads(raw))
+    head, sep, body = raw.partition("\n\n")
+    fields = {}
+    for line in head.splitlines():
+        k, colon, v = line.partition(":")
+        if colon and len(k) < 30:
+            fields[k.strip()] = v.strip()
+    if not sep or not fields:
+        body = raw  # pas d’en-tête : tout le fichier est l’annonce
+    meta = {k: _pick(fields, k) for k in ("bank", "position", "lang")}
+    meta["offer"] = body.strip()
+    return _complete(meta)
+
+def offer_from_dict(d) -> dict:
+    """{bank, position, lang, offer} depuis un objet JSON (clés usuelles FR/EN) ; ValueError si incomplet."""
+    if not isinstance(d, dict):
+        raise ValueError("JSON attendu : un objet")
+    return _complete({k: _pick(d, k) for k in _KEYS})
+
+def _complete(meta: dict) -> dict:
+    missing = [k for k in ("bank", "position", "offer") if not meta.get(k)]
+    if missing:
+        raise ValueError("métadonnées manquantes : " + ", ".join(missing))
+    lang = (meta.get("lang") or "").upper()[:2]
+    meta["lang"] = lang if lang in ("EN", "FR") else detect_lang(meta["offer"])
+    meta["bank"] = canonical_bank(meta["bank"])
+    return meta
+
+# ===================== Index d’empreintes =====================
+class FingerprintIndex:
+    """chemin → (taille, mtime_ns, sha1, statut). Chargé en mémoire au démarrage (quelques Mo pour 100k).
+    Un échec du handler (réseau, modèle…) est enregistré sans empreinte : le fichier n’est pas
+    considéré comme vu et sera retenté (au démarrage suivant, ou par les relances du Watcher)."""
+    def __init__(self, db_path: str):
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+                        " sha1 TEXT, status TEXT, processed_at REAL, result TEXT)")
+        self.lock = threading.Lock()
+        self.mem = {p: (s, m, h) for p, s, m, h in self.db.execute("SELECT path, size, mtime_ns, sha1 FROM files")}
+
+    def unchanged_stat(self, path: str, size: int, mtime_ns: int) -> bool:
+        fp = self.mem.get(path)
+        return fp is not None and fp[0] == size and fp[1] == mtime_ns
+
+    def known_hash(self, path: str):
+        fp = self.mem.get(path)
+        return fp[2] if fp else None
+
+    def put(self, path: str, size: int, mtime_ns: int, sha1: str, status: str, result: dict = None):
+        if status == "error":
+            size = mtime_ns = sha1 = None   # échec : rien qui puisse faire passer le fichier pour traité
+        with self.lock:
+            self.mem[path] = (size, mtime_ns, sha1)
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?)",
+                            (path, size, mtime_ns, sha1, status, time.time(), json.dumps(result or {})))
+            self.db.commit()
+
+def _app_dir() -> str:
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+def default_index_path() -> str:
+    p = getattr(config, "WATCH_INDEX_DB", "watch_index.sqlite3")
+    return p if os.path.isabs(p) else os.path.join(_app_dir(), p)
+
+def _sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# ===================== inotify (Linux) =====================
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_Q_OVERFLOW = 0x2, 0x8, 0x80, 0x100, 0x4000
+
+class _Inotify:
+    """Surveillance d’un dossier via inotify (appels libc directs). Lève OSError si indisponible."""
+    def __init__(self, directory: str):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify indisponible sur cette plateforme")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0))
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch")
+
+    def read(self, timeout: float):
+        """Noms touchés depuis le dernier appel ; None si la file noyau a débordé (→ rescan)."""
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r:
+            return set()
+        names, overflow = set(), False
+        while True:
+            try:
+                buf = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            i = 0
+            while i + 16 <= len(buf):
+                _wd, mask, _cookie, ln = struct.unpack_from("iIII", buf, i)
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                name = buf[i + 16: i + 16 + ln].rstrip(b"\0")
+                if name:
+                    names.add(os.fsdecode(name))
+                i += 16 + ln
+        return None if overflow else names
+
+    def close(self):
+        os.close(self.fd)
+
+# ===================== Surveillance =====================
+class Watcher:
+    """Détecte les offres nouvelles/modifiées d’un dossier et les passe à `handler(path, meta)`."""
+    def __init__(self, directory: str, handler, debounce_s: float = None, poll_s: float = None,
+                 use_inotify: bool = True, stat_budget: int = 500, workers: int = 1,
+                 index_path: str = None, retry_s: float = None, progress=None):
+        """`progress(message)` (optionnel) : une ligne par fichier traité, ignoré, en erreur ou relancé."""
+        self.dir = os.path.abspath(directory)
+        self.handler = handler
+        self.progress = progress or (lambda _msg: None)
+        self.debounce_s = debounce_s if debounce_s is not None else float(getattr(config, "WATCH_DEBOUNCE_S", 2.0))
+        self.poll_s = poll_s if poll_s is not None else float(getattr(config, "WATCH_POLL_S", 1.0))
+        self.retry_s = retry_s if retry_s is not None else float(getattr(config, "WATCH_RETRY_S", 30.0))
+        self.retry_max_s = max(self.retry_s, float(getattr(config, "WATCH_RETRY_MAX_S", 3600.0)))
+        self.stat_budget = stat_budget
+        self.index = FingerprintIndex(index_path or default_index_path())
+        self.retries = {}      # nom → (tentatives, instant de la prochaine relance) après une erreur
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="watch-job")
+        self.names = {}        # nom → (taille, mtime_ns) vu au dernier stat
+        self.ring = []         # mêmes noms, ordre stable, pour la tranche tournante (retrait en O(1))
+        self.ring_pos = {}     # nom → indice dans ring
+        self.pending = {}      # nom → (taille, mtime_ns, instant du dernier changement)
+        self.inflight = set()
+        self.lock = threading.Lock()
+        self.dir_mtime = None
+        self.cursor = 0        # tranche tournante des re-stat en mode sondage
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = _Inotify(self.dir)
+            except OSError:
+                self.inotify = None
+        self.stop_event = threading.Event()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.inotify else "polling"
+
+    @staticmethod
+    def _wanted(name: str) -> bool:
+        return name.lower().endswith(OFFER_EXT) and not IGNORE_RX.search(name)
+
+    def _forget(self, name: str):
+        self.names.pop(name, None)
+        self.pending.pop(name, None)
+        i = self.ring_pos.pop(name, None)
+        if i is not None:
+            # Retrait par échange avec le dernier : pas de recopie de la liste
+            last = self.ring.pop()
+            if last != name:
+                self.ring[i] = last
+                self.ring_pos[last] = i
+
+    def _stat(self, name: str):
+        try:
+            st = os.stat(os.path.join(self.dir, name))
+        except OSError:
+            self._forget(name)
+            return
+        fp = (st.st_size, st.st_mtime_ns)
+        if self.names.get(name) != fp:
+            if name not in self.names:
+                self.ring_pos[name] = len(self.ring)
+                self.ring.append(name)
+            self.names[name] = fp
+            if not self.index.unchanged_stat(os.path.join(self.dir, name), *fp):
+                # Nouveau ou modifié : on (re)lance le minuteur d’anti-rebond
+                self.pending[name] = (*fp, time.monotonic())
+
+    def full_scan(self):
+        """Un seul passage en flux (os.scandir) : au démarrage ou après un débordement inotify."""
+        self.dir_mtime = os.stat(self.dir).st_mtime_ns
+        seen = set()
+        with os.scandir(self.dir) as it:
+            for e in it:
+                if e.is_file() and self._wanted(e.name):
+                    seen.add(e.name)
+                    self._stat(e.name)
+        for gone in self.names.keys() - seen:
+            self._forget(gone)
+
+    def _poll(self):
+        # Liste relue seulement si le dossier a changé (création / renommage / suppression)
+        mtime = os.stat(self.dir).st_mtime_ns
+        if mtime != self.dir_mtime:
+            self.dir_mtime = mtime
+            current = {n for n in os.listdir(self.dir) if self._wanted(n)}
+            for name in current - self.names.keys():
+                self._stat(name)
+            for gone in self.names.keys() - current:
+                self._forget(gone)
+        # Réécritures sur place (la date du dossier ne bouge pas) : re-stat d’une tranche tournante,
+        # lue directement dans `ring` (coût proportionnel à stat_budget, pas au nombre de fichiers)
+        n = len(self.ring)
+        if n:
+            start = self.cursor % n
+            for name in [self.ring[(start + k) % n] for k in range(min(self.stat_budget, n))]:
+                self._stat(name)
+            self.cursor = start + self.stat_budget
+
+    def _retry_due(self):
+        # Fichiers en erreur dont l’attente est écoulée : remis dans la file, sans anti-rebond
+        now = time.monotonic()
+        with self.lock:
+            due = [n for n, (_k, at) in self.retries.items() if at <= now]
+        for name in due:
+            fp = self.names.get(name)
+            if fp is None:
+                with self.lock:
+                    self.retries.pop(name, None)   # fichier supprimé entre-temps
+                continue
+            if name not in self.pending:
+                self.pending[name] = (*fp, now - self.debounce_s)
+
+    def _flush_ready(self):
+        # Fichiers stables depuis `debounce_s` : on re-vérifie la taille puis on lance le traitement
+        self._retry_due()
+        now = time.monotonic()
+        for name, (size, mtime_ns, t) in list(self.pending.items()):
+            if now - t < self.debounce_s:
+                continue
+            self._stat(name)
+            if name not in self.pending or self.pending[name][2] != t:
+                continue  # encore en mouvement (ou supprimé) : minuteur relancé
+            del self.pending[name]
+            path = os.path.join(self.dir, name)
+            with self.lock:
+                if path in self.inflight:
+                    continue
+                self.inflight.add(path)
+            self.pool.submit(self._process, path, size, mtime_ns)
+
+    def _process(self, path: str, size: int, mtime_ns: int):
+        name = os.path.basename(path)
+        try:
+            sha1 = _sha1(path)
+            if sha1 == self.index.known_hash(path):
+                # Simple “touch” : contenu identique → on met juste l’empreinte à jour
+                self.index.put(path, size, mtime_ns, sha1, "unchanged")
+                return
+            try:
+                meta = parse_offer(path)
+            except (ValueError, OSError) as e:
+                self.index.put(path, size, mtime_ns, sha1, "invalid", {"error": str(e)})
+                self.progress(f"[ignoré] {name} : {e}")
+                return
+            try:
+                result = self.handler(path, meta) or {}
+            except Exception as e:
+                # Erreur (réseau, modèle…) : pas d’empreinte, relance avec attente croissante
+                self.index.put(path, size, mtime_ns, sha1, "error", {"error": str(e)})
+                with self.lock:
+                    attempts = self.retries.get(name, (0, 0))[0] + 1
+                    delay = min(self.retry_max_s, self.retry_s * 2 ** (attempts - 1))
+                    self.retries[name] = (attempts, time.monotonic() + delay)
+                self.progress(f"[erreur] {name} : {e} (nouvel essai dans {delay:.0f}s)")
+                return
+            with self.lock:
+                self.retries.pop(name, None)
+            self.index.put(path, size, mtime_ns, sha1, "done", result)
+            dup = result.get("duplicate_of")
+            note = f" (texte repris de « {dup['position']} », sans appel LLM)" if dup else ""
+            self.progress(f"[ok] {name} → {result.get('docx', '')}{note}")
+        except OSError:
+            pass  # fichier disparu entre-temps
+        finally:
+            with self.lock:
+                self.inflight.discard(path)
+
+    def run_once(self):
+        """Traite l’arriéré actuel puis rend la main (utile en tâche planifiée)."""
+        self.full_scan()
+        deadline = time.monotonic() + self.debounce_s
+        while self.pending:
+            time.sleep(max(0.05, min(0.5, deadline - time.monotonic())))
+            self._flush_ready()
+        self.pool.shutdown(wait=True)
+
+    def run(self):
+        self.full_scan()
+        while not self.stop_event.is_set():
+            if self.inotify:
+                names = self.inotify.read(timeout=min(self.poll_s, self.debounce_s / 2 or self.poll_s))
+                if names is None:
+                    self.full_scan()
+                else:
+                    for name in names:
+                        if self._wanted(name):
+                            self._stat(name)
+            else:
+                self.stop_event.wait(self.poll_s)
+                self._poll()
+            self._flush_ready()
+
+    def stop(self):
+        self.stop_event.set()
+        self.pool.shutdown(wait=True)
+        if self.inotify:
+            self.inotify.close()
+
+def generate_from_file(path: str, meta: dict) -> dict:
+    """Handler par défaut : pipeline complet (LLM → DOCX → PDF)."""
+    import pipeline
+    return pipeline.run_letter(meta["bank"], meta["position"], meta["offer"], meta["lang"],
+                               do_pdf=bool(getattr(config, "WATCH_PDF", True)))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Surveille un dossier d’offres et génère les lettres.")
+    ap.add_argument("directory", nargs="?", default=getattr(config, "WATCH_DIR", None))
+    ap.add_argument("--once", action="store_true", help="traite l’arriéré puis s’arrête")
+    ap.add_argument("--poll", action="store_true", help="force le mode sondage (sans inotify)")
+    ap.add_argument("--workers", type=int, default=int(getattr(config, "WATCH_WORKERS", 2)))
+    a = ap.parse_args()
+    if not a.directory or not os.path.isdir(a.directory):
+        ap.error("dossier à surveiller introuvable (argument ou WATCH_DIR)")
+    w = Watcher(a.directory, generate_from_file, use_inotify=not a.poll, workers=a.workers, progress=print)
+    if a.once:
+        w.run_once()
+        sys.exit(0)
+    print(f"Surveillance de {w.dir} ({w.mode}, anti-rebond {w.debounce_s}s) — Ctrl+C pour arrêter")
+    try:
+        w.run()
+    except KeyboardInterrupt:
+        w.stop()
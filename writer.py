@@ -1,4 +1,4 @@
-import os, re, sys
+import gc, io, os, re, sys
 from docx import Document
 from docx.shared import Pt, Inches
 from docx.enum.text import WD_LINE_SPACING
@@ -6,21 +6,11 @@ from docx.opc.constants import RELATIONSHIP_TYPE as RT
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 import config
+import letter_index
+import letter_model
 
-# Caractères invisibles qu’on rencontre souvent en copiant-collant du texte
-NBSP = "\u00A0"
-ZWS  = "\u200B"
-
-# On repère une éventuelle salutation au tout début (FR/EN) pour pouvoir la retirer proprement
-GREET_RX = re.compile(
-    r"^\s*(dear(\s+hiring\s+(team|manager))?|bonjour|madame|monsieur|a\s+l'attention|à\s+l'attention)\b[^\n]*?,?\s*",
-    re.IGNORECASE,
-)
-# On repère les formules de fin de lettre (FR/EN) pour les ignorer si l’utilisateur les a déjà mises
-CLOSE_RX = re.compile(
-    r"\b(yours\s+sincerely|kind\s+regards|best\s+regards|cordialement)\b.*$",
-    re.IGNORECASE,
-)
+# Nettoyage du contenu et décisions de mise en page : centralisés dans letter_model
+from letter_model import _cfg
 
 def app_dir() -> str:
     # Où sauvegarder les fichiers :
@@ -31,16 +21,6 @@ def app_dir() -> str:
     return os.path.dirname(os.path.abspath(__file__))
 
 # ————— Utilitaires (petites briques réutilisables pour garder le code lisible) —————
-def _cfg(name, default):
-    # Récupère une valeur depuis config.py, avec un secours si la clé n’existe pas
-    return getattr(config, name, default)
-
-def _normalize_ws(s: str) -> str:
-    # Nettoie les espaces chelous (NBSP/ZWS), enlève puces/chevrons en début de ligne, et trim
-    s = (s or "").replace(NBSP, " ").replace(ZWS, " ").strip()
-    s = re.sub(r"^[\u2022>\-\*\•\s]+", "", s)
-    return s
-
 def _apply_font_to_run(run, bold=False):
     """Applique notre police/taille (y compris au niveau XML de Word) et met en gras si demandé."""
     run.bold = bool(bold)
@@ -91,13 +71,6 @@ def _mailto(paragraph, email: str):
     t = OxmlElement("w:t"); t.text = email; run.append(t)
     hyperlink.append(run); paragraph._p.append(hyperlink)
 
-def _clean(text: str) -> str:
-    # Nettoyage léger : espaces, markdown basique (* _ `), doublons d’espaces
-    s = _normalize_ws(text)
-    s = re.sub(r"[\*`_]+", "", s)
-    s = re.sub(r"[ \t]{2,}", " ", s)
-    return s.strip()
-
 def _pf(p, after_pt=0, before_pt=0):
     # Applique notre mise en forme de paragraphe (interligne + espacements avant/après)
     pf = p.paragraph_format
@@ -106,29 +79,14 @@ def _pf(p, after_pt=0, before_pt=0):
     pf.space_before = Pt(before_pt)
     pf.space_after  = Pt(after_pt)
 
-def _sanitize_paragraphs(pars: list[str]) -> list[str]:
-    # Prépare proprement les paragraphes fournis par l’utilisateur avant de les injecter dans Word
-    out = []
-    for para in pars or []:
-        s = _clean(para)
-        # Si l’utilisateur a déjà commencé par “Bonjour/Dear…”, on enlève la salutation (on garde le reste)
-        s = GREET_RX.sub("", s)
-        # Si le paragraphe est en fait une formule de politesse de fin, on la laissera plutôt à la signature
-        if CLOSE_RX.search(s):
-            continue
-        if s:
-            out.append(s)
-    # On se limite à 4 paragraphes pour garder la lettre concise et lisible
-    return out[:4]
-
 # ————— Cœur du sujet : construire la lettre et l’enregistrer —————
-def build_letter_doc(bank: str, position: str, body_paragraphs: list[str]) -> Document:
-    body_paragraphs = _sanitize_paragraphs(body_paragraphs)
-
+def docx_from_letter(letter: letter_model.Letter) -> Document:
+    """Renderer DOCX : traduit le modèle de lettre en appels python-docx (aucune décision de contenu ici)."""
+    st = letter.style
     doc = Document()
 
-    # Marges du document (tirées de config, avec des valeurs par défaut raisonnables)
-    top, bottom, left, right = _cfg("MARGES_INCH", (1.00, 0.60, 1.10, 1.10))
+    # Marges du document (tirées du style figé de la lettre)
+    top, bottom, left, right = st.margins_inch
     for s in doc.sections:
         s.top_margin = Inches(top)
         s.bottom_margin = Inches(bottom)
@@ -136,71 +94,68 @@ def build_letter_doc(bank: str, position: str, body_paragraphs: list[str]) -> Do
         s.right_margin = Inches(right)
 
     # Style “Normal” de Word : on l’aligne avec nos choix (police, taille, interligne, pas d’espaces parasites)
-    st = doc.styles["Normal"]
-    st.font.name = _cfg("POLICE", "Aptos")
-    st.font.size = Pt(_cfg("TAILLE_PT", 12))
-    st.paragraph_format.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
-    st.paragraph_format.line_spacing = _cfg("LINE_SPACING", 1.22)
-    st.paragraph_format.space_before = Pt(0)
-    st.paragraph_format.space_after  = Pt(0)
-
-    # Espacements verticaux entre les blocs (tous configurables)
-    after_email     = _cfg("ESP_APRES_EMAIL_PT",     12)
-    after_subject   = _cfg("ESP_APRES_SUJET_PT",     12)
-    after_salut     = _cfg("ESP_APRES_SALUT_PT",     12)
-    after_par       = _cfg("ESP_APRES_PAR_PT",         6)
-    after_signature = _cfg("ESP_APRES_SIGNATURE_PT", 12)
-
-    # Bloc identité en en-tête (nom, adresse, ville, téléphone)
-    p = doc.add_paragraph()
-    _add_text(p, config.NOM, bold=True); _add_text(p, "\n")
-    _add_text(p, config.ADRESSE); _add_text(p, "\n")
-    _add_text(p, config.VILLE_PAYS); _add_text(p, "\n")
-    _add_text(p, config.TEL)
-    _pf(p, after_pt=0)
-
-    # Email cliquable (mailto:) juste en dessous
-    p_mail = doc.add_paragraph(); _mailto(p_mail, config.EMAIL)
-    _pf(p_mail, after_pt=after_email)
-
-    # Sujet explicite avec le poste ciblé (utile côté RH et ATS)
-    p_subj = doc.add_paragraph()
-    _add_text(p_subj, f"Subject: Application – {position}", bold=True)
-    _pf(p_subj, after_pt=after_subject)
-
-    # Salutation : on l’insère une seule fois, le corps ayant été nettoyé de toute salutation redondante
-    p_greet = doc.add_paragraph()
-    _add_text(p_greet, "Dear Hiring Team,")
-    _pf(p_greet, after_pt=after_salut)
-
-    # Corps de la lettre (jusqu’à 4 paragraphes propres et aérés)
-    for para in body_paragraphs[:4]:
-        pb = doc.add_paragraph()
-        _add_text(pb, _clean(para))
-        _pf(pb, after_pt=after_par)
-
-    # Formule de politesse + signature (on se charge de la cohérence stylistique ici)
-    ps1 = doc.add_paragraph(); _add_text(ps1, "Yours sincerely,")
-    _pf(ps1, after_pt=after_signature)
-    ps2 = doc.add_paragraph(); _add_text(ps2, config.NOM, bold=True)
-    _pf(ps2, after_pt=0)
+    normal = doc.styles["Normal"]
+    normal.font.name = st.font
+    normal.font.size = Pt(st.size_pt)
+    normal.paragraph_format.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
+    normal.paragraph_format.line_spacing = st.line_spacing
+    normal.paragraph_format.space_before = Pt(0)
+    normal.paragraph_format.space_after  = Pt(0)
+
+    # Un bloc du modèle = un paragraphe Word ; les lignes d’un bloc sont séparées par des retours
+    for block in letter.blocks():
+        p = doc.add_paragraph()
+        if block.link and block.link.startswith("mailto:"):
+            # Email cliquable (mailto:) juste sous l’en-tête
+            _mailto(p, block.link[len("mailto:"):])
+        else:
+            for i, (text, bold) in enumerate(block.lines):
+                if i:
+                    _add_text(p, "\n")
+                _add_text(p, text, bold=bold)
+        _pf(p, after_pt=block.space_after_pt)
 
     return doc
 
-def save_letter(bank: str, position: str, body_paragraphs: list[str]) -> str:
-    # Construit le document puis l’écrit sur disque dans un dossier par banque
-    doc = build_letter_doc(bank, position, body_paragraphs)
+def render_docx(letter: letter_model.Letter) -> bytes:
+    """Octets du DOCX ; le Document est libéré dès la sérialisation."""
+    buf = io.BytesIO()
+    doc = docx_from_letter(letter)
+    doc.save(buf)
+    # Document + package OPC + arbre lxml forment des cycles de références : sans collecte,
+    # ils attendent un passage complet du GC (plusieurs centaines de Ko par lettre dans une
+    # session GUI longue). Une collecte des jeunes générations suffit (~2 ms).
+    del doc
+    gc.collect(1)
+    return buf.getvalue()
+
+def build_letter_doc(bank: str, position: str, body_paragraphs: list[str]) -> Document:
+    return docx_from_letter(letter_model.build_letter(bank, position, body_paragraphs))
+
+# Banque / poste viennent de l’utilisateur, d’un fichier scrapé ou d’une requête HTTP :
+# aucun séparateur, lecteur ou caractère interdit sous Windows ne doit atteindre le chemin
+_UNSAFE_RX = re.compile(r'[/\\:*?"<>|\x00-\x1f]')
+
+def _safe_name(s: str) -> str:
+    return _UNSAFE_RX.sub("-", s).strip().strip(".") or "_"
+
+def letter_base_path(bank: str, position: str) -> str:
+    """Chemin de sortie sans extension : <OUT_DIR>/<banque>/Cover Letter <nom> - <banque> - <poste>."""
     out_root = os.path.join(app_dir(), _cfg("OUT_DIR", "generated_letters"))
-    out_dir = os.path.join(out_root, bank)
-    os.makedirs(out_dir, exist_ok=True)
-    filename = f"Cover Letter {config.NOM} - {bank} - {position.replace(' ', '_')}.docx"
-    path = os.path.join(out_dir, filename)
-
-    # Si le fichier est déjà ouvert par Word (verrou), on suffixe automatiquement (1), (2), …
-    base, ext = os.path.splitext(path); n = 1
-    while True:
-        try:
-            doc.save(path); break
-        except PermissionError:
-            path = f"{base} ({n}){ext}"; n += 1
-    return path
+    bank = _safe_name(bank)
+    return os.path.join(out_root, bank, f"Cover Letter {config.NOM} - {bank} - {_safe_name(position).replace(' ', '_')}")
+
+def save_letter_files(letter: letter_model.Letter, formats=("docx",)) -> dict:
+    """Rend les formats demandés en parallèle depuis le même modèle puis les écrit côte à côte.
+    Si un fichier est verrouillé (ouvert dans Word), tout le jeu est suffixé (1), (2), …"""
+    rendered = letter_model.render_all(letter, formats)
+    paths = letter_model.write_all(rendered, letter_base_path(letter.bank, letter.position))
+    # Index plein texte alimenté depuis le modèle (corps déjà nettoyé) : aucun DOCX à relire
+    if "docx" in paths:
+        letter_index.index_letter(letter, paths["docx"])
+    return paths
+
+def save_letter(bank: str, position: str, body_paragraphs: list[str]) -> str:
+    # Construit le modèle puis écrit le DOCX sur disque dans un dossier par banque
+    letter = letter_model.build_letter(bank, position, body_paragraphs)
+    return save_letter_files(letter, ("docx",))["docx"]